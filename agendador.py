@@ -0,0 +1,154 @@
+"""Agenda das atualizações: calendário da B3 e cadência própria de cada ação"""
+import threading
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+FUSO_B3 = ZoneInfo('America/Sao_Paulo')
+
+# Multiplicadores da cadência base por prioridade definida pelo usuário
+PRIORIDADES = {
+    'alta': 0.5,
+    'normal': 1.0,
+    'baixa': 3.0,
+}
+
+
+def domingo_de_pascoa(ano):
+    """Data da Páscoa (algoritmo de Meeus/Jones/Butcher)"""
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(ano, mes, dia + 1)
+
+
+class CalendarioB3:
+    """Dias e horários de pregão da B3"""
+
+    # Feriados nacionais de data fixa e dias sem pregão (mês, dia)
+    FERIADOS_FIXOS = [
+        (1, 1), (4, 21), (5, 1), (9, 7), (10, 12),
+        (11, 2), (11, 15), (11, 20), (12, 24), (12, 25), (12, 31),
+    ]
+
+    def __init__(self, abertura=time(10, 0), fechamento=time(18, 0), feriados_extras=()):
+        self.abertura = abertura
+        self.fechamento = fechamento
+        self.feriados_extras = set(feriados_extras)
+        self._feriados_por_ano = {}
+
+    def feriados(self, ano):
+        """Conjunto de datas sem pregão no ano"""
+        if ano not in self._feriados_por_ano:
+            pascoa = domingo_de_pascoa(ano)
+            moveis = {
+                pascoa - timedelta(days=48),  # Carnaval (segunda)
+                pascoa - timedelta(days=47),  # Carnaval (terça)
+                pascoa - timedelta(days=2),   # Sexta-feira Santa
+                pascoa + timedelta(days=60),  # Corpus Christi
+            }
+            fixos = {date(ano, mes, dia) for mes, dia in self.FERIADOS_FIXOS}
+            extras = {d for d in self.feriados_extras if d.year == ano}
+            self._feriados_por_ano[ano] = fixos | moveis | extras
+        return self._feriados_por_ano[ano]
+
+    def dia_util(self, dia):
+        return dia.weekday() < 5 and dia not in self.feriados(dia.year)
+
+    def aberto(self, agora=None):
+        """Indica se o pregão está aberto no horário informado"""
+        agora = (agora or datetime.now(FUSO_B3)).astimezone(FUSO_B3)
+        return (self.dia_util(agora.date())
+                and self.abertura <= agora.time() < self.fechamento)
+
+    def proxima_abertura(self, agora=None):
+        """Próximo horário de abertura (o próprio `agora` se já estiver aberto)"""
+        agora = (agora or datetime.now(FUSO_B3)).astimezone(FUSO_B3)
+        if self.aberto(agora):
+            return agora
+        dia = agora.date()
+        if agora.time() >= self.abertura:
+            dia += timedelta(days=1)
+        while not self.dia_util(dia):
+            dia += timedelta(days=1)
+        return datetime.combine(dia, self.abertura, tzinfo=FUSO_B3)
+
+
+class Agendador:
+    """Decide quais ações atualizar e quando
+
+    Cada ação tem a própria cadência: a base é multiplicada pela prioridade
+    do usuário e encurtada/alongada conforme a volatilidade relativa da ação.
+    Com o mercado fechado nenhuma ação vence; `calendario=None` ignora o
+    calendário (útil para fontes locais com relógio próprio).
+    """
+
+    CADENCIA_MINIMA = 15
+    CADENCIA_MAXIMA = 30 * 60
+
+    def __init__(self, calendario=None, cadencia_base=120):
+        self.calendario = calendario
+        self.cadencia_base = cadencia_base
+        self.prioridades = {}
+        self.cadencias = {}
+        self.proximas = {}
+        self.trava = threading.Lock()
+
+    def definir_prioridade(self, ticker, prioridade):
+        if prioridade not in PRIORIDADES:
+            raise ValueError(f"Prioridade desconhecida: {prioridade}")
+        with self.trava:
+            self.prioridades[ticker] = prioridade
+            self.cadencias.pop(ticker, None)
+
+    def mercado_aberto(self, agora=None):
+        return self.calendario is None or self.calendario.aberto(agora)
+
+    def cadencia(self, ticker, volatilidade=None, volatilidade_mediana=None):
+        """Segundos entre atualizações do ticker"""
+        cadencia = self.cadencia_base * PRIORIDADES[self.prioridades.get(ticker, 'normal')]
+        if volatilidade and volatilidade_mediana and volatilidade == volatilidade:
+            # Ações mais voláteis que a mediana são atualizadas com mais frequência
+            cadencia /= min(2.0, max(0.5, volatilidade / volatilidade_mediana))
+        return min(self.CADENCIA_MAXIMA, max(self.CADENCIA_MINIMA, cadencia))
+
+    def vencidos(self, tickers, agora, limite=None):
+        """Tickers cuja próxima atualização já passou (`agora` em segundos, epoch)
+
+        Com `limite`, devolve só os `limite` vencidos há mais tempo; os demais
+        ficam para as próximas verificações.
+        """
+        if not self.mercado_aberto(datetime.fromtimestamp(agora, FUSO_B3)):
+            return []
+        with self.trava:
+            vencidos = [t for t in tickers if self.proximas.get(t, 0) <= agora]
+            if limite is not None and len(vencidos) > limite:
+                vencidos = sorted(vencidos, key=lambda t: self.proximas.get(t, 0))[:limite]
+            return vencidos
+
+    def registrar(self, tickers, agora, volatilidades=None):
+        """Marca os tickers como atualizados e calcula a próxima vez de cada um"""
+        volatilidades = volatilidades or {}
+        validas = sorted(v for v in volatilidades.values() if v and v == v)
+        mediana = validas[len(validas) // 2] if validas else None
+        with self.trava:
+            for ticker in tickers:
+                self.cadencias[ticker] = self.cadencia(ticker, volatilidades.get(ticker), mediana)
+                self.proximas[ticker] = agora + self.cadencias[ticker]
+
+    def segundos_ate_proximo(self, tickers, agora):
+        """Tempo até o próximo vencimento, considerando o horário do pregão"""
+        agora_dt = datetime.fromtimestamp(agora, FUSO_B3)
+        if not self.mercado_aberto(agora_dt):
+            return max(1.0, self.calendario.proxima_abertura(agora_dt).timestamp() - agora)
+        with self.trava:
+            proximas = [self.proximas.get(t, 0) for t in tickers]
+        if not proximas:
+            return float(self.cadencia_base)
+        return max(0.0, min(proximas) - agora)
@@ -0,0 +1,532 @@
+"""Regras de alerta avaliadas incrementalmente a cada barra nova
+
+As regras são lidas de um arquivo TOML ou JSON e valem para um ticker, um
+grupo das listas de ações ou todas as ações monitoradas:
+
+    [[regra]]
+    nome = "Petrobras acima de 40"
+    tipo = "preco"              # cruza um preço: acima = X ou abaixo = X
+    ticker = "PETR4"
+    acima = 40
+
+    [[regra]]
+    tipo = "variacao"           # variação da barra (%): positiva = alta, negativa = queda
+    grupo = "IBOV"
+    percentual = -3
+
+    [[regra]]
+    tipo = "volume"             # volume da barra >= fator x média das anteriores
+    fator = 4
+
+    [[regra]]
+    tipo = "cruzamento"         # campo cruza outro campo (ou um número)
+    campo = "ema"
+    alvo = "sma"
+    direcao = "acima"
+
+    [[regra]]
+    tipo = "gap"                # abertura do dia contra o fechamento anterior (%)
+    percentual = 2
+
+Campos: preco, abertura, maxima, minima, volume, variacao, gap,
+volume_relativo e os indicadores (sma, ema, rsi, bb_superior, bb_inferior,
+atr, volatilidade, vwap). Cruzamentos disparam uma vez na barra em que a
+condição passa a valer; as demais regras disparam em toda barra em que ela
+vale. O JSON usa o mesmo formato: {"regra": [{...}, ...]}.
+
+As regras são compiladas em vetores (uma posição por regra e ticker) e cada
+barra nova é avaliada de uma vez para todas elas, sem reler o histórico.
+"""
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from listas import normalizar_ticker
+
+# Campos calculados pelo próprio motor, antes dos indicadores
+CAMPOS_BARRA = ('preco', 'abertura', 'maxima', 'minima', 'volume', 'variacao', 'gap',
+                'volume_relativo')
+# Indicadores de IndicadoresIncrementais.valores() que as regras podem usar
+CAMPOS_INDICADORES = ('sma', 'ema', 'rsi', 'bb_superior', 'bb_inferior', 'atr',
+                      'volatilidade', 'vwap')
+CAMPOS = CAMPOS_BARRA + CAMPOS_INDICADORES
+
+SEM_REGISTRO = np.iinfo(np.int64).min
+
+
+class Regra:
+    """Regra já normalizada: `campo` comparado a `alvo` (outro campo ou número)
+
+    `sinal` é +1 para "acima de" e -1 para "abaixo de"; com `cruzamento`,
+    dispara só na barra em que a condição passa a valer.
+    """
+
+    __slots__ = ('nome', 'tipo', 'tickers', 'campo', 'alvo', 'sinal', 'cruzamento')
+
+    def __init__(self, nome, tipo, tickers, campo, alvo, sinal, cruzamento):
+        self.nome = nome
+        self.tipo = tipo
+        self.tickers = tickers
+        self.campo = campo
+        self.alvo = alvo
+        self.sinal = sinal
+        self.cruzamento = cruzamento
+
+    def __repr__(self):
+        return f"Regra({self.nome!r})"
+
+
+class Alerta:
+    """Disparo de uma regra para um ticker em uma barra"""
+
+    __slots__ = ('regra', 'tipo', 'ticker', 'horario', 'valor', 'mensagem')
+
+    def __init__(self, regra, tipo, ticker, horario, valor, mensagem):
+        self.regra = regra
+        self.tipo = tipo
+        self.ticker = ticker
+        self.horario = horario
+        self.valor = valor
+        self.mensagem = mensagem
+
+    def como_dicionario(self):
+        return {
+            'regra': self.regra,
+            'tipo': self.tipo,
+            'ticker': self.ticker,
+            'horario': self.horario.isoformat(),
+            'valor': self.valor if np.isfinite(self.valor) else None,
+            'mensagem': self.mensagem,
+        }
+
+
+def _tickers_da_regra(dados, listas):
+    if 'ticker' in dados:
+        return [normalizar_ticker(dados['ticker'])]
+    if 'tickers' in dados:
+        return [normalizar_ticker(ticker) for ticker in dados['tickers']]
+    if 'grupo' in dados:
+        for lista in (listas or {}).values():
+            if dados['grupo'] in lista.grupos:
+                return list(lista.grupos[dados['grupo']])
+        raise ValueError(f"grupo '{dados['grupo']}' não encontrado nas listas")
+    # Sem ticker nem grupo: vale para todas as ações monitoradas
+    return None
+
+
+def criar_regra(dados, listas=None):
+    """Converte a definição de uma regra (dicionário) em `Regra`"""
+    tipo = dados.get('tipo', 'cruzamento')
+    tickers = _tickers_da_regra(dados, listas)
+
+    if tipo == 'preco':
+        if 'acima' in dados:
+            campo, alvo, sinal = 'preco', float(dados['acima']), 1
+        elif 'abaixo' in dados:
+            campo, alvo, sinal = 'preco', float(dados['abaixo']), -1
+        else:
+            raise ValueError("regra de preço precisa de 'acima' ou 'abaixo'")
+        cruzamento = True
+        descricao = f"preço {'acima' if sinal > 0 else 'abaixo'} de {alvo:g}"
+    elif tipo in ('variacao', 'gap'):
+        alvo = float(dados['percentual'])
+        campo, sinal, cruzamento = tipo, 1 if alvo >= 0 else -1, False
+        descricao = f"{'variação' if tipo == 'variacao' else 'gap'} de {alvo:+g}%"
+    elif tipo == 'volume':
+        campo, alvo, sinal, cruzamento = 'volume_relativo', float(dados.get('fator', 3)), 1, False
+        descricao = f"volume {alvo:g}x a média"
+    elif tipo == 'cruzamento':
+        campo = dados.get('campo', 'preco')
+        alvo = dados.get('alvo', 'sma')
+        if not isinstance(alvo, str):
+            alvo = float(alvo)
+        sinal = -1 if dados.get('direcao', 'acima') == 'abaixo' else 1
+        cruzamento = True
+        descricao = f"{campo} cruza {'acima' if sinal > 0 else 'abaixo'} de {alvo}"
+    else:
+        raise ValueError(f"tipo de regra desconhecido: {tipo}")
+
+    for nome in (campo, alvo):
+        if isinstance(nome, str) and nome not in CAMPOS:
+            raise ValueError(f"campo desconhecido: {nome}")
+    return Regra(dados.get('nome', descricao), tipo, tickers, campo, alvo, sinal, cruzamento)
+
+
+def carregar_regras(caminho, listas=None):
+    """Lê as regras de um arquivo TOML ou JSON; regras inválidas são ignoradas"""
+    if caminho.lower().endswith('.toml'):
+        import tomllib
+        with open(caminho, 'rb') as f:
+            dados = tomllib.load(f)
+    else:
+        with open(caminho, encoding='utf-8') as f:
+            dados = json.load(f)
+
+    regras = []
+    for posicao, definicao in enumerate(dados.get('regra', []), start=1):
+        try:
+            regras.append(criar_regra(definicao, listas))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Erro na regra {posicao} de {caminho}: {e}")
+    return regras
+
+
+def carregar_arquivos_regras(caminhos, listas=None):
+    """Lê as regras de vários arquivos, juntando todas em uma lista"""
+    regras = []
+    for caminho in caminhos:
+        try:
+            regras.extend(carregar_regras(caminho, listas))
+        except Exception as e:
+            print(f"Erro ao carregar as regras {caminho}: {e}")
+    return regras
+
+
+class MotorAlertas:
+    """Avalia as regras a cada barra nova e entrega os alertas disparados
+
+    `avaliar` é chamado por IndicadoresIncrementais.atualizar a cada barra
+    aplicada (ver `ao_adicionar`); `concluir`, ao fim da atualização, entrega
+    os alertas. Barras que o motor já viu e que são reaplicadas depois de uma
+    troca de ações só reconstroem o estado, sem alertar; o primeiro lote de
+    um ticker novo (histórico) também é silencioso.
+    """
+
+    # Barras usadas na média do volume (média exponencial) e mínimo antes de comparar
+    JANELA_VOLUME = 20
+    MIN_BARRAS_VOLUME = 5
+    # Alertas recentes guardados para consulta
+    HISTORICO = 200
+
+    ESCALARES = ('ultimo_ts', 'fech', 'dia', 'media_volume', 'n')
+
+    def __init__(self, regras=(), entregas=(), metricas=None):
+        self.entregas = list(entregas)
+        self.metricas = metricas
+        self.recentes = deque(maxlen=self.HISTORICO)
+        self.trava = threading.Lock()
+        self.tickers = None
+        self.vistos = {}
+        self.disparos = {}
+        self.pendentes = {}
+        self.duracao = 0.0
+        self.definir_regras(regras)
+
+    def definir_regras(self, regras):
+        with self.trava:
+            self.regras = list(regras)
+            self.usa_indicadores = any(
+                campo in CAMPOS_INDICADORES
+                for regra in self.regras for campo in (regra.campo, regra.alvo))
+            self.disparos = {}
+            self.tickers = None
+
+    def adicionar_entrega(self, entrega):
+        self.entregas.append(entrega)
+
+    def _compilar(self, tickers):
+        """Monta os vetores das regras (uma posição por regra e ticker)
+
+        Os tickers que já estavam na lista anterior mantêm o estado e o lado
+        de cada regra, pois os indicadores não reaplicam as barras deles.
+        """
+        anteriores = None
+        if self.tickers is not None:
+            pares = {(int(i), self.tickers[c]): k
+                     for k, (i, c) in enumerate(zip(self.regra, self.coluna))}
+            anteriores = (self.tickers, self.estado, self.anterior, pares,
+                          self.lado, self.lado_anterior, self.ts_regra)
+        self.tickers = tickers
+        n = len(tickers)
+        posicoes = {ticker: i for i, ticker in enumerate(tickers)}
+        indices = {campo: i for i, campo in enumerate(CAMPOS)}
+
+        regra, coluna = [], []
+        for i, definicao in enumerate(self.regras):
+            alvos = tickers if definicao.tickers is None else definicao.tickers
+            for ticker in alvos:
+                if ticker in posicoes:
+                    regra.append(i)
+                    coluna.append(posicoes[ticker])
+        self.regra = np.array(regra, dtype=np.int64)
+        self.coluna = np.array(coluna, dtype=np.int64)
+        self.campo = np.array([indices[self.regras[i].campo] for i in regra], dtype=np.int64)
+        alvo_campo = [indices.get(self.regras[i].alvo, -1) if isinstance(self.regras[i].alvo, str)
+                      else -1 for i in regra]
+        self.alvo_campo = np.array(alvo_campo, dtype=np.int64)
+        self.alvo_valor = np.array([0.0 if isinstance(self.regras[i].alvo, str)
+                                    else self.regras[i].alvo for i in regra])
+        self.sinal = np.array([self.regras[i].sinal for i in regra], dtype=float)
+        self.cruzamento = np.array([self.regras[i].cruzamento for i in regra], dtype=bool)
+
+        # Lado da condição (-1 desconhecido, 0 falsa, 1 verdadeira) na barra atual e na anterior
+        m = len(regra)
+        self.lado = np.full(m, -1, dtype=np.int8)
+        self.lado_anterior = np.full(m, -1, dtype=np.int8)
+        self.ts_regra = np.full(m, SEM_REGISTRO, dtype=np.int64)
+        # O último disparo de cada regra e ticker sobrevive à recompilação
+        self.ultimo_disparo = np.array([self.disparos.get((i, tickers[c]), SEM_REGISTRO)
+                                        for i, c in zip(regra, coluna)], dtype=np.int64)
+
+        self.estado = {nome: np.zeros(n) for nome in self.ESCALARES}
+        self.estado['ultimo_ts'] = np.full(n, SEM_REGISTRO, dtype=np.int64)
+        self.estado['n'] = np.zeros(n, dtype=np.int64)
+        self.estado['fech'][:] = np.nan
+        self.estado['media_volume'][:] = np.nan
+        self.anterior = {nome: valores.copy() for nome, valores in self.estado.items()}
+        if anteriores is not None:
+            self._manter(anteriores, regra, coluna)
+        self.liberado = np.array([self.vistos.get(t, np.iinfo(np.int64).max) for t in tickers],
+                                 dtype=np.int64)
+
+    def avaliar(self, indicadores, horario, abertura, maxima, minima, fechamento, volume):
+        """Avalia todas as regras na barra `horario` (vetores com um valor por ticker)"""
+        inicio = time.perf_counter()
+        with self.trava:
+            if not self.regras:
+                return
+            if self.tickers is not indicadores.tickers:
+                self._salvar_disparos()
+                self._compilar(indicadores.tickers)
+            self._avaliar(indicadores, horario, abertura, maxima, minima, fechamento, volume)
+        self.duracao += time.perf_counter() - inicio
+
+    def _manter(self, anteriores, regra, coluna):
+        """Copia o estado da compilação anterior para os tickers que continuam"""
+        tickers, estado, anterior, pares, lado, lado_anterior, ts_regra = anteriores
+        posicoes = {ticker: i for i, ticker in enumerate(tickers)}
+        origem = np.array([posicoes.get(t, -1) for t in self.tickers], dtype=np.int64)
+        mantidos = origem >= 0
+        for nome in self.ESCALARES:
+            self.estado[nome][mantidos] = estado[nome][origem[mantidos]]
+            self.anterior[nome][mantidos] = anterior[nome][origem[mantidos]]
+        origem = np.array([pares.get((i, self.tickers[c]), -1) for i, c in zip(regra, coluna)],
+                          dtype=np.int64)
+        mantidos = origem >= 0
+        self.lado[mantidos] = lado[origem[mantidos]]
+        self.lado_anterior[mantidos] = lado_anterior[origem[mantidos]]
+        self.ts_regra[mantidos] = ts_regra[origem[mantidos]]
+
+    def _avaliar(self, indicadores, horario, abertura, maxima, minima, fechamento, volume):
+        e = self.estado
+        ts = pd.Timestamp(horario).value
+        valido = ~np.isnan(fechamento)
+        revisao = valido & (e['ultimo_ts'] == ts)
+        nova = valido & (e['ultimo_ts'] < ts)
+        if revisao.any():
+            for nome, valores in e.items():
+                valores[revisao] = self.anterior[nome][revisao]
+        if nova.any():
+            for nome, valores in e.items():
+                self.anterior[nome][nova] = valores[nova]
+        atualizados = revisao | nova
+        if not atualizados.any():
+            return
+
+        # Campos da barra: uma linha por campo, uma coluna por ticker
+        dia = pd.Timestamp(horario).normalize().value
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variacao = (fechamento / e['fech'] - 1) * 100
+            gap = np.where((e['n'] > 0) & (e['dia'] != dia), (abertura / e['fech'] - 1) * 100, np.nan)
+            relativo = np.where(e['n'] >= self.MIN_BARRAS_VOLUME, volume / e['media_volume'], np.nan)
+        linhas = [fechamento, abertura, maxima, minima, volume, variacao, gap, relativo]
+        if self.usa_indicadores:
+            valores = indicadores.valores()
+            linhas.extend(valores[nome] for nome in CAMPOS_INDICADORES)
+        else:
+            linhas.extend([np.full(len(fechamento), np.nan)] * len(CAMPOS_INDICADORES))
+        campos = np.vstack(linhas)
+
+        # Estado por ticker para a próxima barra
+        m = atualizados
+        alfa = 2 / (self.JANELA_VOLUME + 1)
+        v = np.nan_to_num(volume[m])
+        media = e['media_volume'][m]
+        e['media_volume'][m] = np.where(np.isnan(media), v, media + alfa * (v - media))
+        e['fech'][m] = fechamento[m]
+        e['dia'][m] = dia
+        e['n'][m] += 1
+        e['ultimo_ts'][m] = ts
+
+        # Todas as regras dos tickers atualizados de uma vez
+        afetadas = np.flatnonzero(atualizados[self.coluna]) if len(self.coluna) else self.coluna
+        if not len(afetadas):
+            return
+        coluna = self.coluna[afetadas]
+        valor = campos[self.campo[afetadas], coluna]
+        alvo_campo = self.alvo_campo[afetadas]
+        alvo = np.where(alvo_campo >= 0, campos[alvo_campo, coluna], self.alvo_valor[afetadas])
+        diferenca = self.sinal[afetadas] * (valor - alvo)
+        lado = np.where(np.isnan(diferenca), -1, diferenca >= 0).astype(np.int8)
+
+        # Barra nova: o lado atual vira o anterior; revisão: o anterior é mantido
+        nova_regra = ts > self.ts_regra[afetadas]
+        self.lado_anterior[afetadas[nova_regra]] = self.lado[afetadas[nova_regra]]
+        self.lado[afetadas] = lado
+        self.ts_regra[afetadas] = ts
+
+        dispara = np.where(self.cruzamento[afetadas],
+                           (lado == 1) & (self.lado_anterior[afetadas] == 0), lado == 1)
+        dispara &= (ts > self.ultimo_disparo[afetadas]) & (ts >= self.liberado[coluna])
+        if not dispara.any():
+            return
+        disparadas = afetadas[dispara]
+        self.ultimo_disparo[disparadas] = ts
+        horario = pd.Timestamp(horario)
+        for indice, valor_atual in zip(disparadas, valor[dispara]):
+            regra = self.regras[self.regra[indice]]
+            ticker = self.tickers[self.coluna[indice]]
+            # Várias barras novas na mesma atualização: só o último disparo de cada regra
+            self.pendentes[(int(self.regra[indice]), ticker)] = Alerta(
+                regra.nome, regra.tipo, ticker, horario, float(valor_atual),
+                f"{ticker}: {regra.nome} ({regra.campo} = {valor_atual:.4g})")
+
+    def _salvar_disparos(self):
+        if self.tickers is None:
+            return
+        for i, c, ts in zip(self.regra, self.coluna, self.ultimo_disparo):
+            if ts != SEM_REGISTRO:
+                self.disparos[(int(i), self.tickers[c])] = int(ts)
+
+    def concluir(self):
+        """Fim de uma atualização: libera os tickers vistos e entrega os alertas"""
+        with self.trava:
+            if self.tickers is not None:
+                for ticker, ts in zip(self.tickers, self.estado['ultimo_ts']):
+                    if ts != SEM_REGISTRO:
+                        self.vistos[ticker] = int(ts)
+                self.liberado = np.array([self.vistos.get(t, np.iinfo(np.int64).max)
+                                          for t in self.tickers], dtype=np.int64)
+            alertas = sorted(self.pendentes.values(), key=lambda a: a.horario)
+            self.pendentes = {}
+            duracao, self.duracao = self.duracao, 0.0
+
+        if self.metricas is not None:
+            self.metricas.observar('alertas_segundos', duracao)
+        for alerta in alertas:
+            self.recentes.append(alerta)
+            if self.metricas is not None:
+                self.metricas.incrementar('alertas_total', tipo=alerta.tipo)
+            for entrega in self.entregas:
+                try:
+                    entrega(alerta)
+                except Exception as e:
+                    print(f"Erro ao entregar alerta: {e}")
+        return alertas
+
+
+def entrega_terminal(alerta):
+    print(f"[ALERTA {alerta.horario:%d/%m %H:%M}] {alerta.mensagem}")
+
+
+class EntregaRegistro:
+    """Anexa cada alerta ao log JSON (RegistroJson)"""
+
+    def __init__(self, registro):
+        self.registro = registro
+
+    def __call__(self, alerta):
+        self.registro.registrar('alerta', **alerta.como_dicionario())
+
+
+class EntregaWebhook:
+    """Envia cada alerta por POST (JSON) a uma URL, em uma thread própria
+
+    A fila desacopla a avaliação da rede: um webhook lento não atrasa a
+    atualização das cotações.
+    """
+
+    # Tempo limite de cada envio (s) e alertas aguardando envio
+    TEMPO_LIMITE = 5
+    MAX_FILA = 1000
+
+    def __init__(self, url):
+        self.url = url
+        self.fila = queue.Queue(self.MAX_FILA)
+        threading.Thread(target=self._laco, daemon=True).start()
+
+    def __call__(self, alerta):
+        try:
+            self.fila.put_nowait(alerta.como_dicionario())
+        except queue.Full:
+            print(f"Fila do webhook cheia, alerta descartado: {alerta.mensagem}")
+
+    def _laco(self):
+        while True:
+            corpo = json.dumps(self.fila.get(), ensure_ascii=False).encode('utf-8')
+            requisicao = urllib.request.Request(
+                self.url, data=corpo, headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(requisicao, timeout=self.TEMPO_LIMITE).close()
+            except Exception as e:
+                print(f"Erro ao enviar alerta ao webhook: {e}")
+
+
+class NotificacaoDesktop:
+    """Mostra os alertas como notificação do sistema (notify-send, osascript ou msg)
+
+    Uma thread própria lança os comandos, fora da atualização das cotações;
+    os alertas que chegam juntos (uma rajada) viram uma única notificação.
+    """
+
+    # Alertas aguardando notificação e mensagens listadas em uma notificação agrupada
+    MAX_FILA = 1000
+    MAX_LINHAS = 5
+    # Espera (s) depois do primeiro alerta, para juntar os da mesma rajada
+    ESPERA_RAJADA = 0.2
+
+    def __init__(self):
+        self.fila = queue.Queue(self.MAX_FILA)
+        threading.Thread(target=self._laco, daemon=True).start()
+
+    def __call__(self, alerta):
+        try:
+            self.fila.put_nowait(alerta)
+        except queue.Full:
+            print(f"Fila de notificações cheia, alerta descartado: {alerta.mensagem}")
+
+    def _laco(self):
+        while True:
+            alertas = [self.fila.get()]
+            time.sleep(self.ESPERA_RAJADA)
+            while True:
+                try:
+                    alertas.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.notificar(*self.agrupar(alertas))
+            except Exception as e:
+                print(f"Erro ao mostrar notificação: {e}")
+
+    def agrupar(self, alertas):
+        """(título, texto) de uma notificação com todos os alertas da rajada"""
+        if len(alertas) == 1:
+            return f"Alerta {alertas[0].ticker}", alertas[0].mensagem
+        linhas = [alerta.mensagem for alerta in alertas[:self.MAX_LINHAS]]
+        if len(alertas) > self.MAX_LINHAS:
+            linhas.append(f"... e mais {len(alertas) - self.MAX_LINHAS}")
+        return f"{len(alertas)} alertas", '\n'.join(linhas)
+
+    @staticmethod
+    def notificar(titulo, texto):
+        if sys.platform == 'darwin':
+            comando = ['osascript', '-e',
+                       f'display notification {json.dumps(texto)} with title {json.dumps(titulo)}']
+        elif os.name == 'nt':
+            comando = ['msg', '*', f"{titulo}: {texto}"]
+        elif shutil.which('notify-send'):
+            comando = ['notify-send', titulo, texto]
+        else:
+            return
+        subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
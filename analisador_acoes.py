@@ -1,50 +1,211 @@
-import yfinance as yf
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.dates as mdates
+import time
+
+# Referência para o relatório de inicialização: tudo o que vem depois conta
+INICIO_PROCESSO = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk
 import threading
-import time
 from datetime import datetime
+import importlib.util
 import sys
 import os
+from listas import ACOES_PADRAO, ListaAcoes, carregar_listas
+from tabela_incremental import COLUNAS_TABELA
+
+# pandas, matplotlib e o núcleo (que os usa) são importados em segundo plano,
+# depois que a janela já está na tela (ver `inicializar_em_segundo_plano`)
 
 class AnalisadorAcoes:
-    def __init__(self, root):
+    # Tempo máximo (ms) aplicando linhas da tabela por ciclo do loop do Tk (~60 fps)
+    ORCAMENTO_QUADRO_MS = 8
+    
+    # Janela da média móvel sobreposta ao gráfico
+    JANELA_MEDIA_GRAFICO = 20
+    
+    # Cadência base de atualização por ação (s) e espera máxima entre verificações da agenda
+    CADENCIA_BASE = 120
+    
+    # Máximo de ações por atualização (o restante fica para as seguintes)
+    MAX_POR_ATUALIZACAO = 100
+    # Linhas no gráfico quando nenhuma ação está selecionada na tabela
+    MAX_LINHAS_GRAFICO = 9
+    # Pasta das listas de ações carregadas na abertura
+    PASTA_LISTAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'listas')
+    # Pasta padrão das gravações de sessão (--gravar)
+    PASTA_GRAVACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gravacoes')
+    ESPERA_MAXIMA_AGENDA = 30
+
+    # Intervalo de atualização do painel de diagnóstico (ms)
+    INTERVALO_DIAGNOSTICO = 1000
+
+    def __init__(self, root, fonte=None, opcoes_fonte=None, log_json=None, arquivo_metricas=None,
+                 arquivos_listas=None, grupo_inicial=None, arquivos_alertas=None, webhook=None,
+                 processos=None, gravar=None, arquivo_carteira=None):
         self.root = root
         self.root.title("Analisador de Ações Brasileiras v3.0")
-        self.root.geometry("1100x750")
+        self.root.geometry("1250x750")
         self.root.configure(bg='#2c3e50')
         
-        # Ações brasileiras mais negociadas (sem emojis nos códigos)
-        self.acoes = {
-            'PETR4.SA': 'Petrobras',
-            'VALE3.SA': 'Vale',
-            'ITUB4.SA': 'Itaú Unibanco',
-            'BBDC4.SA': 'Bradesco',
-            'B3SA3.SA': 'B3',
-            'WEGE3.SA': 'Weg',
-            'ABEV3.SA': 'Ambev',
-            'BBAS3.SA': 'Banco do Brasil',
-            'PETR3.SA': 'Petrobras PN'
-        }
-        
-        self.dados_acoes = {}
+        # Núcleo, gráfico e produtor chegam em `concluir_inicializacao`
+        self.nucleo = None
+        self.metricas = None
+        self.fonte = None
+        self.produtor = None
+        self.renderizador = None
+        self.arquivo_metricas = arquivo_metricas
+        self.janela_diagnostico = None
+        self.janela_carteira = None
+        self.janela_triagem = None
+        self.acoes = {}
+        self.tempos_inicializacao = {}
+        
+        # Monitoramento ligado e atualização em andamento são estados independentes
         self.monitorando = False
-        self.ultima_atualizacao = None
-        
+        self.atualizando = False
+        self.tickers_em_andamento = set()
+        self.tickers_pendentes = set()
+        self.cancelar_evento = threading.Event()
+        self.agendamento_agenda = None
+        
+        self.pendentes_tabela = {}
+        self.ordem_tabela = []
+        self.reordenar_tabela = False
+        self.agendamento_tabela = None
+        
+        # Listas de ações: a padrão já está ativa; as dos arquivos chegam depois
+        self.listas = {'Padrão': ListaAcoes('Padrão', ACOES_PADRAO,
+                                            {'Principais': list(ACOES_PADRAO)})}
+        self.lista_atual = self.listas['Padrão']
+        self.trocando_grupo = False
+        self.arquivos_listas = arquivos_listas or [self.PASTA_LISTAS]
+        self.grupo_inicial = grupo_inicial
+        self.arquivos_alertas = arquivos_alertas or []
+        self.webhook = webhook
+        self.processos = processos
+        self.gravar = gravar
+        self.arquivo_carteira = arquivo_carteira
+        
+        # A janela aparece já; o resto é carregado em segundo plano
         self.criar_interface()
-        self.verificar_conexao()
+        self.root.after(0, lambda: self.marcar_inicializacao('janela'))
+        self.inicializar_em_segundo_plano(fonte, opcoes_fonte or {}, log_json)
+    
+    def marcar_inicializacao(self, etapa):
+        """Registra quanto tempo, desde o início do processo, levou até `etapa`"""
+        self.tempos_inicializacao[etapa] = time.perf_counter() - INICIO_PROCESSO
+    
+    def inicializar_em_segundo_plano(self, fonte, opcoes_fonte, log_json):
+        """Importa os módulos pesados, cria o núcleo e lê o cache fora da thread do Tk"""
+        self.status_var.set("Carregando...")
+        
+        def thread_inicializacao():
+            try:
+                # Importações que só aquecem o cache de módulos para a thread do Tk
+                import matplotlib.figure  # noqa: F401
+                import matplotlib.backends.backend_tkagg  # noqa: F401
+                import instantaneos  # noqa: F401
+                from fonte_dados import criar_fonte
+                from nucleo import NucleoCotacoes
+                self.marcar_inicializacao('modulos')
+                
+                if fonte is None:
+                    fonte_nucleo = criar_fonte(**opcoes_fonte)
+                else:
+                    fonte_nucleo = fonte
+                nucleo = NucleoCotacoes(fonte=fonte_nucleo, log_json=log_json,
+                                        processos=self.processos, gravar=self.gravar)
+                nucleo.carregar_cache()
+                self.marcar_inicializacao('cache')
+            except Exception as e:
+                mensagem = f"Erro na inicialização: {e}"
+                print(mensagem)
+                self.root.after(0, lambda: self.status_var.set(mensagem))
+                return
+            self.root.after(0, lambda: self.concluir_inicializacao(nucleo))
+        
+        threading.Thread(target=thread_inicializacao, daemon=True).start()
+    
+    def concluir_inicializacao(self, nucleo):
+        """Liga o núcleo à interface e mostra o último estado do cache (thread principal)"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from agendador import Agendador, CalendarioB3
+        from alertas import EntregaWebhook, NotificacaoDesktop
+        from grafico_rapido import RenderizadorGrafico
+        from instantaneos import ProdutorInstantaneos
+        
+        self.nucleo = nucleo
+        self.metricas = nucleo.metricas
+        self.fonte = nucleo.fonte
+        self.acoes = nucleo.acoes
+        self.dados_acoes = nucleo.dados_acoes
+        self.agendador = Agendador(CalendarioB3() if self.fonte.tempo_real else None,
+                                   cadencia_base=self.CADENCIA_BASE)
+        
+        # Gráfico matplotlib (Figure direto, sem o estado global do pyplot)
+        self.aviso_grafico.destroy()
+        self.fig = Figure(figsize=(12, 6), facecolor='#ecf0f1')
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, self.graph_frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.renderizador = RenderizadorGrafico(self.fig, self.ax, self.canvas)
+        self.mostrar_mensagem_inicial()
         
+        # Tabela e gráfico são montados fora da thread do Tk e chegam prontos
+        self.produtor = ProdutorInstantaneos(
+            self.nucleo, ao_publicar=lambda: self.root.after(0, self.aplicar_instantaneos),
+            janela_media=self.JANELA_MEDIA_GRAFICO)
+        
+        # Alertas: notificação do sistema e barra de status (e webhook, se pedido)
+        self.nucleo.alertas.adicionar_entrega(NotificacaoDesktop())
+        self.nucleo.alertas.adicionar_entrega(
+            lambda alerta: self.root.after(0, lambda: self.mostrar_alerta(alerta)))
+        if self.webhook:
+            self.nucleo.alertas.adicionar_entrega(EntregaWebhook(self.webhook))
+        
+        for botao in (self.btn_iniciar, self.btn_atualizar, self.btn_diagnostico,
+                      self.btn_historico, self.btn_carteira, self.btn_triagem):
+            botao.config(state='normal')
+        
+        # Último estado conhecido (cache) na tela enquanto os dados novos não chegam
+        if self.nucleo.barras.tickers():
+            self.atualizar_tabela()
+            self.atualizar_grafico()
+        self.verificar_conexao()
+        self.carregar_listas(self.arquivos_listas, self.grupo_inicial)
+        self.marcar_inicializacao('pronto')
+        self.relatar_inicializacao()
+    
+    def relatar_inicializacao(self):
+        """Imprime e registra (métricas e log JSON) os tempos da inicialização"""
+        etapas = ', '.join(f"{etapa} {segundos:.2f}s"
+                           for etapa, segundos in self.tempos_inicializacao.items())
+        print(f"Inicialização: {etapas}")
+        for etapa, segundos in self.tempos_inicializacao.items():
+            self.metricas.observar('inicializacao_segundos', segundos, etapa=etapa)
+        if self.nucleo.registro is not None:
+            self.nucleo.registro.registrar(
+                'inicializacao', **{etapa: round(segundos, 4)
+                                    for etapa, segundos in self.tempos_inicializacao.items()})
+    
     def verificar_conexao(self):
-        """Verifica se há conexão com internet"""
-        try:
-            # Usar método mais simples para verificar conexão
-            yf.Ticker("PETR4.SA").history(period="1d", interval="1h")
+        """Verifica a conexão em segundo plano, sem travar a janela"""
+        self.status_var.set("Verificando conexão...")
+        
+        def thread_verificacao():
+            conectado = self.nucleo.verificar_conexao()
+            self.root.after(0, lambda: self.mostrar_conexao(conectado))
+        
+        threading.Thread(target=thread_verificacao, daemon=True).start()
+    
+    def mostrar_conexao(self, conectado):
+        """Mostra o resultado da verificação de conexão (thread principal)"""
+        if self.atualizando:
+            return
+        if conectado:
             self.status_var.set("Conectado - Pronto para iniciar")
-        except:
+        else:
             self.status_var.set("Sem conexão - Verifique a internet")
         
     def criar_interface(self):
@@ -78,7 +239,7 @@ class AnalisadorAcoes:
         btn_container.pack(fill=tk.X)
         
         self.btn_iniciar = ttk.Button(btn_container, text="INICIAR MONITORAMENTO", 
-                                     command=self.iniciar_monitoramento)
+                                     command=self.iniciar_monitoramento, state='disabled')
         self.btn_iniciar.pack(side=tk.LEFT, padx=5)
         
         self.btn_parar = ttk.Button(btn_container, text="PARAR", 
@@ -86,15 +247,28 @@ class AnalisadorAcoes:
         self.btn_parar.pack(side=tk.LEFT, padx=5)
         
         self.btn_atualizar = ttk.Button(btn_container, text="ATUALIZAR AGORA", 
-                                       command=self.atualizar_dados)
+                                       command=self.atualizar_dados, state='disabled')
         self.btn_atualizar.pack(side=tk.LEFT, padx=5)
         
+        self.btn_diagnostico = ttk.Button(btn_container, text="DIAGNÓSTICO",
+                                         command=self.abrir_diagnostico, state='disabled')
+        self.btn_diagnostico.pack(side=tk.RIGHT, padx=5)
+        self.btn_historico = ttk.Button(btn_container, text="HISTÓRICO",
+                                       command=self.abrir_historico, state='disabled')
+        self.btn_historico.pack(side=tk.RIGHT, padx=5)
+        self.btn_carteira = ttk.Button(btn_container, text="CARTEIRA",
+                                      command=self.abrir_carteira, state='disabled')
+        self.btn_carteira.pack(side=tk.RIGHT, padx=5)
+        self.btn_triagem = ttk.Button(btn_container, text="CORRELAÇÃO",
+                                     command=self.abrir_triagem, state='disabled')
+        self.btn_triagem.pack(side=tk.RIGHT, padx=5)
+        
         # Configurações
         config_frame = ttk.Frame(control_frame)
         config_frame.pack(fill=tk.X, pady=(10, 0))
         
         self.auto_update_var = tk.BooleanVar(value=True)
-        ttk.Checkbutton(config_frame, text="Atualização automática a cada 2 minutos", 
+        ttk.Checkbutton(config_frame, text="Atualização automática (horário do pregão)", 
                        variable=self.auto_update_var).pack(side=tk.LEFT)
         
         ttk.Label(config_frame, text="Intervalo:").pack(side=tk.LEFT, padx=(20, 5))
@@ -104,16 +278,49 @@ class AnalisadorAcoes:
                                       values=["5m", "15m", "1h"], width=8, state="readonly")
         intervalo_combo.pack(side=tk.LEFT, padx=5)
         
+        self.modo_lote_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="Download em lote",
+                       variable=self.modo_lote_var).pack(side=tk.LEFT, padx=(20, 0))
+        
+        self.mostrar_medias_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text=f"Médias móveis ({self.JANELA_MEDIA_GRAFICO})",
+                       variable=self.mostrar_medias_var,
+                       command=self.alternar_medias).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # Listas de ações, grupos e busca
+        lista_frame = ttk.Frame(control_frame)
+        lista_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(lista_frame, text="Lista:").pack(side=tk.LEFT)
+        self.lista_var = tk.StringVar(value='Padrão')
+        self.lista_combo = ttk.Combobox(lista_frame, textvariable=self.lista_var,
+                                        values=['Padrão'], width=16, state="readonly")
+        self.lista_combo.pack(side=tk.LEFT, padx=5)
+        self.lista_combo.bind('<<ComboboxSelected>>', lambda e: self.selecionar_lista())
+        
+        ttk.Label(lista_frame, text="Grupo:").pack(side=tk.LEFT, padx=(20, 5))
+        self.grupo_var = tk.StringVar(value='Principais')
+        self.grupo_combo = ttk.Combobox(lista_frame, textvariable=self.grupo_var,
+                                        values=['Principais'], width=16, state="readonly")
+        self.grupo_combo.pack(side=tk.LEFT, padx=5)
+        self.grupo_combo.bind('<<ComboboxSelected>>', lambda e: self.selecionar_grupo())
+        
+        ttk.Label(lista_frame, text="Buscar:").pack(side=tk.LEFT, padx=(20, 5))
+        self.busca_var = tk.StringVar()
+        busca_entry = ttk.Entry(lista_frame, textvariable=self.busca_var, width=20)
+        busca_entry.pack(side=tk.LEFT, padx=5)
+        busca_entry.bind('<Return>', lambda e: self.buscar_acoes())
+        
         # Frame de cotações
         quotes_frame = ttk.LabelFrame(main_frame, text="Cotações em Tempo Real", padding=10)
         quotes_frame.pack(fill=tk.X, pady=(0, 15))
         
         # Treeview para cotações
-        columns = ('Ação', 'Último Preço (R$)', 'Variação %', 'Mínimo', 'Máximo', 'Volume', 'Atualização')
+        columns = COLUNAS_TABELA
         self.tree = ttk.Treeview(quotes_frame, columns=columns, show='headings', height=8)
         
         # Configurar colunas
-        col_widths = [180, 120, 100, 100, 100, 120, 120]
+        col_widths = [180, 110, 100, 90, 90, 90, 60, 90, 70, 90]
         for col, width in zip(columns, col_widths):
             self.tree.heading(col, text=col)
             self.tree.column(col, width=width, anchor='center')
@@ -123,28 +330,25 @@ class AnalisadorAcoes:
         self.tree.configure(yscrollcommand=scrollbar.set)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.tree.bind('<<TreeviewSelect>>', lambda e: self.atualizar_grafico())
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # Frame do gráfico
-        graph_frame = ttk.LabelFrame(main_frame, text="Gráfico de Preços", padding=10)
-        graph_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # Gráfico matplotlib
-        self.fig, self.ax = plt.subplots(figsize=(12, 6), facecolor='#ecf0f1')
-        self.canvas = FigureCanvasTkAgg(self.fig, graph_frame)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Frame do gráfico (o matplotlib entra em `concluir_inicializacao`)
+        self.graph_frame = ttk.LabelFrame(main_frame, text="Gráfico de Preços", padding=10)
+        self.graph_frame.pack(fill=tk.BOTH, expand=True)
+        self.aviso_grafico = ttk.Label(self.graph_frame, text="Carregando gráfico...",
+                                       anchor='center', foreground='#7f8c8d')
+        self.aviso_grafico.pack(fill=tk.BOTH, expand=True)
         
         # Status bar
         self.status_var = tk.StringVar(value="Verificando conexão...")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, 
                               relief='sunken', style='TLabel')
         status_bar.pack(fill=tk.X, pady=(10, 0))
-        
-        # Texto inicial no gráfico
-        self.mostrar_mensagem_inicial()
     
     def mostrar_mensagem_inicial(self):
         """Mostra mensagem inicial no gráfico"""
+        self.renderizador.limpar()
         self.ax.clear()
         self.ax.text(0.5, 0.5, 'Clique em "INICIAR MONITORAMENTO" para carregar os dados\n\n' +
                     'Obtendo cotações em tempo real\n' +
@@ -166,248 +370,436 @@ class AnalisadorAcoes:
         self.status_var.set(f"{timestamp} - {mensagem}")
         self.root.update_idletasks()
     
-    def baixar_dados_simples(self, ticker):
-        """Baixa dados de forma simples e robusta"""
-        try:
-            # Usar método Ticker que é mais estável
-            acao = yf.Ticker(ticker)
-            
-            # Tentar diferentes períodos e intervalos
-            intervalos_tentativa = [
-                ("15m", "1d"),
-                ("1h", "2d"),
-                ("1d", "5d")
-            ]
-            
-            for intervalo, periodo in intervalos_tentativa:
-                try:
-                    dados = acao.history(period=periodo, interval=intervalo)
-                    if not dados.empty and len(dados) > 2:
-                        return dados
-                except:
-                    continue
-            
-            return None
-            
-        except Exception as e:
-            print(f"Erro ao baixar {ticker}: {e}")
-            return None
+    def atualizar_tabela(self):
+        """Pede à thread produtora as linhas da tabela que mudaram"""
+        self.solicitar_instantaneo(grafico=False)
     
-    def processar_dados_corrigido(self, dados, ticker):
-        """Processa e limpa os dados de forma correta"""
-        if dados is None or dados.empty:
-            return None
-            
-        try:
-            # Verificar se temos as colunas básicas
-            if 'Close' not in dados.columns:
-                return None
-            
-            # Garantir que o índice é datetime
-            if not isinstance(dados.index, pd.DatetimeIndex):
-                dados.index = pd.to_datetime(dados.index)
-            
-            # Ordenar por data
-            dados = dados.sort_index()
-            
-            # Preencher valores faltantes para Close
-            dados['Close'] = dados['Close'].ffill()
-            
-            # Se faltar outras colunas, criar com base no Close
-            if 'Open' not in dados.columns:
-                dados['Open'] = dados['Close']
-            if 'High' not in dados.columns:
-                dados['High'] = dados['Close']
-            if 'Low' not in dados.columns:
-                dados['Low'] = dados['Close']
-            
-            # Remover linhas com Close inválido
-            dados = dados[dados['Close'] > 0]
-            
-            if len(dados) < 2:
-                return None
-                
-            return dados.tail(50)  # Últimas 50 observações
-            
-        except Exception as e:
-            print(f"Erro processando {ticker}: {e}")
-            return None
+    def atualizar_grafico(self):
+        """Pede à thread produtora as séries atualizadas do gráfico"""
+        self.solicitar_instantaneo(tabela=False)
     
-    def formatar_volume(self, volume):
-        """Formata volume para formato legível"""
-        try:
-            volume_val = float(volume)
-            if volume_val >= 1_000_000_000:
-                return f"{volume_val/1_000_000_000:.1f} Bi"
-            elif volume_val >= 1_000_000:
-                return f"{volume_val/1_000_000:.1f} Mi"
-            elif volume_val >= 1_000:
-                return f"{volume_val/1_000:.1f} Mil"
-            else:
-                return f"{volume_val:.0f}"
-        except:
-            return "N/A"
+    def solicitar_instantaneo(self, tabela=True, grafico=True):
+        """Lê o estado da interface e pede um instantâneo novo"""
+        if self.produtor is None:
+            return
+        self.produtor.solicitar(self.acoes, self.acoes_no_grafico(),
+                                medias=self.mostrar_medias_var.get(),
+                                largura=self.renderizador.largura_pixels(),
+                                tabela=tabela, grafico=grafico)
     
-    def atualizar_tabela(self):
-        """Atualiza a tabela de cotações"""
-        # Limpar tabela
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Adicionar dados atualizados
-        for ticker, nome in self.acoes.items():
-            if ticker in self.dados_acoes and self.dados_acoes[ticker] is not None:
-                dados = self.dados_acoes[ticker]
-                if len(dados) > 1:
-                    try:
-                        ultimo = dados.iloc[-1]
-                        preco_anterior = dados.iloc[-2]['Close'] if len(dados) > 1 else ultimo['Close']
-                        
-                        variacao = ((ultimo['Close'] - preco_anterior) / preco_anterior) * 100
-                        hora_atualizacao = datetime.now().strftime('%H:%M:%S')
-                        
-                        # Obter mínimo e máximo do período disponível
-                        minimo = dados['Low'].min() if 'Low' in dados.columns else ultimo['Close']
-                        maximo = dados['High'].max() if 'High' in dados.columns else ultimo['Close']
-                        volume = ultimo.get('Volume', 0)
-                        
-                        item_id = self.tree.insert('', 'end', values=(
-                            f"{nome} ({ticker})",
-                            f"R$ {ultimo['Close']:.2f}",
-                            f"{variacao:+.2f}%",
-                            f"R$ {minimo:.2f}",
-                            f"R$ {maximo:.2f}",
-                            self.formatar_volume(volume),
-                            hora_atualizacao
-                        ))
-                        
-                        # Colorir variação (usando texto simples)
-                        if variacao < 0:
-                            self.tree.set(item_id, 'Variação %', f"▼ {variacao:+.2f}%")
-                        else:
-                            self.tree.set(item_id, 'Variação %', f"▲ {variacao:+.2f}%")
-                            
-                    except Exception as e:
-                        print(f"Erro ao adicionar {ticker} na tabela: {e}")
-                        continue
+    def aplicar_instantaneos(self):
+        """Aplica os instantâneos prontos: só diferenças, sem cálculo na thread do Tk"""
+        series = None
+        for instantaneo in self.produtor.coletar():
+            for ticker in instantaneo.remover:
+                self.pendentes_tabela.pop(ticker, None)
+                if self.tree.exists(ticker):
+                    self.tree.delete(ticker)
+            self.pendentes_tabela.update(instantaneo.linhas)
+            if instantaneo.ordem is not None:
+                self.ordem_tabela = instantaneo.ordem
+            self.reordenar_tabela = self.reordenar_tabela or instantaneo.reordenar
+            if instantaneo.series is not None:
+                series = instantaneo.series
+        
+        if self.pendentes_tabela and self.agendamento_tabela is None:
+            self.agendamento_tabela = self.root.after(0, self.aplicar_pendentes_tabela)
+        if series is not None:
+            self.aplicar_grafico(series)
     
-    def atualizar_grafico(self):
-        """Atualiza o gráfico com os dados mais recentes"""
+    def aplicar_pendentes_tabela(self):
+        """Aplica linhas da tabela até esgotar o orçamento do quadro e agenda o resto"""
+        self.agendamento_tabela = None
+        inicio = time.perf_counter()
+        limite = inicio + self.ORCAMENTO_QUADRO_MS / 1000
+        
+        while self.pendentes_tabela and time.perf_counter() < limite:
+            ticker = next(iter(self.pendentes_tabela))
+            valores = self.pendentes_tabela.pop(ticker)
+            try:
+                if self.tree.exists(ticker):
+                    self.tree.item(ticker, values=valores)
+                else:
+                    self.tree.insert('', 'end', iid=ticker, values=valores)
+            except Exception as e:
+                print(f"Erro ao adicionar {ticker} na tabela: {e}")
+        self.metricas.observar('tabela_segundos', time.perf_counter() - inicio, etapa='aplicar')
+        
+        if self.pendentes_tabela:
+            self.agendamento_tabela = self.root.after(1, self.aplicar_pendentes_tabela)
+        elif self.reordenar_tabela:
+            # Linhas novas entram no fim; reposicionar na ordem da lista de ações
+            self.reordenar_tabela = False
+            for posicao, ticker in enumerate(self.ordem_tabela):
+                if self.tree.exists(ticker):
+                    self.tree.move(ticker, '', posicao)
+    
+    def aplicar_grafico(self, series):
+        """Desenha séries já preparadas (convertidas e decimadas)"""
         try:
-            self.ax.clear()
-            
-            # Plotar cada ação que tem dados
-            cores = ['#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6', 
-                    '#1abc9c', '#d35400', '#c0392b', '#16a085']
-            
-            legend_labels = []
-            legend_lines = []
-            
-            for i, (ticker, nome) in enumerate(self.acoes.items()):
-                if ticker in self.dados_acoes and self.dados_acoes[ticker] is not None:
-                    dados = self.dados_acoes[ticker]
-                    if len(dados) > 5:
-                        cor = cores[i % len(cores)]
-                        line, = self.ax.plot(dados.index, dados['Close'], 
-                                           color=cor, linewidth=2.5, alpha=0.8)
-                        legend_labels.append(nome)
-                        legend_lines.append(line)
-            
-            if legend_labels:
-                self.ax.legend(legend_lines, legend_labels, bbox_to_anchor=(1.05, 1), loc='upper left')
-            
-            self.ax.set_title('Evolução dos Preços - Ações Brasileiras', 
-                            fontsize=14, fontweight='bold', pad=20, color='#2c3e50')
-            self.ax.set_ylabel('Preço (R$)', fontweight='bold', color='#2c3e50')
-            self.ax.grid(True, alpha=0.3)
-            self.ax.set_facecolor('#ecf0f1')
-            
-            # Formatar eixo x
-            if len(legend_labels) > 0:
-                self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M\n%d/%m'))
-                self.fig.autofmt_xdate()
-            
-            self.canvas.draw()
-            
+            inicio = time.perf_counter()
+            self.renderizador.aplicar(series)
+            self.metricas.observar('grafico_segundos', time.perf_counter() - inicio,
+                                   desenho=self.renderizador.ultimo_desenho or 'nenhum')
         except Exception as e:
             print(f"Erro ao atualizar gráfico: {e}")
             self.mostrar_mensagem_inicial()
     
-    def atualizar_dados(self):
-        """Atualiza dados em thread separada"""
+    def acoes_no_grafico(self):
+        """Ações selecionadas na tabela ou, sem seleção, as primeiras da lista"""
+        selecionadas = [t for t in self.tree.selection() if t in self.acoes]
+        if selecionadas:
+            return selecionadas[:self.MAX_LINHAS_GRAFICO]
+        return [t for t in self.acoes if t in self.nucleo.barras][:self.MAX_LINHAS_GRAFICO]
+    
+    def carregar_listas(self, caminhos, grupo_inicial=None):
+        """Lê os arquivos de listas em segundo plano, sem atrasar a abertura"""
+        def thread_listas():
+            listas = carregar_listas(caminhos)
+            # As regras podem citar grupos das listas, então vêm depois delas
+            if self.arquivos_alertas:
+                from alertas import carregar_arquivos_regras
+                self.nucleo.alertas.definir_regras(
+                    carregar_arquivos_regras(self.arquivos_alertas, listas))
+            # A carteira vira uma lista; sem --grupo, é ela que passa a ser monitorada
+            inicial = grupo_inicial
+            if self.arquivo_carteira:
+                from carteira import GRUPO_TODAS, carregar_carteira
+                try:
+                    carteira = carregar_carteira(self.arquivo_carteira)
+                    listas[carteira.nome] = carteira.lista()
+                    self.nucleo.definir_carteira(carteira)
+                    inicial = inicial or GRUPO_TODAS
+                except Exception as e:
+                    print(f"Erro ao carregar a carteira {self.arquivo_carteira}: {e}")
+            self.root.after(0, lambda: self.mostrar_listas(listas, inicial))
+        
+        threading.Thread(target=thread_listas, daemon=True).start()
+    
+    def mostrar_listas(self, listas, grupo_inicial=None):
+        """Disponibiliza as listas lidas dos arquivos (thread principal)"""
+        self.listas.update(listas)
+        self.lista_combo['values'] = list(self.listas)
+        if grupo_inicial:
+            for nome, lista in self.listas.items():
+                if grupo_inicial in lista.grupos:
+                    self.lista_var.set(nome)
+                    self.selecionar_lista(grupo_inicial)
+                    return
+            self.atualizar_status(f"Grupo '{grupo_inicial}' não encontrado nas listas")
+    
+    def mostrar_alerta(self, alerta):
+        """Mostra um alerta disparado na barra de status (thread principal)"""
+        self.atualizar_status(f"ALERTA {alerta.mensagem}")
+    
+    def selecionar_lista(self, grupo=None):
+        """Troca a lista ativa e mostra o primeiro grupo dela"""
+        self.lista_atual = self.listas[self.lista_var.get()]
+        grupos = list(self.lista_atual.grupos) or ['Todos']
+        self.grupo_combo['values'] = grupos
+        self.grupo_var.set(grupo if grupo in grupos else grupos[0])
+        self.selecionar_grupo()
+    
+    def selecionar_grupo(self):
+        """Monitora as ações do grupo escolhido"""
+        grupo = self.grupo_var.get()
+        acoes = self.lista_atual.acoes(grupo if grupo in self.lista_atual.grupos else None)
+        self.trocar_acoes(acoes, f"{self.lista_atual.nome} / {grupo}")
+    
+    def buscar_acoes(self):
+        """Monitora as ações da lista ativa que casam com o texto da busca"""
+        texto = self.busca_var.get()
+        acoes = self.lista_atual.buscar(texto)
+        if not acoes:
+            self.atualizar_status(f"Nenhuma ação encontrada para '{texto}'")
+            return
+        self.trocar_acoes(acoes, f"busca '{texto}'")
+    
+    def trocar_acoes(self, acoes, descricao):
+        """Troca as ações monitoradas; o cache das novas é lido em segundo plano"""
+        if self.trocando_grupo or self.nucleo is None:
+            return
+        self.trocando_grupo = True
+        self.atualizar_status(f"Carregando {descricao} ({len(acoes)} ações)...")
+        
+        def thread_troca():
+            try:
+                self.nucleo.carregar_cache([t for t in acoes if t not in self.nucleo.barras])
+            except Exception as e:
+                print(f"Erro ao carregar o cache das ações: {e}")
+            self.root.after(0, lambda: self.finalizar_troca(acoes, descricao))
+        
+        threading.Thread(target=thread_troca, daemon=True).start()
+    
+    def finalizar_troca(self, acoes, descricao):
+        """Mostra as ações do novo grupo e agenda a busca das que faltam"""
+        self.trocando_grupo = False
+        # A troca do dicionário acontece na thread do Tk, que é quem o percorre
+        self.nucleo.definir_acoes(acoes, carregar=False)
+        self.renderizador.invalidar()
+        self.atualizar_tabela()
+        self.atualizar_grafico()
+        
+        # Indicadores das ações novas (e sem as que saíram) fora da thread do Tk
+        def thread_indicadores():
+            self.nucleo.atualizar_indicadores()
+            self.root.after(0, self.atualizar_tabela)
+        
+        threading.Thread(target=thread_indicadores, daemon=True).start()
+        self.atualizar_status(f"{descricao}: {len(self.acoes)} ações")
         if self.monitorando:
+            self.verificar_agenda()
+    
+    def alternar_medias(self):
+        """Mostra ou esconde as médias móveis no gráfico"""
+        if self.nucleo is not None and self.nucleo.barras.linhas:
+            self.renderizador.invalidar()
+            self.atualizar_grafico()
+    
+    def atualizar_dados(self, tickers=None):
+        """Atualiza dados em thread separada"""
+        tickers = list(self.acoes) if tickers is None else list(tickers)
+        if len(tickers) > self.MAX_POR_ATUALIZACAO:
+            # Listas grandes são buscadas em partes, uma atualização por vez
+            self.tickers_pendentes.update(tickers[self.MAX_POR_ATUALIZACAO:])
+            tickers = tickers[:self.MAX_POR_ATUALIZACAO]
+        if self.atualizando:
+            # Já existe uma atualização em andamento: estes tickers entram na próxima
+            self.tickers_pendentes.update(t for t in tickers if t not in self.tickers_em_andamento)
             return
+        
+        self.atualizando = True
+        self.tickers_em_andamento = set(tickers)
+        self.cancelar_evento.clear()
+        modo_lote = self.modo_lote_var.get()
+        self.atualizar_status("Iniciando atualização de dados...")
             
         def thread_atualizacao():
-            self.monitorando = True
-            self.root.after(0, lambda: self.btn_iniciar.config(state='disabled'))
-            self.root.after(0, lambda: self.btn_parar.config(state='normal'))
-            self.root.after(0, lambda: self.atualizar_status("Iniciando atualização de dados..."))
+            total = len(tickers)
+            concluidos = [0]
+            
+            def ao_concluir(resultado):
+                concluidos[0] += 1
+                nome = self.acoes.get(resultado.ticker, resultado.ticker)
+                msg = f"Obtido {nome} ({concluidos[0]}/{total})"
+                self.root.after(0, lambda: self.atualizar_status(msg))
             
             try:
-                for i, (ticker, nome) in enumerate(self.acoes.items()):
-                    if not self.monitorando:
-                        break
-                    
-                    self.root.after(0, lambda msg=f"Obtendo {nome}...": self.atualizar_status(msg))
-                    
-                    # Baixar e processar dados
-                    dados_brutos = self.baixar_dados_simples(ticker)
-                    dados_processados = self.processar_dados_corrigido(dados_brutos, ticker)
-                    
-                    if dados_processados is not None:
-                        self.dados_acoes[ticker] = dados_processados
-                    
-                    time.sleep(0.5)  # Pausa menor entre requisições
-                
-                if self.monitorando:
-                    self.ultima_atualizacao = datetime.now()
-                    self.root.after(0, self.finalizar_atualizacao)
+                resultados = self.nucleo.atualizar(tickers, lote=modo_lote,
+                                                   ao_concluir=ao_concluir,
+                                                   cancelado=self.cancelar_evento.is_set)
+                # Os cancelados ficam de fora: não foram buscados
+                buscados = [t for t in tickers if t in resultados]
+                self.root.after(0, lambda: self.finalizar_atualizacao(buscados))
                     
             except Exception as e:
-                self.root.after(0, lambda: self.atualizar_status(f"Erro na atualização: {str(e)}"))
+                erro = str(e)
+                self.root.after(0, lambda: self.finalizar_atualizacao([], erro))
         
         threading.Thread(target=thread_atualizacao, daemon=True).start()
     
-    def finalizar_atualizacao(self):
+    def finalizar_atualizacao(self, tickers, erro=None):
         """Finaliza a atualização na thread principal"""
-        self.atualizar_tabela()
-        self.atualizar_grafico()
+        self.atualizando = False
+        self.tickers_em_andamento = set()
         
-        tempo_decorrido = datetime.now().strftime('%H:%M:%S')
-        self.atualizar_status(f"Dados atualizados com sucesso! ({tempo_decorrido})")
+        if erro is not None:
+            self.atualizar_status(f"Erro na atualização: {erro}")
+        else:
+            self.atualizar_tabela()
+            self.atualizar_grafico()
+            
+            tempo_decorrido = datetime.now().strftime('%H:%M:%S')
+            if not self.nucleo.fonte_disponivel():
+                self.atualizar_status(f"Fonte indisponível - novas tentativas em instantes ({tempo_decorrido})")
+            elif self.nucleo.falhas_ultima_atualizacao:
+                self.atualizar_status(f"Dados atualizados ({self.nucleo.falhas_ultima_atualizacao} falhas) ({tempo_decorrido})")
+            else:
+                self.atualizar_status(f"Dados atualizados com sucesso! ({tempo_decorrido})")
         
-        # Reativar botão iniciar
-        self.root.after(0, lambda: self.btn_iniciar.config(state='normal'))
+        if self.arquivo_metricas:
+            try:
+                self.metricas.gravar_prometheus(self.arquivo_metricas)
+            except OSError as e:
+                print(f"Erro ao gravar métricas: {e}")
+        
+        # Próxima atualização de cada ação conforme a cadência dela
+        volatilidades = {ticker: valores.get('volatilidade')
+                         for ticker, valores in self.nucleo.valores_indicadores.items()}
+        self.agendador.registrar(tickers, time.time(), volatilidades)
+        
+        # Atualizações pedidas enquanto esta rodava (a não ser que PARAR tenha cancelado)
+        if self.cancelar_evento.is_set():
+            self.tickers_pendentes.clear()
+        elif self.tickers_pendentes:
+            pendentes = [t for t in self.acoes if t in self.tickers_pendentes]
+            self.tickers_pendentes.clear()
+            self.atualizar_dados(pendentes)
+    
+    def verificar_agenda(self):
+        """Dispara as ações vencidas e agenda a próxima verificação"""
+        self.agendamento_agenda = None
+        if not self.monitorando:
+            return
+        
+        agora = time.time()
+        if self.auto_update_var.get():
+            if self.agendador.mercado_aberto():
+                vencidos = [t for t in self.agendador.vencidos(self.acoes, agora,
+                                                               self.MAX_POR_ATUALIZACAO)
+                            if t not in self.tickers_em_andamento]
+                if vencidos:
+                    self.atualizar_dados(vencidos)
+            elif not self.atualizando:
+                abertura = self.agendador.calendario.proxima_abertura()
+                self.atualizar_status(f"Mercado fechado - próxima abertura {abertura:%d/%m %H:%M}")
+        
+        espera = self.agendador.segundos_ate_proximo(self.acoes, agora)
+        espera = min(max(espera, 0.5), self.ESPERA_MAXIMA_AGENDA)
+        self.agendamento_agenda = self.root.after(int(espera * 1000), self.verificar_agenda)
+    
+    def abrir_diagnostico(self):
+        """Abre (ou traz para frente) a janela de diagnóstico das atualizações"""
+        if self.janela_diagnostico is not None and self.janela_diagnostico.winfo_exists():
+            self.janela_diagnostico.lift()
+            return
         
-        # Agendar próxima atualização se automática estiver ativada
-        if self.auto_update_var.get() and self.monitorando:
-            self.root.after(120000, self.atualizar_dados)  # 2 minutos
+        janela = tk.Toplevel(self.root)
+        janela.title("Diagnóstico")
+        janela.geometry("720x520")
+        texto = tk.Text(janela, font=('Courier New', 10), wrap='none')
+        texto.pack(fill=tk.BOTH, expand=True)
+        self.janela_diagnostico = janela
+        self.texto_diagnostico = texto
+        self.atualizar_diagnostico()
+    
+    def abrir_historico(self):
+        """Abre a janela do histórico longo da ação selecionada (ou da primeira)"""
+        from janela_historico import JanelaHistorico
+        selecionadas = [t for t in self.tree.selection() if t in self.acoes]
+        JanelaHistorico(self.root, self.nucleo, self.acoes,
+                        selecionadas[0] if selecionadas else None)
+    
+    def abrir_carteira(self):
+        """Abre (ou traz para a frente) a janela da carteira"""
+        if self.janela_carteira is not None and self.janela_carteira.janela.winfo_exists():
+            self.janela_carteira.janela.lift()
+            return
+        if self.nucleo.carteira is None:
+            self.atualizar_status("Nenhuma carteira carregada (use --carteira ARQUIVO)")
+            return
+        from janela_carteira import JanelaCarteira
+        self.janela_carteira = JanelaCarteira(self.root, self.nucleo)
+    
+    def abrir_triagem(self):
+        """Abre (ou traz para a frente) a janela de triagem e correlação"""
+        if self.janela_triagem is not None and self.janela_triagem.janela.winfo_exists():
+            self.janela_triagem.janela.lift()
+            return
+        from janela_triagem import JanelaTriagem
+        self.janela_triagem = JanelaTriagem(self.root, self.nucleo)
+    
+    def atualizar_diagnostico(self):
+        """Reescreve o painel de diagnóstico com as métricas atuais"""
+        if self.janela_diagnostico is None or not self.janela_diagnostico.winfo_exists():
+            self.janela_diagnostico = None
+            return
+        
+        metricas = self.metricas.instantaneo()
+        linhas = [f"{'Etapa':<44}{'n':>6}{'média':>9}{'p50':>9}{'p90':>9}{'máx':>9}  (ms)"]
+        for nome, tempo in sorted(metricas['tempos'].items()):
+            linhas.append(f"{nome:<44}{tempo['contagem']:>6}{tempo['media'] * 1000:>9.1f}"
+                          f"{tempo.get('p50', 0) * 1000:>9.1f}{tempo.get('p90', 0) * 1000:>9.1f}"
+                          f"{tempo.get('max', 0) * 1000:>9.1f}")
+        
+        contadores = metricas['contadores']
+        acertos = self.metricas.contador('cache_total', resultado='acerto')
+        total_cache = self.metricas.contador('cache_total')
+        linhas.append("")
+        if total_cache:
+            linhas.append(f"Cache: {acertos}/{total_cache} acertos ({acertos / total_cache:.0%})")
+        linhas.append(f"Fonte: {self.fonte.nome} ({self.fonte.host}) - disjuntor "
+                      f"{self.nucleo.disjuntor().estado}")
+        linhas.append(f"Armazém: {self.nucleo.barras.memoria_bytes() / 1e6:.1f} MB")
+        linhas.append("")
+        for nome, valor in sorted(contadores.items()):
+            linhas.append(f"{nome:<50}{valor:>10}")
+        
+        # Latência da última busca de cada ação, das mais lentas para as mais rápidas
+        ultimas = self.nucleo.motor.mais_lentas(20)
+        if ultimas:
+            linhas.append("")
+            linhas.append("Última busca por ação (ms):")
+            for valor, ticker in ultimas:
+                linhas.append(f"  {ticker:<20}{valor * 1000:>9.1f}")
+        
+        self.texto_diagnostico.delete('1.0', tk.END)
+        self.texto_diagnostico.insert('1.0', '\n'.join(linhas))
+        self.root.after(self.INTERVALO_DIAGNOSTICO, self.atualizar_diagnostico)
     
     def iniciar_monitoramento(self):
         """Inicia o monitoramento"""
-        self.atualizar_dados()
+        self.monitorando = True
+        self.btn_iniciar.config(state='disabled')
+        self.btn_parar.config(state='normal')
+        
+        # Primeira carga: com o mercado fechado, só se ainda não houver dados
+        if self.agendador.mercado_aberto() or not self.dados_acoes:
+            self.atualizar_dados()
+        self.verificar_agenda()
     
     def parar_monitoramento(self):
         """Para o monitoramento"""
         self.monitorando = False
+        self.cancelar_evento.set()
+        self.tickers_pendentes.clear()
+        if self.agendamento_agenda is not None:
+            self.root.after_cancel(self.agendamento_agenda)
+            self.agendamento_agenda = None
         self.btn_parar.config(state='disabled')
         self.btn_iniciar.config(state='normal')
         self.atualizar_status("Monitoramento parado")
 
 def verificar_dependencias():
-    """Verifica se todas as dependências estão instaladas"""
-    try:
-        import yfinance
-        import pandas
-        import matplotlib
-        return True
-    except ImportError as e:
-        print(f"Dependência faltando: {e}")
+    """Verifica se todas as dependências estão instaladas (sem importá-las)"""
+    faltando = [modulo for modulo in ('yfinance', 'pandas', 'matplotlib')
+                if importlib.util.find_spec(modulo) is None]
+    if faltando:
+        print(f"Dependência faltando: {', '.join(faltando)}")
         return False
+    return True
+
+def ler_argumentos():
+    """Lê as opções de linha de comando"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Analisador de Ações Brasileiras")
+    parser.add_argument("--fonte", default="yahoo",
+                        help="Fonte de dados: 'yahoo', 'replay[:PASTA]' (CSV/Parquet ou "
+                             "sintético) ou 'gravacao:ARQUIVO' (sessão gravada com --gravar)")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="Velocidade do relógio da fonte replay (ex.: 60 = 1 minuto por segundo)")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Latência simulada por requisição da fonte replay, em segundos")
+    parser.add_argument("--lista", action="append",
+                        help="Arquivo CSV/JSON/TOML (ou pasta) com listas de ações; pode repetir")
+    parser.add_argument("--grupo", help="Grupo da lista monitorado ao abrir")
+    parser.add_argument("--log-json", help="Anexar um resumo JSON de cada atualização a este arquivo")
+    parser.add_argument("--metricas-arquivo",
+                        help="Gravar as métricas (formato Prometheus) neste arquivo")
+    parser.add_argument("--alertas", action="append",
+                        help="Arquivo TOML/JSON com regras de alerta (ver alertas.py); pode repetir")
+    parser.add_argument("--webhook", help="URL que recebe cada alerta por POST (JSON)")
+    parser.add_argument("--processos", type=int,
+                        help="Buscar em N processos (listas com centenas de ações)")
+    parser.add_argument("--gravar", nargs="?", const=AnalisadorAcoes.PASTA_GRAVACOES,
+                        help="Gravar as barras vistas na sessão (em PASTA, padrão: gravacoes/)")
+    parser.add_argument("--carteira",
+                        help="Arquivo CSV/JSON/TOML com as posições da carteira (ver carteira.py)")
+    return parser.parse_args()
 
 def main():
     """Função principal"""
+    argumentos = ler_argumentos()
     print("Iniciando Analisador de Ações Brasileiras...")
     
     if not verificar_dependencias():
@@ -427,7 +819,15 @@ def main():
     
     # Criar aplicação
     root = tk.Tk()
-    app = AnalisadorAcoes(root)
+    # A fonte é criada junto com o núcleo, em segundo plano
+    opcoes_fonte = {'especificacao': argumentos.fonte, 'velocidade': argumentos.velocidade,
+                    'latencia': argumentos.latencia}
+    app = AnalisadorAcoes(root, opcoes_fonte=opcoes_fonte, log_json=argumentos.log_json,
+                          arquivo_metricas=argumentos.metricas_arquivo,
+                          arquivos_listas=argumentos.lista, grupo_inicial=argumentos.grupo,
+                          arquivos_alertas=argumentos.alertas, webhook=argumentos.webhook,
+                          processos=argumentos.processos, gravar=argumentos.gravar,
+                          arquivo_carteira=argumentos.carteira)
     
     # Centralizar janela
     root.update_idletasks()
@@ -440,6 +840,11 @@ def main():
     # Configurar fechamento
     def on_closing():
         app.monitorando = False
+        app.cancelar_evento.set()
+        if app.produtor is not None:
+            app.produtor.parar()
+        if app.nucleo is not None:
+            app.nucleo.fechar()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
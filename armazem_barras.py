@@ -0,0 +1,236 @@
+"""Armazém colunar de barras OHLCV em memória
+
+Em vez de um DataFrame por ação, todas as barras ficam em dois blocos NumPy
+pré-alocados: `precos[linha, campo, posição]` (Open, High, Low, Close, Volume)
+e `horarios[linha, posição]`, com uma linha por ticker. Cada linha é um anel
+espelhado: a barra na posição p é gravada em p e em p + capacidade, então as
+últimas k barras sempre formam uma fatia contígua e podem ser lidas sem cópia.
+"""
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+CAMPOS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+class ArmazemBarras:
+    """Barras de todas as ações em anéis NumPy, com memória limitada
+
+    `capacidade_barras` é o número de barras guardadas por ticker e
+    `max_tickers` o número máximo de tickers; ao passar do limite, o ticker
+    atualizado há mais tempo é descartado. Memória ocupada:
+    max_tickers x capacidade_barras x 2 x 6 x 8 bytes.
+    """
+
+    def __init__(self, capacidade_barras=256, max_tickers=1024, tickers_iniciais=16):
+        self.capacidade = int(capacidade_barras)
+        self.max_tickers = int(max_tickers)
+        self.trava = threading.Lock()
+        self.linhas = {}
+        self.livres = []
+        self.fusos = []
+        self.uso = []
+        self.relogio = 0
+        self._alocar(min(int(tickers_iniciais), self.max_tickers))
+
+    def _alocar(self, linhas):
+        """Aloca (ou amplia) os blocos para `linhas` tickers"""
+        largura = 2 * self.capacidade
+        precos = np.full((linhas, len(CAMPOS), largura), np.nan)
+        horarios = np.zeros((linhas, largura), dtype=np.int64)
+        escrita = np.full(linhas, -1, dtype=np.int64)
+        total = np.zeros(linhas, dtype=np.int64)
+
+        anteriores = len(self.fusos)
+        if anteriores:
+            precos[:anteriores] = self.precos
+            horarios[:anteriores] = self.horarios
+            escrita[:anteriores] = self.escrita
+            total[:anteriores] = self.total
+        self.precos, self.horarios, self.escrita, self.total = precos, horarios, escrita, total
+        self.livres.extend(range(linhas - 1, anteriores - 1, -1))
+        self.fusos.extend([None] * (linhas - anteriores))
+        self.uso.extend([0] * (linhas - anteriores))
+
+    def memoria_bytes(self):
+        return self.precos.nbytes + self.horarios.nbytes
+
+    def __contains__(self, ticker):
+        return ticker in self.linhas
+
+    def tickers(self):
+        return list(self.linhas)
+
+    def _linha(self, ticker):
+        linha = self.linhas.get(ticker)
+        if linha is not None:
+            return linha
+        if not self.livres:
+            if len(self.fusos) < self.max_tickers:
+                self._alocar(min(2 * len(self.fusos), self.max_tickers))
+            else:
+                # Limite atingido: reaproveita a linha do ticker menos recente
+                antigo = min(self.linhas, key=lambda t: self.uso[self.linhas[t]])
+                self._liberar(antigo)
+        linha = self.livres.pop()
+        self.escrita[linha] = -1
+        self.total[linha] = 0
+        self.linhas[ticker] = linha
+        return linha
+
+    def _liberar(self, ticker):
+        linha = self.linhas.pop(ticker)
+        self.fusos[linha] = None
+        self.livres.append(linha)
+
+    def remover(self, ticker):
+        with self.trava:
+            if ticker in self.linhas:
+                self._liberar(ticker)
+
+    def gravar(self, ticker, dados):
+        """Acrescenta as barras novas do quadro; a última barra pode ser revisada
+
+        Barras anteriores à última armazenada são ignoradas. Devolve o número
+        de barras gravadas (novas ou revisadas).
+        """
+        if dados is None or len(dados) == 0:
+            return 0
+        indice = pd.DatetimeIndex(dados.index)
+        fuso = indice.tz
+        if fuso is not None:
+            indice = indice.tz_convert('UTC').tz_localize(None)
+        ts = indice.values.astype('datetime64[ns]').astype(np.int64)
+        valores = dados.reindex(columns=list(CAMPOS)).to_numpy(dtype=float)
+        return self.gravar_vetores(ticker, ts, valores, fuso)
+
+    def gravar_vetores(self, ticker, ts, valores, fuso=None):
+        """Como `gravar`, a partir de horários (ns, UTC, crescentes) e valores OHLCV (n x 5)"""
+        if len(ts) == 0:
+            return 0
+        with self.trava:
+            linha = self._linha(ticker)
+            self.relogio += 1
+            self.uso[linha] = self.relogio
+            self.fusos[linha] = fuso
+            c = self.capacidade
+            escrita = int(self.escrita[linha])
+            total = int(self.total[linha])
+
+            inicio = 0
+            gravadas = 0
+            if total:
+                ultimo = self.horarios[linha, escrita]
+                inicio = int(np.searchsorted(ts, ultimo, side='left'))
+                if inicio < len(ts) and ts[inicio] == ultimo:
+                    # Revisão da última barra (ainda em formação): grava no lugar
+                    self.precos[linha, :, escrita] = valores[inicio]
+                    self.precos[linha, :, escrita + c] = valores[inicio]
+                    inicio += 1
+                    gravadas = 1
+
+            novos = len(ts) - inicio
+            if novos <= 0:
+                return gravadas
+            if novos > c:
+                inicio = len(ts) - c
+                novos = c
+
+            posicoes = (escrita + 1 + np.arange(novos)) % c
+            # Índices avançados separados por fatia: o eixo das posições vem primeiro
+            self.precos[linha, :, posicoes] = valores[inicio:]
+            self.precos[linha, :, posicoes + c] = valores[inicio:]
+            self.horarios[linha, posicoes] = ts[inicio:]
+            self.horarios[linha, posicoes + c] = ts[inicio:]
+            # Publica por último: leitores só enxergam as barras já gravadas
+            self.total[linha] = min(c, total + novos)
+            self.escrita[linha] = posicoes[-1]
+            return gravadas + novos
+
+    def _fatia(self, linha, n):
+        total = int(self.total[linha])
+        n = total if n is None else min(int(n), total)
+        fim = int(self.escrita[linha]) + self.capacidade + 1
+        return fim - n, fim
+
+    def vista(self, ticker, campo, n=None):
+        """Últimas `n` barras de um campo, sem cópia (somente leitura)"""
+        linha = self.linhas[ticker]
+        inicio, fim = self._fatia(linha, n)
+        if campo == 'ts':
+            vista = self.horarios[linha, inicio:fim]
+        else:
+            vista = self.precos[linha, CAMPOS.index(campo), inicio:fim]
+        vista = vista.view()
+        vista.flags.writeable = False
+        return vista
+
+    def ultimo_horario(self, ticker):
+        linha = self.linhas.get(ticker)
+        if linha is None or not self.total[linha]:
+            return None
+        return pd.Timestamp(int(self.horarios[linha, self.escrita[linha]]), tz='UTC')
+
+    def quadro(self, ticker, n=None, copiar=False):
+        """Últimas `n` barras como DataFrame que compartilha a memória do armazém
+
+        Com `copiar=True` as barras são copiadas sob a trava: o quadro fica
+        independente de gravações posteriores e pode ir para outra thread.
+        """
+        if copiar:
+            with self.trava:
+                return self._quadro(ticker, n, copiar)
+        return self._quadro(ticker, n, copiar)
+
+    def _quadro(self, ticker, n, copiar):
+        linha = self.linhas.get(ticker)
+        if linha is None or not self.total[linha]:
+            return None
+        inicio, fim = self._fatia(linha, n)
+        valores = self.precos[linha, :, inicio:fim].T
+        horarios = self.horarios[linha, inicio:fim]
+        if copiar:
+            valores, horarios = valores.copy(), horarios.copy()
+        indice = pd.DatetimeIndex(horarios.view('datetime64[ns]'))
+        fuso = self.fusos[linha]
+        if fuso is not None:
+            indice = indice.tz_localize('UTC').tz_convert(fuso)
+        return pd.DataFrame(valores, index=indice, columns=list(CAMPOS), copy=False)
+
+
+class VistaQuadros(Mapping):
+    """Acesso ticker -> DataFrame sobre o armazém, no lugar do antigo dicionário
+
+    Os quadros são montados sob demanda com as últimas `janela` barras e
+    compartilham a memória do armazém (ou são cópias, com `copiar=True`).
+    Com `tickers`, a vista mostra só esses (os monitorados), mesmo que o
+    armazém ainda guarde outros.
+    """
+
+    def __init__(self, armazem, janela=50, copiar=False, tickers=None):
+        self.armazem = armazem
+        self.janela = janela
+        self.copiar = copiar
+        self.restringir(tickers)
+
+    def restringir(self, tickers):
+        """Passa a mostrar só `tickers` (None mostra todos os do armazém)"""
+        self.visiveis = None if tickers is None else frozenset(tickers)
+
+    def _visivel(self, ticker):
+        return self.visiveis is None or ticker in self.visiveis
+
+    def __getitem__(self, ticker):
+        dados = (self.armazem.quadro(ticker, self.janela, self.copiar)
+                 if ticker in self.armazem and self._visivel(ticker) else None)
+        if dados is None:
+            raise KeyError(ticker)
+        return dados
+
+    def __iter__(self):
+        return iter([ticker for ticker in self.armazem.tickers() if self._visivel(ticker)])
+
+    def __len__(self):
+        return sum(1 for ticker in self.armazem.tickers() if self._visivel(ticker))
@@ -0,0 +1,302 @@
+"""Benchmark do pipeline de processamento, tabela, indicadores e gráfico
+
+Roda sem rede, sobre barras OHLCV sintéticas (FonteReplay), variando o número
+de ações e de barras por ação. Para cada caso mede a latência (p50/p90/p99),
+a vazão e o pico de memória, grava tudo em JSON e, com --base, compara com
+um resultado salvo antes e acusa regressões:
+
+    python benchmark.py --saida base.json
+    python benchmark.py --base base.json --tolerancia 0.25
+
+O gráfico é desenhado com o backend Agg, sem janela.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from armazem_barras import ArmazemBarras
+from fonte_dados import FonteReplay
+from grafico_rapido import RenderizadorGrafico, datas_para_num, decimar_min_max, preparar_series
+from indicadores import IndicadoresIncrementais, calcular_indicadores, montar_painel
+from nucleo import NucleoCotacoes
+from tabela_incremental import ModeloTabela
+
+TICKERS = (10, 100, 1000, 5000)
+BARRAS = (50, 1000, 10000, 100000)
+# Casos maiores que isto (ações x barras) são pulados para caber na memória
+MAX_CELULAS = 5_000_000
+# O aplicativo desenha no máximo esta quantidade de linhas no gráfico
+LINHAS_GRAFICO = 9
+# Pontos por linha no gráfico (largura típica em pixels)
+LARGURA_GRAFICO = 1200
+# Diferenças menores que isto (s) não contam como regressão (ruído de medição)
+DIFERENCA_MINIMA = 0.0005
+
+
+def gerar_dados(tickers, barras, semente=0):
+    """Quadros OHLCV sintéticos e reproduzíveis: ticker -> DataFrame"""
+    fonte = FonteReplay(velocidade=0, semente=semente, barras_iniciais=barras,
+                        barras_sinteticas=barras)
+    return {f'T{i:04d}.SA': fonte.historico(f'T{i:04d}.SA', '15m', periodo='max')
+            for i in range(tickers)}
+
+
+def resumir(amostras, itens):
+    amostras = np.asarray(amostras)
+    mediana = float(np.median(amostras))
+    return {
+        'repeticoes': len(amostras),
+        'media': float(amostras.mean()),
+        'p50': mediana,
+        'p90': float(np.quantile(amostras, 0.9)),
+        'p99': float(np.quantile(amostras, 0.99)),
+        'vazao': itens / mediana if mediana > 0 else None,
+    }
+
+
+def medir(funcao, repeticoes, preparar=None):
+    """Tempo de cada execução de `funcao(estado)`; `preparar()` não entra na conta"""
+    tempos = []
+    for _ in range(repeticoes):
+        estado = preparar() if preparar is not None else None
+        inicio = time.perf_counter()
+        funcao(estado)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def pico_memoria(funcao, preparar=None):
+    """Pico de memória alocada (MB) durante uma execução de `funcao`"""
+    estado = preparar() if preparar is not None else None
+    tracemalloc.start()
+    try:
+        funcao(estado)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico / 1e6
+
+
+def casos(dados, barras):
+    """Casos do benchmark: nome -> (preparar, funcao, itens medidos, unidade)"""
+    nucleo = NucleoCotacoes(fonte=FonteReplay())
+    tickers = list(dados)
+    acoes = {t: t for t in tickers}
+
+    def processar(_):
+        for ticker, quadro in dados.items():
+            nucleo.processar_dados_corrigido(quadro.copy(), ticker)
+
+    def gravar_armazem(armazem):
+        for ticker, quadro in dados.items():
+            armazem.gravar(ticker, quadro)
+
+    def indicadores_vetorizados(_):
+        calcular_indicadores(montar_painel(dados, tickers))
+
+    def preparar_incrementais():
+        incrementais = IndicadoresIncrementais()
+        incrementais.atualizar(dados)
+        ultimo = next(iter(dados.values())).index[-1]
+        fechamento = np.array([d['Close'].iat[-1] for d in dados.values()])
+        return incrementais, ultimo + pd.Timedelta(minutes=15), fechamento
+
+    def indicadores_nova_barra(estado):
+        incrementais, horario, fechamento = estado
+        incrementais.adicionar(horario, fechamento * 1.001, fechamento * 0.999,
+                               fechamento, np.full(len(fechamento), 1000.0))
+        incrementais.valores()
+
+    def tabela_inicial(modelo):
+        modelo.diferencas(acoes, dados)
+
+    def preparar_tabela_revisada():
+        modelo = ModeloTabela()
+        modelo.diferencas(acoes, dados)
+        # Última barra revisada em todas as ações (cotação em andamento)
+        revisados = {}
+        for ticker, quadro in dados.items():
+            quadro = quadro.copy()
+            quadro.iloc[-1, quadro.columns.get_loc('Close')] *= 1.001
+            revisados[ticker] = quadro
+        return modelo, revisados
+
+    def tabela_revisada(estado):
+        modelo, revisados = estado
+        modelo.diferencas(acoes, revisados)
+
+    def preparar_grafico(desenhar=True):
+        figura, eixo = plt.subplots(figsize=(12, 6))
+        figura.set_dpi(LARGURA_GRAFICO / 12)
+        canvas = FigureCanvasAgg(figura)
+        renderizador = RenderizadorGrafico(figura, eixo, canvas)
+        series = [(t, t, dados[t]) for t in tickers[:LINHAS_GRAFICO]]
+        if desenhar:
+            renderizador.atualizar(series)
+        return figura, renderizador, series
+
+    def grafico_completo(estado):
+        _, renderizador, series = estado
+        renderizador.atualizar(series)
+
+    def preparar_grafico_blit():
+        figura, renderizador, series = preparar_grafico()
+        revisadas = []
+        for ticker, nome, quadro in series:
+            quadro = quadro.copy()
+            quadro.iloc[-1, quadro.columns.get_loc('Close')] *= 1.0001
+            revisadas.append((ticker, nome, quadro))
+        return figura, renderizador, revisadas
+
+    def preparar_grafico_aplicar():
+        # Só a parte que roda na thread do Tk: séries já preparadas em outra thread
+        figura, renderizador, revisadas = preparar_grafico_blit()
+        return figura, renderizador, preparar_series(revisadas, renderizador.largura_pixels())
+
+    def grafico_aplicar(estado):
+        _, renderizador, preparadas = estado
+        renderizador.aplicar(preparadas)
+
+    def decimar(_):
+        for ticker in tickers[:LINHAS_GRAFICO]:
+            quadro = dados[ticker]
+            decimar_min_max(datas_para_num(quadro.index), quadro['Close'].to_numpy(), LARGURA_GRAFICO)
+
+    linhas = min(len(tickers), LINHAS_GRAFICO)
+    total_barras = len(tickers) * barras
+    return {
+        'processamento': (None, processar, len(tickers), 'ações/s'),
+        'armazem': (lambda: ArmazemBarras(barras, max_tickers=len(tickers)), gravar_armazem,
+                    total_barras, 'barras/s'),
+        'indicadores_vetorizados': (None, indicadores_vetorizados, total_barras, 'barras/s'),
+        'indicadores_nova_barra': (preparar_incrementais, indicadores_nova_barra,
+                                   len(tickers), 'ações/s'),
+        'tabela_inicial': (ModeloTabela, tabela_inicial, len(tickers), 'linhas/s'),
+        'tabela_revisada': (preparar_tabela_revisada, tabela_revisada, len(tickers), 'linhas/s'),
+        'grafico_decimacao': (None, decimar, linhas * barras, 'pontos/s'),
+        'grafico_completo': (lambda: preparar_grafico(desenhar=False), grafico_completo,
+                             linhas, 'linhas/s'),
+        'grafico_blit': (preparar_grafico_blit, grafico_completo, linhas, 'linhas/s'),
+        'grafico_aplicar_blit': (preparar_grafico_aplicar, grafico_aplicar, linhas, 'linhas/s'),
+    }
+
+
+def executar(tickers_opcoes, barras_opcoes, repeticoes, max_celulas, filtro=None):
+    resultados = []
+    for barras in barras_opcoes:
+        for tickers in tickers_opcoes:
+            if tickers * barras > max_celulas:
+                continue
+            inicio = time.perf_counter()
+            dados = gerar_dados(tickers, barras)
+            print(f"\n{tickers} ações x {barras} barras "
+                  f"(dados gerados em {time.perf_counter() - inicio:.1f}s)")
+            for nome, (preparar, funcao, itens, unidade) in casos(dados, barras).items():
+                if filtro and not any(parte in nome for parte in filtro):
+                    continue
+                tempos = medir(funcao, repeticoes, preparar)
+                resultado = {'caso': nome, 'tickers': tickers, 'barras': barras,
+                             'unidade': unidade, **resumir(tempos, itens),
+                             'memoria_pico_mb': pico_memoria(funcao, preparar)}
+                resultados.append(resultado)
+                print(f"  {nome:<26} p50 {resultado['p50'] * 1000:>10.2f} ms  "
+                      f"p99 {resultado['p99'] * 1000:>10.2f} ms  "
+                      f"{resultado['vazao'] or 0:>14,.0f} {unidade:<9} "
+                      f"pico {resultado['memoria_pico_mb']:>8.1f} MB")
+            plt.close('all')
+            del dados
+    return resultados
+
+
+def ambiente():
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def comparar(resultados, base, tolerancia, diferenca_minima=DIFERENCA_MINIMA):
+    """Lista os casos cujo p50 piorou mais que `tolerancia` em relação à base"""
+    anteriores = {(r['caso'], r['tickers'], r['barras']): r for r in base['resultados']}
+    regressoes = []
+    print(f"\nComparação com a base de {base['ambiente'].get('data', '?')} "
+          f"(tolerância {tolerancia:.0%}):")
+    for resultado in resultados:
+        chave = (resultado['caso'], resultado['tickers'], resultado['barras'])
+        anterior = anteriores.get(chave)
+        if anterior is None:
+            continue
+        razao = resultado['p50'] / anterior['p50'] if anterior['p50'] > 0 else 1.0
+        marca = ''
+        if razao > 1 + tolerancia and resultado['p50'] - anterior['p50'] > diferenca_minima:
+            marca = '  <-- REGRESSÃO'
+            regressoes.append({**resultado, 'p50_base': anterior['p50'], 'razao': razao})
+        print(f"  {chave[0]:<26} {chave[1]:>5} x {chave[2]:<6} "
+              f"{anterior['p50'] * 1000:>10.2f} -> {resultado['p50'] * 1000:>10.2f} ms "
+              f"({razao:.2f}x){marca}")
+    return regressoes
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de cotações")
+    parser.add_argument("--tickers", type=int, nargs='+', default=list(TICKERS),
+                        help="Quantidades de ações testadas")
+    parser.add_argument("--barras", type=int, nargs='+', default=list(BARRAS),
+                        help="Quantidades de barras por ação testadas")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Execuções medidas por caso")
+    parser.add_argument("--max-celulas", type=int, default=MAX_CELULAS,
+                        help="Pula casos com mais que isto de ações x barras")
+    parser.add_argument("--casos", nargs='+', help="Rodar só os casos cujo nome contém estes textos")
+    parser.add_argument("--rapido", action="store_true",
+                        help="Escala reduzida (10 e 100 ações, 50 e 1000 barras)")
+    parser.add_argument("--saida", default="benchmark_resultado.json",
+                        help="Arquivo JSON com os resultados")
+    parser.add_argument("--base", help="Resultado anterior (JSON) para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Piora aceitável do p50 em relação à base (0.25 = 25%%)")
+    return parser.parse_args()
+
+
+def main():
+    argumentos = ler_argumentos()
+    tickers, barras = argumentos.tickers, argumentos.barras
+    if argumentos.rapido:
+        tickers, barras = [10, 100], [50, 1000]
+
+    resultados = executar(tickers, barras, argumentos.repeticoes, argumentos.max_celulas,
+                          argumentos.casos)
+    saida = {'ambiente': ambiente(), 'resultados': resultados}
+
+    regressoes = []
+    if argumentos.base:
+        with open(argumentos.base, encoding='utf-8') as f:
+            regressoes = comparar(resultados, json.load(f), argumentos.tolerancia)
+        saida['regressoes'] = regressoes
+
+    with open(argumentos.saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=1)
+    print(f"\nResultados gravados em {argumentos.saida}")
+
+    if regressoes:
+        print(f"{len(regressoes)} regressões de desempenho encontradas")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
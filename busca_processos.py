@@ -0,0 +1,260 @@
+"""Busca em vários processos para universos grandes de ações
+
+O coordenador divide os tickers em fragmentos e os distribui por um pool de
+processos. Cada processo tem a própria fonte, retentativas e disjuntor, baixa
+e limpa as barras do seu fragmento (o trabalho com pandas que, em threads,
+disputa o GIL) e devolve um pacote compacto: vetores NumPy concatenados com
+os horários e os valores OHLCV de todos os tickers, que atravessam o pipe
+como blocos de bytes em vez de um DataFrame serializado por ticker.
+"""
+import heapq
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from motor_busca import LimitadorTaxa
+from resiliencia import Disjuntor, ErroSemDados, PoliticaRetentativa
+
+CAMPOS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Estado de cada processo de trabalho (criado por `_iniciar_processo`)
+_processo = {}
+
+
+def _iniciar_processo(fonte, requisicoes_por_segundo, politica, disjuntor):
+    _processo['fonte'] = fonte
+    _processo['limitador'] = LimitadorTaxa(requisicoes_por_segundo)
+    _processo['politica'] = PoliticaRetentativa(*politica)
+    _processo['disjuntor'] = Disjuntor(*disjuntor)
+
+
+def _vetores(dados):
+    """Horários (segundos, UTC), valores OHLCV (n x 5) e fuso de um DataFrame"""
+    indice = pd.DatetimeIndex(dados.index)
+    fuso = str(indice.tz) if indice.tz is not None else None
+    if indice.tz is None:
+        indice = indice.tz_localize('UTC')
+    ts = indice.tz_convert('UTC').tz_localize(None).values.astype('datetime64[s]').astype(np.int64)
+    valores = dados.reindex(columns=list(CAMPOS)).apply(pd.to_numeric, errors='coerce')
+    return ts, valores.to_numpy(dtype=float), fuso
+
+
+def _buscar_ticker(ticker, tentativas):
+    """Segue as tentativas do plano e devolve (intervalo, dados ou None)
+
+    Cada tentativa é (intervalo, periodo, ultimo): `periodo` None indica que
+    o cache do processo principal já está atualizado; `ultimo` (segundos)
+    pede só as barras a partir da última guardada. Como na busca em threads,
+    só a falta de dados leva ao próximo intervalo.
+    """
+    from nucleo import limpar_barras
+
+    fonte = _processo['fonte']
+    politica, disjuntor = _processo['politica'], _processo['disjuntor']
+    for intervalo, periodo, ultimo in tentativas:
+        if periodo is None:
+            return intervalo, None
+        _processo['limitador'].aguardar()
+        try:
+            if ultimo is not None:
+                inicio = pd.Timestamp(ultimo, unit='s', tz='UTC')
+                novos = politica.executar(
+                    lambda: fonte.historico(ticker, intervalo, inicio=inicio), disjuntor)
+            else:
+                novos = politica.executar(
+                    lambda: fonte.historico(ticker, intervalo, periodo=periodo), disjuntor)
+        except ErroSemDados:
+            if ultimo is not None:
+                return intervalo, None
+            continue
+        if ultimo is not None:
+            # Incremental: o cache já tem o resto, qualquer quantidade serve
+            return intervalo, limpar_barras(novos, minimo=1)
+        dados = limpar_barras(novos, minimo=3)
+        if dados is not None:
+            return intervalo, dados
+    raise ErroSemDados(f"nenhum intervalo com dados para {ticker}")
+
+
+def _empacotar(partes, erros):
+    """Junta os resultados de vários tickers em um único pacote de vetores"""
+    limites = np.zeros(len(partes) + 1, dtype=np.int64)
+    limites[1:] = np.cumsum([len(ts) for _, _, ts, _, _, _ in partes])
+    return {
+        'tickers': [p[0] for p in partes],
+        'intervalos': [p[1] for p in partes],
+        'fusos': [p[4] for p in partes],
+        'duracoes': np.array([p[5] for p in partes], dtype=float),
+        'limites': limites,
+        'ts': np.concatenate([p[2] for p in partes] or [np.empty(0, np.int64)]),
+        'valores': np.concatenate([p[3] for p in partes] or [np.empty((0, len(CAMPOS)))]),
+        'erros': erros,
+        'processo': os.getpid(),
+    }
+
+
+def _buscar_fragmento(pedidos):
+    """Executado no processo de trabalho: busca um fragmento de (ticker, tentativas)"""
+    partes = []
+    erros = {}
+    for ticker, tentativas in pedidos:
+        inicio = time.perf_counter()
+        try:
+            intervalo, dados = _buscar_ticker(ticker, tentativas)
+            if dados is None or dados.empty:
+                ts, valores, fuso = np.empty(0, np.int64), np.empty((0, len(CAMPOS))), None
+            else:
+                ts, valores, fuso = _vetores(dados)
+            partes.append((ticker, intervalo, ts, valores, fuso, time.perf_counter() - inicio))
+        except Exception as e:
+            erros[ticker] = (type(e).__name__, str(e), time.perf_counter() - inicio)
+    return _empacotar(partes, erros)
+
+
+def desempacotar(pacote):
+    """Itera (ticker, intervalo, ts, valores, fuso, duracao) de um pacote"""
+    limites = pacote['limites']
+    for i, ticker in enumerate(pacote['tickers']):
+        a, b = limites[i], limites[i + 1]
+        yield (ticker, pacote['intervalos'][i], pacote['ts'][a:b], pacote['valores'][a:b],
+               pacote['fusos'][i], float(pacote['duracoes'][i]))
+
+
+class CoordenadorProcessos:
+    """Distribui a busca de muitos tickers por um pool de processos
+
+    Os tickers são repartidos em fragmentos de custo parecido, pela duração
+    observada de cada um nas buscas anteriores; como há vários fragmentos por
+    processo, quem termina antes pega o próximo. Se um processo morrer, o pool
+    é recriado e os fragmentos perdidos são reenviados (ver `executar`).
+    """
+
+    # Fragmentos por processo em cada busca (mais fragmentos equilibram melhor)
+    FRAGMENTOS_POR_PROCESSO = 4
+    # Falhas de um ticker rodando sozinho antes de desistir dele
+    MAX_FALHAS_ISOLADO = 2
+    # Peso da duração mais recente na estimativa de custo de cada ticker
+    PESO_CUSTO = 0.3
+
+    def __init__(self, fonte, processos=None, requisicoes_por_segundo=4.0,
+                 politica=(3, 0.5, 8.0), disjuntor=(5, 60.0), metricas=None):
+        self.processos = max(1, int(processos or os.cpu_count() or 1))
+        # O limite de taxa é do host: cada processo fica com uma parte dele
+        self.parametros = (fonte, requisicoes_por_segundo / self.processos,
+                           tuple(politica), tuple(disjuntor))
+        self.metricas = metricas
+        self.custos = {}
+        self.executor = None
+
+    def _pool(self):
+        if self.executor is None:
+            # 'spawn' evita copiar threads e travas do processo da interface
+            self.executor = ProcessPoolExecutor(
+                self.processos, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_processo, initargs=self.parametros)
+        return self.executor
+
+    def _reiniciar(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        if self.metricas is not None:
+            self.metricas.incrementar('processos_reiniciados_total')
+
+    def fechar(self):
+        """Encerra os processos de trabalho"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def fragmentar(self, pedidos):
+        """Reparte os pedidos em fragmentos de custo estimado parecido
+
+        Guloso pelo maior custo: cada ticker, do mais caro ao mais barato,
+        vai para o fragmento com menor custo acumulado.
+        """
+        quantidade = min(len(pedidos), self.processos * self.FRAGMENTOS_POR_PROCESSO)
+        if quantidade == 0:
+            return []
+        padrao = float(np.mean(list(self.custos.values()))) if self.custos else 1.0
+        custo = lambda pedido: self.custos.get(pedido[0], padrao)
+        fragmentos = [[] for _ in range(quantidade)]
+        acumulado = [(0.0, i) for i in range(quantidade)]
+        for pedido in sorted(pedidos, key=custo, reverse=True):
+            total, i = heapq.heappop(acumulado)
+            fragmentos[i].append(pedido)
+            heapq.heappush(acumulado, (total + custo(pedido), i))
+        return fragmentos
+
+    def _aprender(self, pacote):
+        """Atualiza a estimativa de custo dos tickers do pacote"""
+        duracoes = list(zip(pacote['tickers'], pacote['duracoes']))
+        duracoes += [(ticker, erro[2]) for ticker, erro in pacote['erros'].items()]
+        for ticker, duracao in duracoes:
+            anterior = self.custos.get(ticker)
+            self.custos[ticker] = (duracao if anterior is None else
+                                   anterior + self.PESO_CUSTO * (duracao - anterior))
+
+    def executar(self, pedidos, cancelado=None):
+        """Busca os pedidos e entrega os pacotes à medida que ficam prontos
+
+        `pedidos` é uma lista de (ticker, tentativas), como em `_buscar_ticker`.
+        É um gerador: o processo principal grava um pacote enquanto os
+        processos continuam com os outros. `cancelado()` interrompe o envio.
+
+        Quando o pool cai, todos os fragmentos pendentes falham juntos. Os
+        grandes são divididos ao meio; um ticker isolado que falhou vira
+        suspeito e roda sozinho, de modo que só o culpado acumula falhas.
+        """
+        fila = [(fragmento, 0) for fragmento in self.fragmentar(pedidos)]
+        suspeitos = []
+        while fila or suspeitos:
+            if cancelado is not None and cancelado():
+                return
+            if fila:
+                rodada, fila, sozinho = fila, [], False
+            else:
+                rodada, sozinho = [suspeitos.pop(0)], True
+            executor = self._pool()
+            futuros = {executor.submit(_buscar_fragmento, fragmento): (fragmento, falhas)
+                       for fragmento, falhas in rodada}
+            quebrou = False
+            for futuro in as_completed(futuros):
+                fragmento, falhas = futuros[futuro]
+                inicio = time.perf_counter()
+                try:
+                    pacote = futuro.result()
+                except Exception as e:
+                    if not isinstance(e, BrokenProcessPool):
+                        print(f"Erro em um processo de busca ({len(fragmento)} tickers): {e}")
+                    quebrou = quebrou or isinstance(e, BrokenProcessPool)
+                    if self.metricas is not None:
+                        self.metricas.incrementar('fragmentos_total', resultado='erro')
+                    if len(fragmento) > 1:
+                        meio = len(fragmento) // 2
+                        fila += [(fragmento[:meio], falhas), (fragmento[meio:], falhas)]
+                    elif not sozinho:
+                        suspeitos.append((fragmento, falhas))
+                    elif falhas + 1 < self.MAX_FALHAS_ISOLADO:
+                        suspeitos.append((fragmento, falhas + 1))
+                    else:
+                        ticker = fragmento[0][0]
+                        print(f"Desistindo de {ticker}: derruba o processo de busca")
+                        yield _empacotar([], {ticker: (type(e).__name__,
+                                                       f"processo falhou: {e}", 0.0)})
+                    continue
+                if self.metricas is not None:
+                    self.metricas.incrementar('fragmentos_total', resultado='ok')
+                self._aprender(pacote)
+                yield pacote
+                if self.metricas is not None:
+                    self.metricas.observar('fragmento_gravacao_segundos',
+                                           time.perf_counter() - inicio)
+            if quebrou:
+                print("Um processo de busca caiu; reenviando os fragmentos pendentes")
+                self._reiniciar()
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Duração de cada intervalo em segundos
+DURACAO_INTERVALO = {
+    '1m': 60,
+    '2m': 120,
+    '5m': 300,
+    '15m': 900,
+    '30m': 1800,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+COLUNAS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+class CacheBarras:
+    """Armazena barras OHLCV em disco (SQLite), por ticker e intervalo
+
+    Cada barra é identificada por (ticker, intervalo, timestamp), então gravar
+    o mesmo período duas vezes apenas substitui as barras repetidas.
+    """
+
+    def __init__(self, caminho, idade_maxima_dias=None, max_barras_por_serie=None,
+                 tamanho_maximo_mb=None):
+        if caminho != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self.caminho = caminho
+        self.idade_maxima_dias = idade_maxima_dias
+        self.max_barras_por_serie = max_barras_por_serie
+        self.tamanho_maximo_mb = tamanho_maximo_mb
+        self.trava = threading.Lock()
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        self.conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS barras (
+                ticker TEXT NOT NULL,
+                intervalo TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (ticker, intervalo, ts)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS series (
+                ticker TEXT NOT NULL,
+                intervalo TEXT NOT NULL,
+                fuso TEXT,
+                PRIMARY KEY (ticker, intervalo)
+            );
+        """)
+        self.conexao.commit()
+
+    def fechar(self):
+        """Fecha a conexão com o banco"""
+        with self.trava:
+            self.conexao.close()
+
+    def ultimo_timestamp(self, ticker, intervalo):
+        """Retorna o horário da última barra armazenada (ou None)"""
+        with self.trava:
+            linha = self.conexao.execute(
+                "SELECT MAX(ts) FROM barras WHERE ticker=? AND intervalo=?",
+                (ticker, intervalo)).fetchone()
+            fuso = self._fuso(ticker, intervalo)
+        if linha is None or linha[0] is None:
+            return None
+        return pd.Timestamp(linha[0], unit='s', tz='UTC').tz_convert(fuso)
+
+    def esta_atualizado(self, ticker, intervalo, agora=None):
+        """Indica se a última barra ainda cobre o momento atual"""
+        ultimo = self.ultimo_timestamp(ticker, intervalo)
+        if ultimo is None:
+            return False
+        agora = time.time() if agora is None else agora
+        return agora - ultimo.timestamp() < DURACAO_INTERVALO.get(intervalo, 60)
+
+    def salvar(self, ticker, intervalo, dados):
+        """Mescla as barras recebidas com as já armazenadas"""
+        if dados is None or dados.empty:
+            return 0
+        indice = pd.DatetimeIndex(dados.index)
+        fuso = str(indice.tz) if indice.tz is not None else None
+        if indice.tz is None:
+            indice = indice.tz_localize('UTC')
+        ts = indice.tz_convert('UTC').tz_localize(None).values.astype('datetime64[s]').astype('int64')
+        valores = dados.reindex(columns=list(COLUNAS)).apply(pd.to_numeric, errors='coerce')
+        return self.salvar_vetores(ticker, intervalo, ts, valores.to_numpy(dtype=float), fuso)
+
+    def salvar_vetores(self, ticker, intervalo, ts, valores, fuso=None):
+        """Como `salvar`, a partir de horários (segundos, UTC) e valores OHLCV (n x 5)"""
+        if len(ts) == 0:
+            return 0
+        linhas = [(ticker, intervalo, int(t), *(None if v != v else v for v in barra))
+                  for t, barra in zip(ts, np.asarray(valores, dtype=float).tolist())]
+
+        with self.trava:
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO barras VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?)", (ticker, intervalo, fuso))
+            self.conexao.commit()
+        return len(linhas)
+
+    def carregar(self, ticker, intervalo, limite=None):
+        """Carrega as barras armazenadas (as `limite` mais recentes)"""
+        consulta = ("SELECT ts, open, high, low, close, volume FROM barras "
+                    "WHERE ticker=? AND intervalo=? ORDER BY ts DESC")
+        parametros = [ticker, intervalo]
+        if limite:
+            consulta += " LIMIT ?"
+            parametros.append(int(limite))
+        with self.trava:
+            linhas = self.conexao.execute(consulta, parametros).fetchall()
+            fuso = self._fuso(ticker, intervalo)
+        if not linhas:
+            return None
+
+        linhas.reverse()
+        dados = pd.DataFrame(linhas, columns=('ts',) + COLUNAS)
+        indice = pd.to_datetime(dados.pop('ts'), unit='s', utc=True)
+        dados.index = pd.DatetimeIndex(indice).tz_convert(fuso)
+        return dados
+
+    def series(self):
+        """Lista os pares (ticker, intervalo) armazenados"""
+        with self.trava:
+            return self.conexao.execute("SELECT ticker, intervalo FROM series").fetchall()
+
+    def aplicar_retencao(self):
+        """Remove barras antigas e limita o tamanho do cache"""
+        with self.trava:
+            if self.idade_maxima_dias is not None:
+                limite = int(time.time() - self.idade_maxima_dias * 86400)
+                self.conexao.execute("DELETE FROM barras WHERE ts < ?", (limite,))
+
+            if self.max_barras_por_serie is not None:
+                self.conexao.execute("""
+                    DELETE FROM barras WHERE (ticker, intervalo, ts) IN (
+                        SELECT ticker, intervalo, ts FROM (
+                            SELECT ticker, intervalo, ts, ROW_NUMBER() OVER (
+                                PARTITION BY ticker, intervalo ORDER BY ts DESC) AS posicao
+                            FROM barras)
+                        WHERE posicao > ?)
+                """, (int(self.max_barras_por_serie),))
+            self.conexao.commit()
+
+            if self.tamanho_maximo_mb is not None:
+                limite_bytes = self.tamanho_maximo_mb * 1024 * 1024
+                while self._tamanho_bytes() > limite_bytes:
+                    total = self.conexao.execute("SELECT COUNT(*) FROM barras").fetchone()[0]
+                    if total == 0:
+                        break
+                    # Descarta os 10% mais antigos até caber no limite
+                    self.conexao.execute("""
+                        DELETE FROM barras WHERE (ticker, intervalo, ts) IN (
+                            SELECT ticker, intervalo, ts FROM barras ORDER BY ts LIMIT ?)
+                    """, (max(1, total // 10),))
+                    self.conexao.commit()
+                    self.conexao.execute("VACUUM")
+
+            self.conexao.execute(
+                "DELETE FROM series WHERE (ticker, intervalo) NOT IN "
+                "(SELECT DISTINCT ticker, intervalo FROM barras)")
+            self.conexao.commit()
+
+    def _tamanho_bytes(self):
+        paginas = self.conexao.execute("PRAGMA page_count").fetchone()[0]
+        tamanho_pagina = self.conexao.execute("PRAGMA page_size").fetchone()[0]
+        return paginas * tamanho_pagina
+
+    def _fuso(self, ticker, intervalo):
+        linha = self.conexao.execute(
+            "SELECT fuso FROM series WHERE ticker=? AND intervalo=?",
+            (ticker, intervalo)).fetchone()
+        return linha[0] if linha and linha[0] else 'UTC'
@@ -0,0 +1,233 @@
+"""Carteira: posições por conta, marcação a mercado e exposição por setor
+
+As posições vêm de um arquivo CSV, JSON ou TOML. CSV, com cabeçalho
+`conta,ticker,quantidade,preco_medio,setor` (setor opcional):
+
+    conta,ticker,quantidade,preco_medio,setor
+    XP,PETR4,1000,32.50,Petróleo
+
+JSON ou TOML, com uma lista `posicao` de objetos com os mesmos campos:
+
+    [[posicao]]
+    conta = "XP"
+    ticker = "PETR4"
+    quantidade = 1000
+    preco_medio = 32.5
+
+Cada campo vira um vetor com um elemento por posição; contas, tickers e
+setores viram códigos inteiros. A marcação a mercado busca os preços com um
+único índice e soma por conta e por setor com `np.bincount`, sem laço em
+Python por posição, então dezenas de milhares de posições custam poucos ms.
+"""
+import csv
+import json
+import os
+
+import numpy as np
+
+from listas import SUFIXO_PADRAO, ListaAcoes, normalizar_ticker
+
+SETOR_PADRAO = 'Sem setor'
+# Grupo da lista da carteira com as ações de todas as contas (o que é marcado)
+GRUPO_TODAS = 'Todas as contas'
+
+
+def _codificar(valores):
+    """Nomes distintos (na ordem em que aparecem) e o código de cada valor"""
+    nomes, primeira, codigos = np.unique(np.asarray(valores, dtype=str),
+                                         return_index=True, return_inverse=True)
+    ordem = np.argsort(primeira)
+    novo_codigo = np.empty(len(ordem), dtype=np.int32)
+    novo_codigo[ordem] = np.arange(len(ordem))
+    return [str(nome) for nome in nomes[ordem]], novo_codigo[codigos]
+
+
+def _numero(valor):
+    """Converte '1.234,5', '1234.5' ou um número em float"""
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if ',' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+    return float(valor)
+
+
+class ResumoCarteira:
+    """Resultado de uma marcação a mercado
+
+    Os vetores `valor`, `custo`, `resultado`, `resultado_dia` e
+    `retorno_dia` têm um elemento por conta; `exposicao` é a matriz conta x
+    setor do valor de mercado. `posicoes` guarda os vetores por posição.
+    """
+
+    def __init__(self, carteira, preco, valor, custo, resultado_dia, base_dia, cotado):
+        self.carteira = carteira
+        contas, setores = len(carteira.contas), len(carteira.setores)
+        somar = lambda pesos: np.bincount(carteira.conta, weights=pesos, minlength=contas)
+        self.contas = carteira.contas
+        self.setores = carteira.setores
+        self.valor = somar(valor)
+        self.custo = somar(custo)
+        self.resultado = self.valor - self.custo
+        self.resultado_dia = somar(resultado_dia)
+        base = somar(base_dia)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.retorno_dia = np.where(base > 0, self.resultado_dia / base, np.nan)
+        self.exposicao = np.bincount(carteira.conta * setores + carteira.setor, weights=valor,
+                                     minlength=contas * setores).reshape(contas, setores)
+        self.total = {
+            'valor': float(self.valor.sum()),
+            'custo': float(self.custo.sum()),
+            'resultado': float(self.resultado.sum()),
+            'resultado_dia': float(self.resultado_dia.sum()),
+            'retorno_dia': float(self.resultado_dia.sum() / base.sum()) if base.sum() > 0
+            else float('nan'),
+        }
+        self.sem_cotacao = int((~cotado).sum())
+        self.posicoes = {'preco': preco, 'valor': valor, 'resultado': valor - custo,
+                         'resultado_dia': resultado_dia}
+
+    def exposicao_setores(self):
+        """Valor de mercado por setor, somando todas as contas"""
+        return dict(zip(self.setores, self.exposicao.sum(axis=0)))
+
+    def maiores_do_dia(self, limite=20):
+        """Posições com maior resultado do dia em módulo, da maior para a menor"""
+        resultado = np.abs(self.posicoes['resultado_dia'])
+        limite = min(limite, len(resultado))
+        if limite == 0:
+            return np.empty(0, dtype=np.int64)
+        escolhidas = np.argpartition(-resultado, limite - 1)[:limite]
+        return escolhidas[np.argsort(-resultado[escolhidas], kind='stable')]
+
+    def como_dicionario(self, limite=20):
+        carteira = self.carteira
+        return {
+            'total': dict(self.total),
+            'posicoes': len(carteira),
+            'sem_cotacao': self.sem_cotacao,
+            'contas': [
+                {'conta': conta, 'valor': float(self.valor[i]), 'custo': float(self.custo[i]),
+                 'resultado': float(self.resultado[i]),
+                 'resultado_dia': float(self.resultado_dia[i]),
+                 'retorno_dia': float(self.retorno_dia[i])}
+                for i, conta in enumerate(self.contas)],
+            'setores': {setor: float(valor) for setor, valor in self.exposicao_setores().items()},
+            'maiores_do_dia': [
+                {'conta': carteira.contas[carteira.conta[i]],
+                 'ticker': carteira.tickers[carteira.ticker[i]],
+                 'quantidade': float(carteira.quantidade[i]),
+                 'preco': float(self.posicoes['preco'][i]),
+                 'resultado': float(self.posicoes['resultado'][i]),
+                 'resultado_dia': float(self.posicoes['resultado_dia'][i])}
+                for i in self.maiores_do_dia(limite)],
+        }
+
+
+class Carteira:
+    """Posições (conta, ticker, quantidade, preço médio, setor) em vetores"""
+
+    def __init__(self, contas, tickers, quantidades, precos_medios, setores=None,
+                 nome='Carteira', sufixo=SUFIXO_PADRAO):
+        self.nome = nome
+        nomes, codigos = _codificar(tickers)
+        normalizados = np.array([normalizar_ticker(t, sufixo) for t in nomes], dtype=str)
+        self.tickers, self.ticker = _codificar(normalizados[codigos])
+        self.contas, self.conta = _codificar(contas)
+        if setores is None:
+            setores = [SETOR_PADRAO] * len(self.ticker)
+        self.setores, self.setor = _codificar([s or SETOR_PADRAO for s in setores])
+        self.quantidade = np.asarray(quantidades, dtype=float)
+        self.preco_medio = np.asarray(precos_medios, dtype=float)
+        self.custo = self.quantidade * self.preco_medio
+        # Posição de cada ticker da carteira nos indicadores (refeita se a lista mudar)
+        self._referencia = None
+        self._indices = None
+
+    def __len__(self):
+        return len(self.quantidade)
+
+    def acoes(self):
+        """Dicionário ticker -> nome das ações da carteira"""
+        return {ticker: ticker.split('.')[0] for ticker in self.tickers}
+
+    def lista(self):
+        """ListaAcoes com todas as ações da carteira e um grupo por conta
+
+        Só as ações monitoradas têm cotação, então é o grupo `GRUPO_TODAS`
+        que deixa a carteira inteira marcada a mercado.
+        """
+        pares = np.unique(self.conta.astype(np.int64) * len(self.tickers) + self.ticker)
+        grupos = {GRUPO_TODAS: list(self.tickers)}
+        grupos.update({conta: [] for conta in self.contas})
+        for conta, ticker in zip(pares // len(self.tickers), pares % len(self.tickers)):
+            grupos[self.contas[conta]].append(self.tickers[ticker])
+        return ListaAcoes(self.nome, self.acoes(), grupos)
+
+    def marcar(self, precos, fechamentos_anteriores):
+        """Marca a carteira a mercado
+
+        `precos` e `fechamentos_anteriores` têm um valor por ticker da
+        carteira (na ordem de `tickers`), com NaN onde não há cotação.
+        Posições sem cotação ficam fora dos totais e são contadas à parte.
+        """
+        preco = np.asarray(precos, dtype=float)[self.ticker]
+        ontem = np.asarray(fechamentos_anteriores, dtype=float)[self.ticker]
+        cotado = ~np.isnan(preco)
+        valor = np.where(cotado, self.quantidade * preco, 0.0)
+        custo = np.where(cotado, self.custo, 0.0)
+        com_ontem = cotado & ~np.isnan(ontem)
+        resultado_dia = np.where(com_ontem, self.quantidade * (preco - ontem), 0.0)
+        # Base do retorno do dia em módulo, para que posições vendidas não a anulem
+        base_dia = np.where(com_ontem, np.abs(self.quantidade * ontem), 0.0)
+        return ResumoCarteira(self, preco, valor, custo, resultado_dia, base_dia, cotado)
+
+    def marcar_indicadores(self, indicadores):
+        """Marca a carteira com o último fechamento de IndicadoresIncrementais"""
+        if indicadores.tickers is not self._referencia:
+            self._referencia = indicadores.tickers
+            self._indices = np.array([indicadores.posicoes.get(t, -1) for t in self.tickers],
+                                     dtype=np.int64)
+        presente = self._indices >= 0
+        precos = np.full(len(self.tickers), np.nan)
+        anteriores = np.full(len(self.tickers), np.nan)
+        precos[presente] = indicadores.estado['fech'][self._indices[presente]]
+        anteriores[presente] = indicadores.estado['fech_ontem'][self._indices[presente]]
+        return self.marcar(precos, anteriores)
+
+
+def carregar_carteira(caminho, sufixo=SUFIXO_PADRAO):
+    """Lê as posições de um arquivo CSV, JSON ou TOML; linhas inválidas são ignoradas"""
+    nome, extensao = os.path.splitext(os.path.basename(caminho))
+    extensao = extensao.lower()
+    if extensao == '.csv':
+        with open(caminho, newline='', encoding='utf-8-sig') as f:
+            linhas = [{(chave or '').strip().lower(): (valor or '').strip()
+                       for chave, valor in linha.items()} for linha in csv.DictReader(f)]
+    elif extensao == '.toml':
+        import tomllib
+        with open(caminho, 'rb') as f:
+            linhas = tomllib.load(f).get('posicao', [])
+    elif extensao == '.json':
+        with open(caminho, encoding='utf-8') as f:
+            linhas = json.load(f).get('posicao', [])
+    else:
+        raise ValueError(f"Formato de carteira não suportado: {caminho}")
+
+    colunas = {'conta': [], 'ticker': [], 'quantidade': [], 'preco_medio': [], 'setor': []}
+    for posicao, linha in enumerate(linhas, start=1):
+        try:
+            ticker = linha.get('ticker') or linha.get('codigo') or linha.get('código', '')
+            if not ticker:
+                raise ValueError("posição sem ticker")
+            quantidade = _numero(linha['quantidade'])
+            preco_medio = _numero(linha.get('preco_medio', linha.get('preço_médio', 0)) or 0)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Erro na posição {posicao} de {caminho}: {e}")
+            continue
+        colunas['conta'].append(str(linha.get('conta') or 'Principal'))
+        colunas['ticker'].append(ticker)
+        colunas['quantidade'].append(quantidade)
+        colunas['preco_medio'].append(preco_medio)
+        colunas['setor'].append(str(linha.get('setor') or SETOR_PADRAO))
+    return Carteira(colunas['conta'], colunas['ticker'], colunas['quantidade'],
+                    colunas['preco_medio'], colunas['setor'], nome=nome, sufixo=sufixo)
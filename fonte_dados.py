@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from cache_barras import DURACAO_INTERVALO
+from resiliencia import ErroSemDados
+
+
+class FonteDados:
+    """Interface comum das fontes de cotações
+
+    Toda busca de dados do aplicativo (download e verificação de conexão)
+    passa por uma fonte, o que permite trocar o Yahoo Finance por dados locais.
+    """
+
+    nome = "base"
+    # Host remoto usado pela fonte (cada host tem o próprio disjuntor)
+    host = "local"
+    # Fontes locais e reproduzíveis não devem deixar barras no cache em disco
+    persistente = True
+    # Fontes em tempo real seguem o horário do pregão; as locais têm relógio próprio
+    tempo_real = True
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        """Retorna um DataFrame OHLCV do ticker (vazio se não houver dados)
+
+        Com `inicio`, traz as barras a partir dele (até `fim`, exclusivo, se dado).
+        """
+        raise NotImplementedError
+
+    def historico_lote(self, tickers, intervalo, periodo):
+        """Retorna um dicionário ticker -> DataFrame para vários tickers"""
+        resultado = {}
+        for ticker in tickers:
+            dados = self.historico(ticker, intervalo, periodo=periodo)
+            if dados is not None and not dados.empty:
+                resultado[ticker] = dados
+        return resultado
+
+    def verificar_conexao(self):
+        """Indica se a fonte está respondendo"""
+        try:
+            self.historico("PETR4.SA", "1h", periodo="1d")
+            return True
+        except ErroSemDados:
+            # Respondeu, só não há barras (ex.: fim de semana)
+            return True
+        except Exception:
+            return False
+
+
+class FonteYahoo(FonteDados):
+    """Fonte de dados do Yahoo Finance (yfinance)"""
+
+    nome = "yahoo"
+    host = "query2.finance.yahoo.com"
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        import yfinance as yf
+        acao = yf.Ticker(ticker)
+        # Sem raise_errors o yfinance só registra falhas de rede e limite de
+        # taxa e devolve um quadro vazio, que as retentativas e o disjuntor
+        # confundiriam com falta de dados
+        if inicio is not None:
+            dados = acao.history(start=inicio, end=fim, interval=intervalo, raise_errors=True)
+        else:
+            dados = acao.history(period=periodo, interval=intervalo, raise_errors=True)
+        if dados is None or dados.empty:
+            raise ErroSemDados(f"nenhuma barra de {ticker} em {intervalo}")
+        return dados
+
+    def historico_lote(self, tickers, intervalo, periodo):
+        import yfinance as yf
+        dados = yf.download(list(tickers), period=periodo, interval=intervalo, group_by='ticker',
+                            threads=False, progress=False, auto_adjust=False)
+        if dados is None or dados.empty:
+            return {}
+
+        resultado = {}
+        for ticker in tickers:
+            if isinstance(dados.columns, pd.MultiIndex):
+                if ticker not in dados.columns.get_level_values(0):
+                    continue
+                dados_ticker = dados[ticker]
+            else:
+                dados_ticker = dados
+            dados_ticker = dados_ticker.dropna(how='all')
+            if not dados_ticker.empty:
+                resultado[ticker] = dados_ticker.copy()
+        return resultado
+
+
+class FonteReplay(FonteDados):
+    """Fonte local e determinística que reproduz barras gravadas ou sintéticas
+
+    Para cada ticker procura `<pasta>/<TICKER>_<intervalo>.csv` (ou `.parquet`)
+    e depois `<pasta>/<TICKER>.csv`; sem arquivo, gera um passeio aleatório
+    com semente derivada do ticker. Um relógio virtual, que anda `velocidade`
+    vezes mais rápido que o real, decide quais barras já "aconteceram".
+    `latencia` (segundos) simula o tempo de resposta da rede.
+    """
+
+    nome = "replay"
+    persistente = False
+    tempo_real = False
+
+    def __init__(self, pasta=None, velocidade=1.0, latencia=0.0, semente=0,
+                 barras_iniciais=50, barras_sinteticas=5000,
+                 inicio='2024-01-02 10:00', fuso='America/Sao_Paulo'):
+        self.pasta = pasta
+        self.velocidade = float(velocidade)
+        self.latencia = float(latencia)
+        self.semente = int(semente)
+        self.barras_iniciais = int(barras_iniciais)
+        self.barras_sinteticas = int(barras_sinteticas)
+        self.inicio = pd.Timestamp(inicio, tz=fuso)
+        self.fuso = fuso
+        self.series = {}
+        self.trava = threading.Lock()
+        self.relogio_base = None
+        self.relogio_real = time.monotonic()
+
+    def agora(self):
+        """Horário atual no relógio virtual da reprodução"""
+        if self.relogio_base is None:
+            return self.inicio
+        decorrido = (time.monotonic() - self.relogio_real) * self.velocidade
+        return self.relogio_base + pd.Timedelta(seconds=decorrido)
+
+    def __getstate__(self):
+        # Cópia para outro processo: o relógio vai junto (time.monotonic é do
+        # sistema), as séries são refeitas lá e a trava é recriada
+        estado = self.__dict__.copy()
+        estado['series'] = {}
+        del estado['trava']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.trava = threading.Lock()
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+
+        with self.trava:
+            dados = self._serie(ticker, intervalo)
+            if self.relogio_base is None:
+                # O relógio começa na barra que deixa `barras_iniciais` visíveis
+                posicao = min(self.barras_iniciais, len(dados)) - 1
+                self.relogio_base = dados.index[max(posicao, 0)]
+                self.relogio_real = time.monotonic()
+
+        agora = self.agora()
+        if inicio is not None:
+            dados = dados[dados.index >= pd.Timestamp(inicio)]
+            if fim is not None:
+                dados = dados[dados.index < pd.Timestamp(fim)]
+        elif periodo is not None and periodo != 'max':
+            dados = dados[dados.index > agora - duracao_periodo(periodo)]
+        return dados[dados.index <= agora].copy()
+
+    def verificar_conexao(self):
+        return True
+
+    def _serie(self, ticker, intervalo):
+        chave = (ticker, intervalo)
+        if chave not in self.series:
+            dados = self._ler_arquivo(ticker, intervalo)
+            if dados is None:
+                dados = self._gerar_sintetico(ticker, intervalo)
+            self.series[chave] = dados
+        return self.series[chave]
+
+    def _ler_arquivo(self, ticker, intervalo):
+        if not self.pasta:
+            return None
+        for nome in (f"{ticker}_{intervalo}", ticker):
+            for extensao, leitor in ((".parquet", pd.read_parquet), (".csv", self._ler_csv)):
+                caminho = os.path.join(self.pasta, nome + extensao)
+                if os.path.exists(caminho):
+                    dados = leitor(caminho)
+                    indice = pd.to_datetime(dados.index, utc=True)
+                    dados.index = pd.DatetimeIndex(indice).tz_convert(self.fuso)
+                    return dados.sort_index()
+        return None
+
+    def _ler_csv(self, caminho):
+        return pd.read_csv(caminho, index_col=0)
+
+    def _gerar_sintetico(self, ticker, intervalo):
+        """Gera um passeio aleatório OHLCV reproduzível para o ticker"""
+        n = self.barras_sinteticas
+        semente = zlib.crc32(f"{self.semente}:{ticker}:{intervalo}".encode())
+        rng = np.random.default_rng(semente)
+
+        passo = DURACAO_INTERVALO.get(intervalo, 900)
+        indice = pd.date_range(self.inicio, periods=n, freq=pd.Timedelta(seconds=passo))
+
+        preco_inicial = 10 + (semente % 9000) / 100
+        retornos = rng.normal(0, 0.002 * np.sqrt(passo / 900), n)
+        fechamento = preco_inicial * np.exp(np.cumsum(retornos))
+        abertura = np.concatenate(([preco_inicial], fechamento[:-1]))
+        amplitude = np.abs(rng.normal(0, 0.001, n)) * fechamento
+        maxima = np.maximum(abertura, fechamento) + amplitude
+        minima = np.minimum(abertura, fechamento) - amplitude
+        volume = rng.lognormal(12, 0.5, n).round()
+
+        return pd.DataFrame({
+            'Open': abertura,
+            'High': maxima,
+            'Low': minima,
+            'Close': fechamento,
+            'Volume': volume,
+        }, index=indice)
+
+
+def duracao_periodo(periodo):
+    """Converte um período do yfinance ('5d', '1mo', '2y') em Timedelta"""
+    if periodo.endswith('mo'):
+        return pd.Timedelta(days=30 * int(periodo[:-2]))
+    if periodo.endswith('y'):
+        return pd.Timedelta(days=365 * int(periodo[:-1]))
+    return pd.Timedelta(periodo)
+
+
+def criar_fonte(especificacao="yahoo", velocidade=1.0, latencia=0.0):
+    """Cria uma fonte a partir de um texto como 'yahoo', 'replay:PASTA' ou 'gravacao:ARQUIVO'"""
+    tipo, _, argumento = (especificacao or "yahoo").partition(":")
+    if tipo == "yahoo":
+        return FonteYahoo()
+    if tipo == "replay":
+        return FonteReplay(pasta=argumento or None, velocidade=velocidade, latencia=latencia)
+    if tipo == "gravacao":
+        from gravacao import PASTA_GRAVACOES, FonteGravacao
+        return FonteGravacao(argumento or PASTA_GRAVACOES, velocidade=velocidade,
+                             latencia=latencia)
+    raise ValueError(f"Fonte de dados desconhecida: {especificacao}")
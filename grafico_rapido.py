@@ -0,0 +1,282 @@
+import numpy as np
+import matplotlib.dates as mdates
+
+CORES = ['#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6',
+         '#1abc9c', '#d35400', '#c0392b', '#16a085']
+
+
+def datas_para_num(indice):
+    """Converte um DatetimeIndex para o número de dias do matplotlib, vetorizado
+
+    `mdates.date2num` percorre índices com fuso elemento a elemento; aqui a
+    conversão é feita direto sobre os inteiros em nanossegundos (UTC).
+    """
+    if getattr(indice, 'tz', None) is not None:
+        indice = indice.tz_convert('UTC').tz_localize(None)
+    ns = np.asarray(indice.values).astype('datetime64[ns]').astype(np.int64)
+    epoca = np.datetime64(mdates.get_epoch(), 'ns').astype(np.int64)
+    return (ns - epoca) / 86400e9
+
+
+def decimar_min_max(x, y, colunas):
+    """Reduz a série a um par (mínimo, máximo) por coluna de pixels
+
+    O desenho resultante é visualmente igual ao da série completa, mas o
+    custo passa a depender da largura do gráfico e não do número de pontos.
+    O primeiro e o último ponto ficam, para a linha começar e terminar no
+    mesmo lugar (o último preço é o que mais importa).
+    """
+    n = len(x)
+    colunas = int(colunas)
+    if colunas <= 0 or n <= 2 * colunas:
+        return x, y
+
+    x0, x1 = x[0], x[-1]
+    if x1 <= x0:
+        return x, y
+    coluna = np.minimum(((x - x0) / (x1 - x0) * colunas).astype(np.int64), colunas - 1)
+    inicios = np.flatnonzero(np.diff(coluna, prepend=-1))
+
+    y_valido = np.where(np.isnan(y), np.inf, y)
+    minimos = np.minimum.reduceat(y_valido, inicios)
+    y_valido = np.where(np.isnan(y), -np.inf, y)
+    maximos = np.maximum.reduceat(y_valido, inicios)
+
+    x_saida = np.empty(2 * len(inicios) + 2)
+    x_saida[1:-1] = np.repeat(x[inicios], 2)
+    x_saida[0], x_saida[-1] = x0, x1
+    y_saida = np.empty(len(x_saida))
+    y_saida[1:-1:2] = minimos
+    y_saida[2:-1:2] = maximos
+    y_saida[0], y_saida[-1] = y[0], y[-1]
+    y_saida[~np.isfinite(y_saida)] = np.nan
+    return x_saida, y_saida
+
+
+class SerieGrafico:
+    """Série pronta para desenhar: pontos já convertidos e decimados"""
+
+    __slots__ = ('ticker', 'nome', 'x', 'y', 'extensao', 'assinatura', 'fuso',
+                 'x_media', 'y_media')
+
+    def __init__(self, ticker, nome, x, y, extensao, assinatura, fuso=None,
+                 x_media=None, y_media=None):
+        self.ticker = ticker
+        self.nome = nome
+        self.x = x
+        self.y = y
+        self.extensao = extensao
+        self.assinatura = assinatura
+        self.fuso = fuso
+        self.x_media = x_media
+        self.y_media = y_media
+
+
+def _somente_leitura(vetor):
+    vetor.flags.writeable = False
+    return vetor
+
+
+def preparar_series(series, colunas, medias=None, min_pontos=6):
+    """Converte (ticker, nome, dados) em SerieGrafico, sem tocar em objetos Tk
+
+    Pode rodar em qualquer thread: faz a conversão das datas e a decimação
+    para `colunas` pixels de largura. `medias` é um DataFrame largo opcional
+    com uma média por ticker.
+    """
+    preparadas = []
+    for ticker, nome, dados in series:
+        if dados is None or len(dados) < min_pontos:
+            continue
+        fechamento = dados['Close']
+        assinatura = (len(dados), dados.index[0], dados.index[-1], fechamento.iat[-1])
+        x = datas_para_num(dados.index)
+        y = fechamento.to_numpy(dtype=float)
+        extensao = (x[0], x[-1], np.nanmin(y), np.nanmax(y))
+        x, y = decimar_min_max(x, y, colunas)
+
+        x_media = y_media = None
+        if medias is not None and ticker in medias.columns:
+            media = medias[ticker].reindex(dados.index).dropna()
+            x_media, y_media = decimar_min_max(datas_para_num(media.index),
+                                               media.to_numpy(dtype=float), colunas)
+            x_media, y_media = _somente_leitura(x_media), _somente_leitura(y_media)
+        preparadas.append(SerieGrafico(ticker, nome, _somente_leitura(x), _somente_leitura(y),
+                                       extensao, assinatura, getattr(dados.index, 'tz', None),
+                                       x_media, y_media))
+    return preparadas
+
+
+class RenderizadorGrafico:
+    """Desenha as séries de preço reaproveitando as linhas entre atualizações
+
+    Cada ticker tem uma Line2D própria, atualizada com `set_data` só quando
+    os dados mudaram. As linhas são animadas: o fundo (eixos, grade, título,
+    legenda) fica em cache e cada atualização só redesenha as linhas (blit).
+    Um redesenho completo só acontece quando o conjunto de linhas muda ou os
+    dados saem dos limites atuais dos eixos.
+    """
+
+    MIN_PONTOS = 6
+    FOLGA_X = 0.10
+    FOLGA_Y = 0.05
+
+    def __init__(self, fig, ax, canvas, cores=CORES):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = canvas
+        self.cores = cores
+        self.linhas = {}
+        self.linhas_media = {}
+        self.assinaturas = {}
+        self.extensoes = {}
+        self.fundo = None
+        self.configurado = False
+        # Último tipo de desenho feito: 'completo', 'blit' ou None (nada mudou)
+        self.ultimo_desenho = None
+        self.canvas.mpl_connect('draw_event', self._ao_desenhar)
+
+    def limpar(self):
+        """Esquece as linhas (chamar quando o eixo for limpo por fora)"""
+        self.linhas.clear()
+        self.linhas_media.clear()
+        self.assinaturas.clear()
+        self.extensoes.clear()
+        self.fundo = None
+        self.configurado = False
+
+    def invalidar(self):
+        """Força a atualização de todas as linhas na próxima chamada"""
+        self.assinaturas.clear()
+
+    def _configurar_eixos(self, fuso):
+        self.ax.clear()
+        self.ax.set_title('Evolução dos Preços - Ações Brasileiras',
+                          fontsize=14, fontweight='bold', pad=20, color='#2c3e50')
+        self.ax.set_ylabel('Preço (R$)', fontweight='bold', color='#2c3e50')
+        self.ax.grid(True, alpha=0.3)
+        self.ax.set_facecolor('#ecf0f1')
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M\n%d/%m', tz=fuso))
+        self.fig.autofmt_xdate()
+        self.configurado = True
+
+    def largura_pixels(self):
+        return max(1, int(self.ax.bbox.width))
+
+    def atualizar(self, series, medias=None):
+        """Atualiza o gráfico a partir de uma lista de (ticker, nome, dados)
+
+        `medias` (opcional) é um DataFrame largo com uma média por ticker,
+        desenhada tracejada sobre a linha de preço.
+        """
+        self.aplicar(preparar_series(series, self.largura_pixels(), medias, self.MIN_PONTOS))
+
+    def aplicar(self, series):
+        """Atualiza o gráfico com séries já preparadas (`preparar_series`)"""
+        if not self.configurado:
+            self._configurar_eixos(series[0].fuso if series else None)
+
+        estrutura_mudou = False
+        alteradas = False
+        visiveis = set()
+
+        for posicao, serie in enumerate(series):
+            ticker = serie.ticker
+            visiveis.add(ticker)
+            if self.assinaturas.get(ticker) == serie.assinatura:
+                continue
+
+            self.extensoes[ticker] = serie.extensao
+            linha = self.linhas.get(ticker)
+            if linha is None:
+                linha, = self.ax.plot(serie.x, serie.y, color=self.cores[posicao % len(self.cores)],
+                                      linewidth=2.5, alpha=0.8, label=serie.nome, animated=True)
+                self.linhas[ticker] = linha
+                estrutura_mudou = True
+            else:
+                linha.set_data(serie.x, serie.y)
+            self.assinaturas[ticker] = serie.assinatura
+            alteradas = True
+
+            if serie.x_media is not None:
+                linha_media = self.linhas_media.get(ticker)
+                if linha_media is None:
+                    linha_media, = self.ax.plot(serie.x_media, serie.y_media,
+                                                color=linha.get_color(), linewidth=1.2,
+                                                linestyle='--', alpha=0.7, animated=True)
+                    self.linhas_media[ticker] = linha_media
+                else:
+                    linha_media.set_data(serie.x_media, serie.y_media)
+            elif ticker in self.linhas_media:
+                self.linhas_media.pop(ticker).remove()
+                estrutura_mudou = True
+
+        for ticker in list(self.linhas):
+            if ticker not in visiveis:
+                self.linhas.pop(ticker).remove()
+                self.assinaturas.pop(ticker, None)
+                self.extensoes.pop(ticker, None)
+                if ticker in self.linhas_media:
+                    self.linhas_media.pop(ticker).remove()
+                estrutura_mudou = True
+
+        if estrutura_mudou:
+            self._atualizar_legenda()
+
+        self.ultimo_desenho = None
+        if estrutura_mudou or self._ajustar_limites() or self.fundo is None:
+            self.canvas.draw()
+            self.ultimo_desenho = 'completo'
+        elif alteradas:
+            self._blit()
+            self.ultimo_desenho = 'blit'
+
+    def _atualizar_legenda(self):
+        legenda = self.ax.get_legend()
+        if legenda is not None:
+            legenda.remove()
+        if self.linhas:
+            linhas = list(self.linhas.values())
+            self.ax.legend(linhas, [linha.get_label() for linha in linhas],
+                           bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    def _ajustar_limites(self):
+        """Amplia os limites quando os dados saem deles; indica se mudou"""
+        if not self.extensoes:
+            return False
+        extensoes = np.array(list(self.extensoes.values()))
+        x0, x1 = extensoes[:, 0].min(), extensoes[:, 1].max()
+        y0, y1 = np.nanmin(extensoes[:, 2]), np.nanmax(extensoes[:, 3])
+
+        atual_x0, atual_x1 = self.ax.get_xlim()
+        atual_y0, atual_y1 = self.ax.get_ylim()
+        dentro = atual_x0 <= x0 and x1 <= atual_x1 and atual_y0 <= y0 and y1 <= atual_y1
+        # Limites muito maiores que os dados (ex.: após trocar de intervalo) também refazem
+        folgados = (x1 - x0) < 0.5 * (atual_x1 - atual_x0) or (y1 - y0) < 0.3 * (atual_y1 - atual_y0)
+        if dentro and not folgados:
+            return False
+
+        largura = max(x1 - x0, 1e-6)
+        altura = max(y1 - y0, abs(y1) * 1e-3, 1e-6)
+        # Folga à direita para as próximas barras não forçarem outro redesenho
+        self.ax.set_xlim(x0, x1 + largura * self.FOLGA_X)
+        self.ax.set_ylim(y0 - altura * self.FOLGA_Y, y1 + altura * self.FOLGA_Y)
+        return True
+
+    def _ao_desenhar(self, evento):
+        """Guarda o fundo estático e desenha as linhas por cima"""
+        if not self.configurado:
+            return
+        self.fundo = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._desenhar_linhas()
+
+    def _desenhar_linhas(self):
+        for linha in self.linhas_media.values():
+            self.ax.draw_artist(linha)
+        for linha in self.linhas.values():
+            self.ax.draw_artist(linha)
+        self.canvas.blit(self.fig.bbox)
+
+    def _blit(self):
+        self.canvas.restore_region(self.fundo)
+        self._desenhar_linhas()
@@ -0,0 +1,385 @@
+"""Gravação contínua da sessão, exportação e reprodução
+
+`GravadorSessao` recebe cada barra nova ou revisada que chega aos
+indicadores e, ao fim de cada atualização, anexa ao arquivo do dia um
+segmento com essas barras e outro com o resumo das cotações. O arquivo só
+cresce: cada segmento tem um cabeçalho (tipo, tamanho, CRC) e um `.npz`
+compactado com uma coluna por campo. Um segmento cortado no fim (queda do
+programa durante a escrita) é ignorado na leitura.
+
+`FonteGravacao` devolve a gravação pelo caminho normal de busca, com um
+relógio que anda `velocidade` vezes mais rápido que o real sobre o horário
+em que cada barra foi gravada; tabela, gráfico, indicadores e alertas veem
+as barras (e as revisões) na ordem em que foram vistas na sessão original.
+
+    python analisador_acoes.py --gravar
+    python analisador_acoes.py --fonte gravacao:gravacoes/yahoo_20260302.grv --velocidade 100
+    python gravacao.py info gravacoes/yahoo_20260302.grv
+    python gravacao.py exportar gravacoes/yahoo_20260302.grv barras.csv
+"""
+import argparse
+import glob
+import io
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fonte_dados import FonteDados, duracao_periodo
+
+PASTA_GRAVACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gravacoes')
+
+CAMPOS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Cabeçalho de cada segmento: marca, tipo, tamanho do conteúdo e CRC32 dele
+MAGIA = b'GRV1'
+CABECALHO = struct.Struct('<4sBII')
+SEGMENTO_BARRAS = 1
+SEGMENTO_COTACOES = 2
+
+
+def escrever_segmento(arquivo, tipo, **colunas):
+    """Anexa um segmento com as colunas (vetores NumPy) ao arquivo aberto"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **colunas)
+    conteudo = buffer.getvalue()
+    arquivo.write(CABECALHO.pack(MAGIA, tipo, len(conteudo), zlib.crc32(conteudo)))
+    arquivo.write(conteudo)
+    return CABECALHO.size + len(conteudo)
+
+
+def ler_segmentos(caminho):
+    """Itera (tipo, colunas) dos segmentos íntegros de um arquivo ou pasta"""
+    if os.path.isdir(caminho):
+        caminhos = sorted(glob.glob(os.path.join(caminho, '*.grv')))
+    else:
+        caminhos = [caminho]
+    for caminho_arquivo in caminhos:
+        with open(caminho_arquivo, 'rb') as arquivo:
+            while True:
+                cabecalho = arquivo.read(CABECALHO.size)
+                if len(cabecalho) < CABECALHO.size:
+                    break
+                magia, tipo, tamanho, crc = CABECALHO.unpack(cabecalho)
+                conteudo = arquivo.read(tamanho)
+                if magia != MAGIA or len(conteudo) < tamanho or zlib.crc32(conteudo) != crc:
+                    # Escrita interrompida: o resto do arquivo não é confiável
+                    corte = arquivo.tell() - len(conteudo) - CABECALHO.size
+                    print(f"Gravação {caminho_arquivo} cortada após o byte {corte}")
+                    break
+                with np.load(io.BytesIO(conteudo), allow_pickle=False) as colunas:
+                    yield tipo, {nome: colunas[nome] for nome in colunas.files}
+
+
+def ler_barras(caminho):
+    """Todas as versões gravadas das barras, em ordem de gravação
+
+    Devolve um dicionário de vetores: ticker, intervalo, fuso, ts (ns, UTC),
+    gravado (ns, relógio de parede) e valores (n x 5, OHLCV).
+    """
+    partes = []
+    for tipo, colunas in ler_segmentos(caminho):
+        if tipo != SEGMENTO_BARRAS:
+            continue
+        indice = colunas['indice']
+        partes.append({
+            'ticker': colunas['tickers'][indice],
+            'intervalo': colunas['intervalos'][indice],
+            'fuso': np.full(len(indice), str(colunas['fuso'])),
+            'ts': colunas['ts'],
+            'gravado': np.full(len(indice), int(colunas['gravado'])),
+            'valores': colunas['valores'],
+        })
+    if not partes:
+        return {'ticker': np.empty(0, 'U1'), 'intervalo': np.empty(0, 'U1'),
+                'fuso': np.empty(0, 'U1'), 'ts': np.empty(0, np.int64),
+                'gravado': np.empty(0, np.int64), 'valores': np.empty((0, len(CAMPOS)))}
+    return {nome: np.concatenate([parte[nome] for parte in partes]) for nome in partes[0]}
+
+
+def ultima_versao(ts, ordem=None):
+    """Posições da última versão de cada horário (vetores na ordem de gravação)"""
+    ordem = np.arange(len(ts)) if ordem is None else ordem
+    classificado = np.lexsort((ordem, ts))
+    horarios = ts[classificado]
+    ultimo = np.ones(len(horarios), dtype=bool)
+    ultimo[:-1] = horarios[1:] != horarios[:-1]
+    return classificado[ultimo]
+
+
+def quadro_barras(barras, revisoes=False):
+    """DataFrame longo (uma linha por barra) de `ler_barras`
+
+    Sem `revisoes`, só a última versão de cada (ticker, intervalo, horário)
+    fica: um ticker que trocou de intervalo na sessão tem as duas séries.
+    """
+    quadro = pd.DataFrame(barras['valores'], columns=list(CAMPOS))
+    quadro.insert(0, 'ticker', barras['ticker'])
+    quadro.insert(1, 'intervalo', barras['intervalo'])
+    quadro.insert(2, 'horario', pd.to_datetime(barras['ts'], utc=True))
+    quadro['gravado'] = pd.to_datetime(barras['gravado'], utc=True)
+    if not revisoes:
+        quadro = quadro.drop_duplicates(['ticker', 'intervalo', 'horario'], keep='last')
+    return quadro.sort_values(['ticker', 'intervalo', 'horario'],
+                              kind='stable').reset_index(drop=True)
+
+
+def ler_cotacoes(caminho):
+    """DataFrame com os resumos de cotação gravados a cada atualização"""
+    partes = []
+    for tipo, colunas in ler_segmentos(caminho):
+        if tipo != SEGMENTO_COTACOES:
+            continue
+        partes.append(pd.DataFrame({
+            'gravado': pd.to_datetime(np.full(len(colunas['tickers']), int(colunas['gravado'])),
+                                      utc=True),
+            'ticker': colunas['tickers'],
+            'horario': pd.to_datetime(colunas['ts'], utc=True),
+            'preco': colunas['preco'],
+            'retorno': colunas['retorno'],
+        }))
+    if not partes:
+        return pd.DataFrame(columns=['gravado', 'ticker', 'horario', 'preco', 'retorno'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def exportar(caminho, destino, revisoes=False, cotacoes=False):
+    """Exporta uma gravação para CSV ou Parquet (pela extensão do destino)"""
+    quadro = ler_cotacoes(caminho) if cotacoes else quadro_barras(ler_barras(caminho), revisoes)
+    if destino.endswith('.parquet'):
+        quadro.to_parquet(destino, index=False)
+    else:
+        quadro.to_csv(destino, index=False)
+    return len(quadro)
+
+
+class GravadorSessao:
+    """Anexa ao arquivo do dia as barras e cotações vistas em cada atualização
+
+    `ao_adicionar` tem a mesma assinatura do gancho dos alertas em
+    `IndicadoresIncrementais.atualizar`; `concluir` escreve os segmentos.
+    Barras repetidas sem mudança (ao reiniciar os indicadores) são puladas.
+    `intervalo_de(ticker)` informa o intervalo das barras de cada ticker.
+    """
+
+    def __init__(self, pasta=None, prefixo='sessao', intervalo_de=None, metricas=None):
+        self.pasta = pasta or PASTA_GRAVACOES
+        self.prefixo = prefixo
+        self.intervalo_de = intervalo_de or (lambda ticker: '')
+        self.metricas = metricas
+        self.trava = threading.Lock()
+        self.linhas = []
+        self.fuso = ''
+        # Última barra gravada por ticker: vetores na ordem de `tickers`
+        self.tickers = []
+        self.nomes = np.empty(0, dtype=str)
+        self.ultimos = {}
+        self.ultimo_ts = np.empty(0, dtype=np.int64)
+        self.ultimo_valores = np.empty((0, len(CAMPOS)))
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def caminho(self, data=None):
+        return os.path.join(self.pasta, f"{self.prefixo}_{(data or datetime.now()):%Y%m%d}.grv")
+
+    def _trocar_tickers(self, tickers):
+        """Guarda as últimas barras da lista antiga e monta os vetores da nova"""
+        for i, ticker in enumerate(self.tickers):
+            self.ultimos[ticker] = (self.ultimo_ts[i], self.ultimo_valores[i])
+        self.tickers = tickers
+        self.nomes = np.array(tickers, dtype=str)
+        vazio = (np.iinfo(np.int64).min, np.full(len(CAMPOS), np.nan))
+        anteriores = [self.ultimos.get(ticker, vazio) for ticker in tickers]
+        self.ultimo_ts = np.array([a[0] for a in anteriores], dtype=np.int64)
+        self.ultimo_valores = np.array([a[1] for a in anteriores]).reshape(-1, len(CAMPOS))
+
+    def ao_adicionar(self, indicadores, horario, abertura, maxima, minima, fechamento, volume):
+        if indicadores.tickers is not self.tickers:
+            self._trocar_tickers(indicadores.tickers)
+        horario = pd.Timestamp(horario)
+        ts = horario.value
+        valores = np.column_stack((abertura, maxima, minima, fechamento, volume))
+        mudou = ~np.all((valores == self.ultimo_valores)
+                        | (np.isnan(valores) & np.isnan(self.ultimo_valores)), axis=1)
+        gravar = ~np.isnan(fechamento) & ((self.ultimo_ts < ts) | ((self.ultimo_ts == ts) & mudou))
+        if not gravar.any():
+            return
+        posicoes = np.flatnonzero(gravar)
+        self.ultimo_ts[posicoes] = ts
+        self.ultimo_valores[posicoes] = valores[posicoes]
+        self.fuso = str(horario.tz or '')
+        self.linhas.append((ts, self.nomes[posicoes], valores[posicoes]))
+
+    def concluir(self, indicadores):
+        """Anexa as barras recebidas e o resumo das cotações ao arquivo do dia"""
+        if not self.linhas and not len(indicadores.tickers):
+            return 0
+        inicio = time.perf_counter()
+        gravado = np.int64(time.time_ns())
+        escritos = 0
+        try:
+            with self.trava, open(self.caminho(), 'ab') as arquivo:
+                if self.linhas:
+                    nomes = np.concatenate([linha[1] for linha in self.linhas])
+                    tickers, indice = np.unique(nomes, return_inverse=True)
+                    escritos += escrever_segmento(
+                        arquivo, SEGMENTO_BARRAS, gravado=gravado, fuso=np.array(self.fuso),
+                        tickers=tickers,
+                        intervalos=np.array([self.intervalo_de(t) for t in tickers], dtype=str),
+                        indice=indice.astype(np.int32),
+                        ts=np.concatenate([np.full(len(linha[1]), linha[0], dtype=np.int64)
+                                           for linha in self.linhas]),
+                        valores=np.concatenate([linha[2] for linha in self.linhas]))
+                estado = indicadores.estado
+                com_dados = np.flatnonzero(~np.isnan(estado['fech']))
+                if len(com_dados):
+                    escritos += escrever_segmento(
+                        arquivo, SEGMENTO_COTACOES, gravado=gravado,
+                        tickers=np.array(indicadores.tickers, dtype=str)[com_dados],
+                        ts=estado['ultimo_ts'][com_dados], preco=estado['fech'][com_dados],
+                        retorno=estado['retorno'][com_dados])
+        except OSError as e:
+            print(f"Erro ao gravar a sessão: {e}")
+        self.linhas = []
+        if self.metricas is not None:
+            self.metricas.observar('gravacao_segundos', time.perf_counter() - inicio)
+            self.metricas.incrementar('gravacao_bytes_total', escritos)
+        return escritos
+
+
+class FonteGravacao(FonteDados):
+    """Fonte que reproduz uma gravação de `GravadorSessao`
+
+    O relógio começa no horário da primeira gravação e anda `velocidade`
+    vezes mais rápido que o real; cada busca vê a última versão de cada
+    barra gravada até esse momento. Tickers ou intervalos fora da gravação
+    voltam vazios (o núcleo passa ao próximo intervalo).
+    """
+
+    nome = "gravacao"
+    persistente = False
+    tempo_real = False
+
+    def __init__(self, caminho, velocidade=1.0, latencia=0.0):
+        self.caminho = caminho
+        self.velocidade = float(velocidade)
+        self.latencia = float(latencia)
+        self.series = None
+        self.inicio_gravacao = None
+        self.relogio_real = None
+        self.trava = threading.Lock()
+
+    def __getstate__(self):
+        # Cópia para outro processo: o relógio vai junto, as séries são relidas lá
+        estado = self.__dict__.copy()
+        estado['series'] = None
+        del estado['trava']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self.trava = threading.Lock()
+
+    def _carregar(self):
+        """Separa a gravação por (ticker, intervalo) (uma vez, na primeira busca)"""
+        barras = ler_barras(self.caminho)
+        series = {}
+        chaves = pd.DataFrame({'ticker': barras['ticker'], 'intervalo': barras['intervalo']})
+        grupos = chaves.groupby(['ticker', 'intervalo']).indices
+        for (ticker, intervalo), posicoes in grupos.items():
+            series[(str(ticker), str(intervalo))] = {
+                'fuso': str(barras['fuso'][posicoes[-1]]) or 'UTC',
+                'ts': barras['ts'][posicoes],
+                'gravado': barras['gravado'][posicoes],
+                'valores': barras['valores'][posicoes],
+            }
+        inicio = int(barras['gravado'].min()) if len(barras['gravado']) else time.time_ns()
+        return series, inicio
+
+    def agora(self):
+        """Horário de gravação (ns) alcançado pelo relógio da reprodução"""
+        decorrido = (time.monotonic() - self.relogio_real) * self.velocidade
+        return self.inicio_gravacao + decorrido * 1e9
+
+    def _series(self, iniciar_relogio=False):
+        with self.trava:
+            if self.series is None:
+                self.series, inicio_gravacao = self._carregar()
+                if self.inicio_gravacao is None:
+                    self.inicio_gravacao = inicio_gravacao
+            if iniciar_relogio and self.relogio_real is None:
+                self.relogio_real = time.monotonic()
+            return self.series
+
+    def tickers(self):
+        """Tickers presentes na gravação"""
+        return sorted({ticker for ticker, _ in self._series()})
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+        series = self._series(iniciar_relogio=True)
+        # Intervalo vazio: gravado sem a informação, vale para qualquer um
+        serie = series.get((ticker, intervalo)) or series.get((ticker, ''))
+        if serie is None:
+            return pd.DataFrame(columns=list(CAMPOS))
+        vistas = int(np.searchsorted(serie['gravado'], self.agora(), side='right'))
+        posicoes = ultima_versao(serie['ts'][:vistas])
+        indice = pd.to_datetime(serie['ts'][posicoes], utc=True).tz_convert(serie['fuso'])
+        dados = pd.DataFrame(serie['valores'][posicoes], index=indice, columns=list(CAMPOS))
+        if inicio is not None:
+            dados = dados[dados.index >= pd.Timestamp(inicio)]
+            if fim is not None:
+                dados = dados[dados.index < pd.Timestamp(fim)]
+        elif periodo is not None and periodo != 'max' and len(dados):
+            dados = dados[dados.index > dados.index[-1] - duracao_periodo(periodo)]
+        return dados
+
+    def verificar_conexao(self):
+        return os.path.exists(self.caminho)
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Consulta e exporta gravações de sessão")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    info = comandos.add_parser('info', help="Resumo de uma gravação")
+    info.add_argument('caminho', help="Arquivo .grv (ou pasta com vários)")
+    exportacao = comandos.add_parser('exportar', help="Exporta para CSV ou Parquet")
+    exportacao.add_argument('caminho', help="Arquivo .grv (ou pasta com vários)")
+    exportacao.add_argument('destino', help="Arquivo .csv ou .parquet")
+    exportacao.add_argument('--revisoes', action='store_true',
+                            help="Manter todas as versões de cada barra, não só a última")
+    exportacao.add_argument('--cotacoes', action='store_true',
+                            help="Exportar os resumos de cotação em vez das barras")
+    return parser.parse_args()
+
+
+def main():
+    argumentos = ler_argumentos()
+    if argumentos.comando == 'info':
+        barras = ler_barras(argumentos.caminho)
+        if not len(barras['ts']):
+            print("Gravação sem barras")
+            return
+        gravado = pd.to_datetime(barras['gravado'], utc=True)
+        tickers = len(np.unique(barras['ticker']))
+        print(f"{len(barras['ts'])} versões de barras de {tickers} tickers")
+        print(f"Gravado de {gravado.min()} a {gravado.max()}")
+        print(f"Barras de {pd.Timestamp(barras['ts'].min(), tz='UTC')} "
+              f"a {pd.Timestamp(barras['ts'].max(), tz='UTC')}")
+        return
+    try:
+        linhas = exportar(argumentos.caminho, argumentos.destino,
+                          revisoes=argumentos.revisoes, cotacoes=argumentos.cotacoes)
+    except ImportError as e:
+        print(f"Erro ao exportar (Parquet precisa do pyarrow): {e}")
+        return
+    print(f"{linhas} linhas exportadas para {argumentos.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Histórico longo: download em pedaços paralelos, arquivo compacto e níveis de detalhe
+
+O período pedido é dividido em pedaços de tamanho fixo por intervalo (o
+Yahoo limita quantos dias de barras intradiárias vêm por requisição), que
+são baixados em paralelo. Cada pedaço concluído vira um arquivo `.npz`
+compactado; rodar de novo pula os pedaços que já estão em disco, o que
+permite retomar um download interrompido. Só o pedaço que contém o momento
+atual é sempre baixado de novo. Pedaços que falharam ou vieram vazios não
+são gravados (serão pedidos de novo), exceto os vazios de barras diárias
+anteriores ao primeiro pedaço com dados: esses são de antes da listagem.
+
+`NiveisDetalhe` agrega as barras em níveis mais grossos (1h, 1d) para que o
+gráfico de vários anos desenhe poucos pontos e troque de nível ao ampliar.
+
+    python historico.py PETR4.SA VALE3.SA --intervalo 1d --desde 2015-01-01
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from cache_barras import DURACAO_INTERVALO
+from resiliencia import Disjuntor, ErroSemDados, PoliticaRetentativa
+
+PASTA_HISTORICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historico')
+
+# Por intervalo: (dias de histórico que o Yahoo fornece, dias por pedaço)
+LIMITES_YAHOO = {
+    '1m': (30, 7),
+    '2m': (60, 30),
+    '5m': (60, 30),
+    '15m': (60, 30),
+    '30m': (60, 30),
+    '1h': (730, 180),
+    '1d': (None, 730),
+}
+
+# Níveis de agregação usados no gráfico, do mais fino ao mais grosso
+NIVEIS_AGREGACAO = ('1h', '1d')
+
+
+class Pedaco:
+    """Trecho [inicio, fim) de um ticker/intervalo baixado de uma vez
+
+    `inicio` é o alinhado (dá o nome do arquivo); `pedido` é o início enviado
+    à fonte, que pode ser posterior quando a fonte não tem barras tão antigas.
+    """
+
+    __slots__ = ('ticker', 'intervalo', 'inicio', 'fim', 'caminho', 'pedido')
+
+    def __init__(self, ticker, intervalo, inicio, fim, caminho, pedido=None):
+        self.ticker = ticker
+        self.intervalo = intervalo
+        self.inicio = inicio
+        self.fim = fim
+        self.caminho = caminho
+        self.pedido = inicio if pedido is None else max(inicio, pedido)
+
+    def __repr__(self):
+        return f"Pedaco({self.ticker}, {self.intervalo}, {self.inicio:%Y-%m-%d} a {self.fim:%Y-%m-%d})"
+
+
+def _em_utc(data):
+    data = pd.Timestamp(data)
+    return data.tz_localize('UTC') if data.tz is None else data.tz_convert('UTC')
+
+
+def dias_por_pedaco(intervalo):
+    return LIMITES_YAHOO.get(intervalo, (None, 365))[1]
+
+
+def limites_pedacos(inicio, fim, dias):
+    """Divide [inicio, fim) em pedaços de `dias` dias alinhados à época Unix
+
+    O alinhamento fixo faz o mesmo pedaço ter sempre o mesmo nome de arquivo,
+    seja qual for o início pedido.
+    """
+    largura = dias * 86400
+    primeiro = int(inicio.timestamp()) // largura
+    ultimo = (int(fim.timestamp()) - 1) // largura
+    return [(pd.Timestamp(k * largura, unit='s', tz='UTC'),
+             pd.Timestamp((k + 1) * largura, unit='s', tz='UTC'))
+            for k in range(primeiro, ultimo + 1)]
+
+
+class ArquivoHistorico:
+    """Barras históricas em disco: um .npz compactado por ticker, intervalo e pedaço
+
+    Horários em segundos (int64, UTC), preços em float32 e volume em float64.
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def caminho(self, ticker, intervalo, inicio):
+        return os.path.join(self.pasta, ticker, intervalo, f"{inicio:%Y%m%d}.npz")
+
+    def gravar(self, pedaco, dados):
+        """Grava o pedaço de forma atômica; devolve o número de barras gravadas
+
+        `dados=None` grava o pedaço vazio (marcado como baixado). Barras que
+        caem todas fora do pedaço não gravam nada: ele continua pendente.
+        """
+        if dados is None or dados.empty:
+            ts = np.zeros(0, dtype=np.int64)
+            valores = np.zeros((0, 5))
+            fuso = ''
+        else:
+            indice = pd.DatetimeIndex(dados.index)
+            fuso = str(indice.tz) if indice.tz is not None else ''
+            if indice.tz is None:
+                indice = indice.tz_localize('UTC')
+            ts = indice.tz_convert('UTC').tz_localize(None).values.astype('datetime64[s]').astype(np.int64)
+            valores = dados.reindex(columns=['Open', 'High', 'Low', 'Close', 'Volume']).to_numpy(float)
+            dentro = (ts >= pedaco.inicio.timestamp()) & (ts < pedaco.fim.timestamp())
+            ts, valores = ts[dentro], valores[dentro]
+            if not len(ts):
+                return 0
+
+        os.makedirs(os.path.dirname(pedaco.caminho), exist_ok=True)
+        temporario = pedaco.caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            np.savez_compressed(f, ts=ts, ohlc=valores[:, :4].astype(np.float32),
+                                volume=valores[:, 4], fuso=np.array(fuso))
+        os.replace(temporario, pedaco.caminho)
+        return len(ts)
+
+    def existe(self, pedaco):
+        return os.path.exists(pedaco.caminho)
+
+    def primeiro_inicio(self, ticker, intervalo):
+        """Início (UTC) do pedaço mais antigo em disco, ou None"""
+        pasta = os.path.join(self.pasta, ticker, intervalo)
+        if not os.path.isdir(pasta):
+            return None
+        nomes = sorted(nome for nome in os.listdir(pasta) if nome.endswith('.npz'))
+        return pd.Timestamp(nomes[0][:-4], tz='UTC') if nomes else None
+
+    def ler(self, ticker, intervalo, inicio=None, fim=None):
+        """Barras do período como dicionário de vetores (ou None se não houver)
+
+        Chaves: 'ts' (segundos, UTC), 'open', 'high', 'low', 'close', 'volume' e 'fuso'.
+        """
+        pasta = os.path.join(self.pasta, ticker, intervalo)
+        if not os.path.isdir(pasta):
+            return None
+        inicio_s = inicio.timestamp() if inicio is not None else -np.inf
+        fim_s = fim.timestamp() if fim is not None else np.inf
+        largura = dias_por_pedaco(intervalo) * 86400
+
+        partes_ts, partes_ohlc, partes_volume, fuso = [], [], [], ''
+        for nome in sorted(os.listdir(pasta)):
+            if not nome.endswith('.npz'):
+                continue
+            comeco = pd.Timestamp(nome[:-4], tz='UTC').timestamp()
+            if comeco >= fim_s or comeco + largura <= inicio_s:
+                continue
+            with np.load(os.path.join(pasta, nome)) as arquivo:
+                partes_ts.append(arquivo['ts'])
+                partes_ohlc.append(arquivo['ohlc'])
+                partes_volume.append(arquivo['volume'])
+                fuso = str(arquivo['fuso']) or fuso
+        if not partes_ts:
+            return None
+
+        ts = np.concatenate(partes_ts)
+        ohlc = np.concatenate(partes_ohlc).astype(float)
+        volume = np.concatenate(partes_volume)
+        dentro = (ts >= inicio_s) & (ts < fim_s)
+        return {
+            'ts': ts[dentro], 'open': ohlc[dentro, 0], 'high': ohlc[dentro, 1],
+            'low': ohlc[dentro, 2], 'close': ohlc[dentro, 3], 'volume': volume[dentro],
+            'fuso': fuso or None,
+        }
+
+    def quadro(self, ticker, intervalo, inicio=None, fim=None):
+        """Barras do período como DataFrame OHLCV"""
+        barras = self.ler(ticker, intervalo, inicio, fim)
+        if barras is None:
+            return None
+        indice = pd.DatetimeIndex(pd.to_datetime(barras['ts'], unit='s', utc=True))
+        if barras['fuso']:
+            indice = indice.tz_convert(barras['fuso'])
+        return pd.DataFrame({'Open': barras['open'], 'High': barras['high'],
+                             'Low': barras['low'], 'Close': barras['close'],
+                             'Volume': barras['volume']}, index=indice)
+
+
+class Backfill:
+    """Baixa históricos longos em pedaços paralelos, retomando de onde parou"""
+
+    def __init__(self, fonte, arquivo, max_concorrencia=4, politica=None, disjuntor=None,
+                 metricas=None):
+        self.fonte = fonte
+        self.arquivo = arquivo
+        self.max_concorrencia = max(1, int(max_concorrencia))
+        self.politica = politica or PoliticaRetentativa(metricas=metricas)
+        self.disjuntor = disjuntor or Disjuntor()
+        self.metricas = metricas
+
+    def planejar(self, tickers, intervalo, inicio, fim=None):
+        """Pedaços que ainda precisam ser baixados"""
+        agora = pd.Timestamp.now(tz='UTC')
+        fim = min(_em_utc(fim), agora) if fim is not None else agora
+        inicio = _em_utc(inicio)
+        dias_disponiveis = LIMITES_YAHOO.get(intervalo, (None, 0))[0]
+        if self.fonte.tempo_real and dias_disponiveis is not None:
+            # Barras intradiárias antigas não existem na fonte: não adianta pedir
+            inicio = max(inicio, agora - pd.Timedelta(days=dias_disponiveis - 1))
+
+        pedacos = []
+        for ticker in tickers:
+            for comeco, final in limites_pedacos(inicio, fim, dias_por_pedaco(intervalo)):
+                pedaco = Pedaco(ticker, intervalo, comeco, final,
+                                self.arquivo.caminho(ticker, intervalo, comeco), pedido=inicio)
+                # O pedaço que ainda não terminou é sempre baixado de novo
+                if final <= agora and self.arquivo.existe(pedaco):
+                    continue
+                pedacos.append(pedaco)
+        return pedacos
+
+    def _baixar(self, pedaco):
+        """Baixa e grava o pedaço; devolve o número de barras (0 se veio vazio)
+
+        Um pedaço vazio não é gravado aqui: pode ser antes da listagem, mas
+        também uma recusa da fonte. `executar` grava depois só os que ficam
+        comprovadamente antes da listagem.
+        """
+        inicio = time.perf_counter()
+        try:
+            dados = self.politica.executar(
+                lambda: self.fonte.historico(pedaco.ticker, pedaco.intervalo,
+                                             inicio=pedaco.pedido, fim=pedaco.fim),
+                self.disjuntor)
+        except ErroSemDados:
+            dados = None
+        barras = 0
+        if dados is not None and not dados.empty:
+            barras = self.arquivo.gravar(pedaco, dados)
+        if self.metricas is not None:
+            self.metricas.observar('historico_pedaco_segundos', time.perf_counter() - inicio)
+            self.metricas.incrementar('historico_barras_total', barras)
+        return barras
+
+    def executar(self, tickers, intervalo, inicio, fim=None, ao_progresso=None, cancelado=None):
+        """Baixa os pedaços pendentes e devolve um resumo do que foi feito
+
+        `ao_progresso(feitos, total, pedaco, erro)` é chamado a cada pedaço
+        (na thread de trabalho); `cancelado()` interrompe novos downloads.
+        """
+        pedacos = self.planejar(tickers, intervalo, inicio, fim)
+        resumo = {'pedacos': len(pedacos), 'baixados': 0, 'falhas': 0, 'barras': 0}
+        trava = threading.Lock()
+        vazios, com_dados = [], []
+
+        def tarefa(pedaco):
+            if cancelado is not None and cancelado():
+                return pedaco, 0, None, True
+            try:
+                return pedaco, self._baixar(pedaco), None, False
+            except Exception as e:
+                return pedaco, 0, e, False
+
+        with ThreadPoolExecutor(max_workers=self.max_concorrencia) as executor:
+            futuros = [executor.submit(tarefa, pedaco) for pedaco in pedacos]
+            for futuro in as_completed(futuros):
+                pedaco, barras, erro, pulado = futuro.result()
+                with trava:
+                    if erro is not None:
+                        resumo['falhas'] += 1
+                        print(f"Falha em {pedaco}: {erro}")
+                    elif not pulado:
+                        resumo['baixados'] += 1
+                        resumo['barras'] += barras
+                    feitos = resumo['baixados'] + resumo['falhas']
+                if ao_progresso is not None and not pulado:
+                    ao_progresso(feitos, len(pedacos), pedaco, erro)
+                if erro is None and not pulado and barras == 0:
+                    vazios.append(pedaco)
+                elif erro is None and barras > 0:
+                    com_dados.append(pedaco)
+        self._marcar_antes_da_listagem(intervalo, vazios, com_dados)
+        return resumo
+
+    def _marcar_antes_da_listagem(self, intervalo, vazios, com_dados):
+        """Grava como vazios os pedaços diários anteriores ao primeiro com dados
+
+        Só para intervalos sem limite de histórico na fonte: nos intradiários
+        um pedaço vazio não prova nada e fica para ser pedido de novo.
+        """
+        if LIMITES_YAHOO.get(intervalo, (None, 0))[0] is not None:
+            return
+        # Primeiro pedaço com dados (ou já em disco) de cada ticker, antes de gravar
+        primeiro = {}
+        for ticker in {pedaco.ticker for pedaco in vazios}:
+            inicios = [pedaco.inicio for pedaco in com_dados if pedaco.ticker == ticker]
+            em_disco = self.arquivo.primeiro_inicio(ticker, intervalo)
+            if em_disco is not None:
+                inicios.append(em_disco)
+            if inicios:
+                primeiro[ticker] = min(inicios)
+        for pedaco in vazios:
+            if pedaco.ticker in primeiro and pedaco.fim <= primeiro[pedaco.ticker]:
+                self.arquivo.gravar(pedaco, None)
+
+
+def agregar(ts, abertura, maxima, minima, fechamento, volume, duracao, deslocamento=0):
+    """Agrega barras em baldes de `duracao` segundos (vetorizado)
+
+    `deslocamento` (segundos) alinha os baldes ao fuso local, para que as
+    barras diárias comecem à meia-noite do pregão e não à do UTC.
+    """
+    if len(ts) == 0:
+        return ts, abertura, maxima, minima, fechamento, volume
+    balde = (ts + deslocamento) // duracao
+    inicios = np.flatnonzero(np.diff(balde, prepend=balde[0] - 1))
+    fins = np.append(inicios[1:], len(ts)) - 1
+    return (ts[inicios], abertura[inicios],
+            np.fmax.reduceat(maxima, inicios), np.fmin.reduceat(minima, inicios),
+            fechamento[fins], np.add.reduceat(np.nan_to_num(volume), inicios))
+
+
+class NiveisDetalhe:
+    """Pirâmide de agregações de uma série para desenhar qualquer zoom rápido
+
+    Nível 0 são as barras originais; os seguintes agregam em 1h e 1d (os que
+    forem mais grossos que o intervalo original). `janela` escolhe o nível
+    mais fino que ainda cabe na largura pedida.
+    """
+
+    def __init__(self, barras, intervalo, pontos_por_pixel=2):
+        self.pontos_por_pixel = pontos_por_pixel
+        self.fuso = barras.get('fuso')
+        deslocamento = 0
+        if self.fuso and len(barras['ts']):
+            primeiro = pd.Timestamp(int(barras['ts'][0]), unit='s', tz='UTC').tz_convert(self.fuso)
+            deslocamento = int(primeiro.utcoffset().total_seconds())
+
+        campos = ('ts', 'open', 'high', 'low', 'close', 'volume')
+        self.niveis = [(intervalo, tuple(barras[c] for c in campos))]
+        base = DURACAO_INTERVALO.get(intervalo, 60)
+        for nivel in NIVEIS_AGREGACAO:
+            duracao = DURACAO_INTERVALO[nivel]
+            if duracao > base:
+                anterior = self.niveis[-1][1]
+                self.niveis.append((nivel, agregar(*anterior, duracao, deslocamento)))
+
+    def extensao(self):
+        ts = self.niveis[0][1][0]
+        return (int(ts[0]), int(ts[-1])) if len(ts) else None
+
+    def janela(self, inicio, fim, pixels):
+        """(nível, ts, fechamento, máxima, mínima) das barras entre `inicio` e `fim` (segundos)"""
+        limite = max(1, int(pixels)) * self.pontos_por_pixel
+        for nome, (ts, _, maxima, minima, fechamento, _) in self.niveis:
+            a = int(np.searchsorted(ts, inicio, side='left'))
+            b = int(np.searchsorted(ts, fim, side='right'))
+            # Uma barra de cada lado para a linha não terminar antes da borda
+            a, b = max(0, a - 1), min(len(ts), b + 1)
+            if b - a <= limite or nome == self.niveis[-1][0]:
+                return nome, ts[a:b], fechamento[a:b], maxima[a:b], minima[a:b]
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Baixa o histórico longo de ações")
+    parser.add_argument("tickers", nargs='+', help="Códigos (ex.: PETR4.SA)")
+    parser.add_argument("--intervalo", default="1d", choices=sorted(LIMITES_YAHOO),
+                        help="Intervalo das barras")
+    parser.add_argument("--desde", default="2010-01-01", help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="Data final, exclusiva (padrão: agora)")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Downloads simultâneos")
+    parser.add_argument("--pasta", help=f"Pasta do histórico (padrão: {PASTA_HISTORICO}/<fonte>)")
+    parser.add_argument("--fonte", default="yahoo",
+                        help="Fonte de dados: 'yahoo' ou 'replay[:PASTA]'")
+    return parser.parse_args()
+
+
+def main():
+    from fonte_dados import criar_fonte
+    argumentos = ler_argumentos()
+    fonte = criar_fonte(argumentos.fonte, velocidade=0)
+    if not fonte.tempo_real:
+        # Na reprodução o relógio fica parado no fim da série: tudo já é passado
+        fonte.barras_iniciais = fonte.barras_sinteticas
+    arquivo = ArquivoHistorico(argumentos.pasta or os.path.join(PASTA_HISTORICO, fonte.nome))
+    backfill = Backfill(fonte, arquivo, max_concorrencia=argumentos.concorrencia)
+
+    def ao_progresso(feitos, total, pedaco, erro):
+        print(f"[{feitos}/{total}] {pedaco}{' - erro' if erro else ''}")
+
+    inicio = time.perf_counter()
+    tickers = [ticker.upper() for ticker in argumentos.tickers]
+    resumo = backfill.executar(tickers, argumentos.intervalo, argumentos.desde, argumentos.ate,
+                               ao_progresso=ao_progresso)
+    print(f"{resumo['baixados']} pedaços baixados ({resumo['barras']} barras), "
+          f"{resumo['falhas']} falhas, em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Indicadores técnicos calculados sobre todas as ações de uma vez
+
+As funções vetorizadas recebem painéis "largos" (uma coluna por ticker,
+índice de datas alinhado) e devolvem painéis do mesmo formato.
+`IndicadoresIncrementais` mantém o estado de cada indicador em vetores
+NumPy (uma posição por ticker) e atualiza tudo em O(1) por barra nova.
+"""
+import numpy as np
+import pandas as pd
+
+CAMPOS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+def montar_painel(dados_acoes, tickers=None):
+    """Alinha os quadros por ticker em um painel largo por campo"""
+    quadros = {}
+    for ticker in (tickers if tickers is not None else dados_acoes):
+        dados = dados_acoes.get(ticker)
+        if dados is not None:
+            quadros[ticker] = dados
+    tickers = list(quadros)
+    painel = {}
+    for campo in CAMPOS:
+        colunas = {t: d[campo] for t, d in quadros.items() if campo in d.columns}
+        painel[campo] = pd.DataFrame(colunas, columns=tickers)
+    return painel
+
+
+def retornos(fechamento):
+    return fechamento.pct_change(fill_method=None)
+
+
+def sma(fechamento, janela=20):
+    return fechamento.rolling(janela).mean()
+
+
+def ema(fechamento, periodo=20):
+    return fechamento.ewm(span=periodo, adjust=False).mean()
+
+
+def rsi(fechamento, periodo=14):
+    """Índice de força relativa (média de Wilder)"""
+    variacao = fechamento.diff()
+    ganho = variacao.clip(lower=0).ewm(alpha=1 / periodo, adjust=False).mean()
+    perda = (-variacao).clip(lower=0).ewm(alpha=1 / periodo, adjust=False).mean()
+    return 100 - 100 / (1 + ganho / perda)
+
+
+def bollinger(fechamento, janela=20, desvios=2.0):
+    """Retorna (média, banda superior, banda inferior)"""
+    media = fechamento.rolling(janela).mean()
+    desvio = fechamento.rolling(janela).std()
+    return media, media + desvios * desvio, media - desvios * desvio
+
+
+def atr(maxima, minima, fechamento, periodo=14):
+    """Amplitude média verdadeira (média de Wilder)"""
+    anterior = fechamento.shift(1)
+    amplitude = np.fmax(maxima - minima,
+                        np.fmax((maxima - anterior).abs(), (minima - anterior).abs()))
+    amplitude = amplitude.where(fechamento.notna())
+    return amplitude.ewm(alpha=1 / periodo, adjust=False).mean()
+
+
+def volatilidade(fechamento, janela=20):
+    """Desvio padrão dos retornos logarítmicos na janela"""
+    return np.log(fechamento / fechamento.shift(1)).rolling(janela).std()
+
+
+def vwap(maxima, minima, fechamento, volume):
+    """Preço médio ponderado por volume, reiniciado a cada dia"""
+    tipico = (maxima + minima + fechamento) / 3
+    volume = volume.where(fechamento.notna())
+    dias = fechamento.index.normalize()
+    pv = (tipico * volume).groupby(dias).cumsum()
+    v = volume.groupby(dias).cumsum()
+    return pv / v.replace(0, np.nan)
+
+
+def calcular_indicadores(painel, janela=20, periodo_ema=20, periodo_rsi=14, periodo_atr=14):
+    """Calcula todos os indicadores sobre um painel de `montar_painel`"""
+    fechamento = painel['Close']
+    media, superior, inferior = bollinger(fechamento, janela)
+    return {
+        'retorno': retornos(fechamento),
+        'sma': media,
+        'ema': ema(fechamento, periodo_ema),
+        'rsi': rsi(fechamento, periodo_rsi),
+        'bb_superior': superior,
+        'bb_inferior': inferior,
+        'atr': atr(painel['High'], painel['Low'], fechamento, periodo_atr),
+        'volatilidade': volatilidade(fechamento, janela),
+        'vwap': vwap(painel['High'], painel['Low'], fechamento, painel['Volume']),
+    }
+
+
+class IndicadoresIncrementais:
+    """Estado dos indicadores de todas as ações, atualizado barra a barra
+
+    Cada chamada de `adicionar` recebe uma barra (mesmo horário) para todos
+    os tickers, com NaN onde o ticker não tem barra, e atualiza os vetores
+    de estado sem reler o histórico. Se chegar de novo uma barra com o mesmo
+    horário da última (barra ainda em formação), o estado anterior a ela é
+    restaurado antes de aplicá-la. Quando a lista de tickers muda, só os
+    tickers novos começam do zero (ver `ajustar`).
+    """
+
+    ESCALARES = ('ultimo_ts', 'n', 'fech', 'ema', 'ganho', 'perda', 'atr',
+                 'pos', 'soma', 'soma2', 'soma_r', 'soma2_r', 'dia', 'pv', 'v', 'retorno',
+                 'fech_ontem')
+
+    def __init__(self, tickers=(), janela=20, periodo_ema=20, periodo_rsi=14, periodo_atr=14):
+        self.janela = janela
+        self.alfa_ema = 2 / (periodo_ema + 1)
+        self.periodo_rsi = periodo_rsi
+        self.periodo_atr = periodo_atr
+        self.reiniciar(tickers)
+
+    def reiniciar(self, tickers):
+        """Zera o estado para uma nova lista de tickers"""
+        self.tickers = list(tickers)
+        self.posicoes = {t: i for i, t in enumerate(self.tickers)}
+        n = len(self.tickers)
+        self.estado = {nome: np.zeros(n) for nome in self.ESCALARES}
+        self.estado['ultimo_ts'] = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        self.estado['n'] = np.zeros(n, dtype=np.int64)
+        self.estado['pos'] = np.zeros(n, dtype=np.int64)
+        for nome in ('fech', 'ema', 'ganho', 'perda', 'atr', 'retorno', 'fech_ontem'):
+            self.estado[nome][:] = np.nan
+        self.anterior = {nome: valores.copy() for nome, valores in self.estado.items()}
+        self.anel = np.zeros((self.janela, n))
+        self.anel_r = np.zeros((self.janela, n))
+        self.sobrescrito = np.zeros(n)
+        self.sobrescrito_r = np.zeros(n)
+
+    def ajustar(self, tickers):
+        """Troca a lista de tickers mantendo o estado dos que continuam nela"""
+        antigos = np.array([self.posicoes.get(t, -1) for t in tickers], dtype=np.int64)
+        mantidos = antigos >= 0
+        origem = antigos[mantidos]
+        estado, anterior = self.estado, self.anterior
+        anel, anel_r = self.anel, self.anel_r
+        sobrescrito, sobrescrito_r = self.sobrescrito, self.sobrescrito_r
+        self.reiniciar(tickers)
+        for nome in self.ESCALARES:
+            self.estado[nome][mantidos] = estado[nome][origem]
+            self.anterior[nome][mantidos] = anterior[nome][origem]
+        self.anel[:, mantidos] = anel[:, origem]
+        self.anel_r[:, mantidos] = anel_r[:, origem]
+        self.sobrescrito[mantidos] = sobrescrito[origem]
+        self.sobrescrito_r[mantidos] = sobrescrito_r[origem]
+
+    def adicionar(self, horario, maxima, minima, fechamento, volume):
+        """Aplica uma barra (vetores com um valor por ticker) ao estado"""
+        e = self.estado
+        colunas = np.arange(len(self.tickers))
+        ts = pd.Timestamp(horario).value
+        valido = ~np.isnan(fechamento)
+        revisao = valido & (e['ultimo_ts'] == ts)
+        nova = valido & (e['ultimo_ts'] < ts)
+
+        if revisao.any():
+            for nome, valores in e.items():
+                valores[revisao] = self.anterior[nome][revisao]
+            self.anel[e['pos'][revisao], colunas[revisao]] = self.sobrescrito[revisao]
+            self.anel_r[e['pos'][revisao], colunas[revisao]] = self.sobrescrito_r[revisao]
+        if nova.any():
+            for nome, valores in e.items():
+                self.anterior[nome][nova] = valores[nova]
+
+        m = revisao | nova
+        if not m.any():
+            return
+        h, l, c, v = maxima[m], minima[m], fechamento[m], np.nan_to_num(volume[m])
+        idx = colunas[m]
+        anterior = e['fech'][m]
+        n = e['n'][m] + 1
+        primeira = n == 1
+
+        # Médias exponenciais (EMA, RSI e ATR de Wilder)
+        e['ema'][m] = np.where(primeira, c, e['ema'][m] + self.alfa_ema * (c - e['ema'][m]))
+        variacao = c - anterior
+        ganho, perda = np.maximum(variacao, 0), np.maximum(-variacao, 0)
+        segunda = n == 2
+        e['ganho'][m] = np.where(segunda, ganho,
+                                 e['ganho'][m] + (ganho - e['ganho'][m]) / self.periodo_rsi)
+        e['perda'][m] = np.where(segunda, perda,
+                                 e['perda'][m] + (perda - e['perda'][m]) / self.periodo_rsi)
+        amplitude = np.fmax(h - l, np.fmax(np.abs(h - anterior), np.abs(l - anterior)))
+        e['atr'][m] = np.where(primeira, amplitude,
+                               e['atr'][m] + (amplitude - e['atr'][m]) / self.periodo_atr)
+
+        # Janelas móveis: soma e soma dos quadrados em um anel circular
+        pos = e['pos'][m]
+        antigo = self.anel[pos, idx]
+        self.sobrescrito[m] = antigo
+        self.anel[pos, idx] = c
+        e['soma'][m] += c - antigo
+        e['soma2'][m] += c * c - antigo * antigo
+
+        retorno_log = np.where(primeira, 0.0, np.log(c / anterior))
+        antigo_r = self.anel_r[pos, idx]
+        self.sobrescrito_r[m] = antigo_r
+        self.anel_r[pos, idx] = retorno_log
+        e['soma_r'][m] += retorno_log - antigo_r
+        e['soma2_r'][m] += retorno_log * retorno_log - antigo_r * antigo_r
+        e['pos'][m] = (pos + 1) % self.janela
+
+        # VWAP do dia
+        dia = pd.Timestamp(horario).normalize().value
+        novo_dia = e['dia'][m] != dia
+        # Fechamento do último pregão anterior (base do retorno do dia)
+        e['fech_ontem'][m] = np.where(novo_dia, anterior, e['fech_ontem'][m])
+        tipico = (h + l + c) / 3
+        e['pv'][m] = np.where(novo_dia, 0.0, e['pv'][m]) + tipico * v
+        e['v'][m] = np.where(novo_dia, 0.0, e['v'][m]) + v
+        e['dia'][m] = dia
+
+        e['retorno'][m] = np.where(primeira, np.nan, c / anterior - 1)
+        e['fech'][m] = c
+        e['n'][m] = n
+        e['ultimo_ts'][m] = ts
+
+    def atualizar(self, dados_acoes, ao_adicionar=None):
+        """Aplica as barras novas (ou revisadas) de cada quadro ao estado
+
+        `ao_adicionar(self, horario, abertura, maxima, minima, fechamento, volume)`
+        é chamado depois de cada barra aplicada (usado pelos alertas).
+        """
+        quadros = {t: d for t, d in dados_acoes.items() if d is not None and len(d)}
+        if set(quadros) != set(self.tickers):
+            self.ajustar(quadros)
+
+        novos = {}
+        for ticker in self.tickers:
+            dados = quadros[ticker]
+            ultimo = self.estado['ultimo_ts'][self.posicoes[ticker]]
+            inicio = dados.index.searchsorted(pd.Timestamp(ultimo, tz='UTC')) \
+                if ultimo != np.iinfo(np.int64).min else 0
+            if inicio < len(dados):
+                novos[ticker] = dados.iloc[inicio:]
+        if not novos:
+            return 0
+
+        painel = montar_painel(novos, self.tickers)
+        colunas = {campo: painel[campo].reindex(columns=self.tickers).to_numpy(dtype=float)
+                   for campo in ('Open', 'High', 'Low', 'Close', 'Volume')}
+        for linha, horario in enumerate(painel['Close'].index):
+            self.adicionar(horario, colunas['High'][linha], colunas['Low'][linha],
+                           colunas['Close'][linha], colunas['Volume'][linha])
+            if ao_adicionar is not None:
+                ao_adicionar(self, horario, colunas['Open'][linha], colunas['High'][linha],
+                             colunas['Low'][linha], colunas['Close'][linha],
+                             colunas['Volume'][linha])
+        return len(painel['Close'].index)
+
+    def valores(self):
+        """Valores atuais de cada indicador (vetores na ordem de `tickers`)"""
+        e = self.estado
+        n = e['n'].astype(float)
+        cheia = n >= self.janela
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media = np.where(cheia, e['soma'] / self.janela, np.nan)
+            variancia = (e['soma2'] - e['soma'] ** 2 / self.janela) / (self.janela - 1)
+            desvio = np.where(cheia, np.sqrt(np.maximum(variancia, 0)), np.nan)
+            # A janela de retornos só fica cheia uma barra depois
+            variancia_r = (e['soma2_r'] - e['soma_r'] ** 2 / self.janela) / (self.janela - 1)
+            volat = np.where(n > self.janela, np.sqrt(np.maximum(variancia_r, 0)), np.nan)
+            rsi_atual = np.where(n >= 2, 100 - 100 / (1 + e['ganho'] / e['perda']), np.nan)
+            vwap_atual = np.where(e['v'] > 0, e['pv'] / e['v'], np.nan)
+        return {
+            'retorno': e['retorno'].copy(),
+            'sma': media,
+            'ema': e['ema'].copy(),
+            'rsi': rsi_atual,
+            'bb_superior': media + 2 * desvio,
+            'bb_inferior': media - 2 * desvio,
+            'atr': e['atr'].copy(),
+            'volatilidade': volat,
+            'vwap': vwap_atual,
+        }
+
+    def por_ticker(self):
+        """Valores atuais organizados como ticker -> {indicador: valor}"""
+        valores = self.valores()
+        return {ticker: {nome: float(vetor[i]) for nome, vetor in valores.items()}
+                for ticker, i in self.posicoes.items()}
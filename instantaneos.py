@@ -0,0 +1,148 @@
+"""Instantâneos de exibição montados fora da thread da interface
+
+A thread da interface só pede (`solicitar`) e aplica instantâneos prontos.
+Uma thread produtora lê o núcleo, calcula as linhas da tabela que mudaram
+(já formatadas) e as séries do gráfico (já convertidas e decimadas) e
+publica um `Instantaneo` imutável em uma fila. Pedidos que chegam enquanto
+um instantâneo está sendo montado são fundidos: só o mais recente é feito.
+"""
+import queue
+import threading
+import time
+from datetime import datetime
+
+from armazem_barras import VistaQuadros
+from grafico_rapido import preparar_series
+from indicadores import montar_painel, sma
+from tabela_incremental import ModeloTabela
+
+
+class Instantaneo:
+    """Alterações prontas para a interface aplicar
+
+    `linhas` traz a linha completa (ticker -> valores formatados) de cada
+    ticker novo ou alterado; `series` é None quando o gráfico não foi pedido.
+    """
+
+    __slots__ = ('versao', 'linhas', 'remover', 'ordem', 'reordenar', 'series', 'duracao')
+
+    def __init__(self, versao, linhas, remover, ordem, reordenar, series, duracao):
+        self.versao = versao
+        self.linhas = linhas
+        self.remover = remover
+        self.ordem = ordem
+        self.reordenar = reordenar
+        self.series = series
+        self.duracao = duracao
+
+
+class PedidoInstantaneo:
+    """Parâmetros de um instantâneo, lidos da interface na thread principal"""
+
+    __slots__ = ('acoes', 'visiveis', 'medias', 'largura', 'tabela', 'grafico')
+
+    def __init__(self, acoes, visiveis, medias, largura, tabela, grafico):
+        self.acoes = acoes
+        self.visiveis = visiveis
+        self.medias = medias
+        self.largura = largura
+        self.tabela = tabela
+        self.grafico = grafico
+
+
+class ProdutorInstantaneos:
+    """Monta instantâneos em uma thread própria e os publica em uma fila
+
+    `ao_publicar()` é chamado (na thread produtora) a cada instantâneo novo;
+    a interface deve então agendar `coletar()` na própria thread.
+    """
+
+    def __init__(self, nucleo, ao_publicar=None, janela_media=20):
+        self.nucleo = nucleo
+        self.ao_publicar = ao_publicar
+        self.janela_media = janela_media
+        self.modelo = ModeloTabela()
+        self.fila = queue.Queue()
+        self.versao = 0
+        self.pedido = None
+        self.condicao = threading.Condition()
+        self.parado = False
+        self.thread = threading.Thread(target=self._laco, daemon=True)
+        self.thread.start()
+
+    def solicitar(self, acoes, visiveis, medias=False, largura=800, tabela=True, grafico=True):
+        """Pede um instantâneo novo; pedidos ainda não atendidos são fundidos"""
+        with self.condicao:
+            anterior = self.pedido
+            if anterior is not None:
+                tabela = tabela or anterior.tabela
+                grafico = grafico or anterior.grafico
+            self.pedido = PedidoInstantaneo(dict(acoes), list(visiveis), medias, largura,
+                                            tabela, grafico)
+            self.condicao.notify()
+
+    def parar(self):
+        with self.condicao:
+            self.parado = True
+            self.condicao.notify()
+
+    def coletar(self):
+        """Instantâneos publicados desde a última coleta, em ordem"""
+        instantaneos = []
+        while True:
+            try:
+                instantaneos.append(self.fila.get_nowait())
+            except queue.Empty:
+                return instantaneos
+
+    def _laco(self):
+        while True:
+            with self.condicao:
+                self.condicao.wait_for(lambda: self.pedido is not None or self.parado)
+                if self.parado:
+                    return
+                pedido, self.pedido = self.pedido, None
+            try:
+                instantaneo = self._montar(pedido)
+            except Exception as e:
+                print(f"Erro ao montar instantâneo: {e}")
+                continue
+            self.fila.put(instantaneo)
+            if self.ao_publicar is not None:
+                self.ao_publicar()
+
+    def _montar(self, pedido):
+        inicio = time.perf_counter()
+        metricas = self.nucleo.metricas
+        # Cópias sob a trava do armazém: gravações concorrentes não afetam o instantâneo
+        dados = VistaQuadros(self.nucleo.barras, self.nucleo.JANELA_EXIBICAO, copiar=True)
+
+        linhas, remover, ordem, reordenar = {}, [], None, False
+        if pedido.tabela:
+            with metricas.cronometro('instantaneo_segundos', etapa='tabela'):
+                quadros = {t: dados.get(t) for t in pedido.acoes}
+                diferencas = self.modelo.diferencas(pedido.acoes, quadros,
+                                                    self.nucleo.valores_indicadores)
+                hora = datetime.now().strftime('%H:%M:%S')
+                alterados = [t for t, _ in diferencas.inserir] + [t for t, _ in diferencas.alterar]
+                linhas = {t: self.modelo.linhas[t] + (hora,) for t in alterados}
+                remover = diferencas.remover
+                ordem = diferencas.ordem
+                reordenar = bool(diferencas.inserir)
+
+        series = None
+        if pedido.grafico:
+            with metricas.cronometro('instantaneo_segundos', etapa='grafico'):
+                quadros = {t: dados.get(t) for t in pedido.visiveis}
+                medias = None
+                if pedido.medias and quadros:
+                    painel = montar_painel(quadros, pedido.visiveis)
+                    medias = sma(painel['Close'], self.janela_media)
+                series = tuple(preparar_series(
+                    [(t, pedido.acoes.get(t, t), quadros.get(t)) for t in pedido.visiveis],
+                    pedido.largura, medias))
+
+        self.versao += 1
+        return Instantaneo(self.versao, linhas, tuple(remover),
+                           tuple(ordem) if ordem is not None else None,
+                           reordenar, series, time.perf_counter() - inicio)
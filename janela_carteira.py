@@ -0,0 +1,145 @@
+"""Janela da carteira: resultado por conta, maiores resultados do dia e setores
+
+A marcação a mercado acontece no núcleo, junto com os indicadores, a cada
+atualização; a janela só confere periodicamente se há um resumo novo e o
+desenha. A tabela de posições mostra só as de maior resultado do dia, para
+que carteiras com dezenas de milhares de posições não pesem no Tk.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+
+COLUNAS_CONTAS = ('Conta', 'Valor', 'Resultado', 'Dia', 'Dia %')
+COLUNAS_POSICOES = ('Conta', 'Ação', 'Quantidade', 'Preço', 'Resultado', 'Dia')
+
+
+def formatar_reais(valor):
+    if valor is None or not np.isfinite(valor):
+        return "N/A"
+    return f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def formatar_percentual(valor):
+    if valor is None or not np.isfinite(valor):
+        return "N/A"
+    seta = "▼" if valor < 0 else "▲"
+    return f"{seta} {valor * 100:+.2f}%"
+
+
+class JanelaCarteira:
+    """Toplevel com o resumo da carteira marcado a mercado"""
+
+    # Intervalo (ms) entre as verificações de um resumo novo no núcleo
+    INTERVALO_MS = 1000
+    # Posições mostradas na tabela dos maiores resultados do dia
+    MAIORES = 50
+    # Setores no gráfico (os menores são somados em "Outros")
+    MAX_SETORES = 12
+
+    def __init__(self, pai, nucleo):
+        self.pai = pai
+        self.nucleo = nucleo
+        self.resumo = None
+
+        self.janela = tk.Toplevel(pai)
+        self.janela.title("Carteira")
+        self.janela.geometry("1150x680")
+
+        self.total_var = tk.StringVar(value="Carteira sem marcação ainda")
+        ttk.Label(self.janela, textvariable=self.total_var, font=('Arial', 11, 'bold'),
+                  padding=8).pack(fill=tk.X)
+
+        corpo = ttk.Frame(self.janela, padding=(8, 0, 8, 8))
+        corpo.pack(fill=tk.BOTH, expand=True)
+        tabelas = ttk.Frame(corpo)
+        tabelas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        quadro_contas = ttk.LabelFrame(tabelas, text="Contas", padding=5)
+        quadro_contas.pack(fill=tk.X)
+        self.tree_contas = self._criar_tabela(quadro_contas, COLUNAS_CONTAS, altura=6)
+
+        quadro_posicoes = ttk.LabelFrame(tabelas, text="Maiores resultados do dia", padding=5)
+        quadro_posicoes.pack(fill=tk.BOTH, expand=True, pady=(8, 0))
+        self.tree_posicoes = self._criar_tabela(quadro_posicoes, COLUNAS_POSICOES, altura=14)
+
+        quadro_grafico = ttk.LabelFrame(corpo, text="Exposição por setor", padding=5)
+        quadro_grafico.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(8, 0))
+        self.fig = Figure(figsize=(5, 5), facecolor='#ecf0f1')
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, quadro_grafico)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        self.verificar()
+
+    def _criar_tabela(self, pai, colunas, altura):
+        tree = ttk.Treeview(pai, columns=colunas, show='headings', height=altura)
+        for coluna in colunas:
+            tree.heading(coluna, text=coluna)
+            tree.column(coluna, width=95, anchor='e' if coluna not in ('Conta', 'Ação') else 'w')
+        barra = ttk.Scrollbar(pai, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=barra.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+        return tree
+
+    def verificar(self):
+        """Redesenha quando o núcleo publicar um resumo novo"""
+        if not self.janela.winfo_exists():
+            return
+        resumo = self.nucleo.resumo_carteira
+        if resumo is not None and resumo is not self.resumo:
+            self.resumo = resumo
+            self.mostrar(resumo)
+        self.janela.after(self.INTERVALO_MS, self.verificar)
+
+    def mostrar(self, resumo):
+        total = resumo.total
+        aviso = f" - {resumo.sem_cotacao} posições sem cotação" if resumo.sem_cotacao else ""
+        self.total_var.set(
+            f"{len(resumo.carteira)} posições | Valor {formatar_reais(total['valor'])} | "
+            f"Resultado {formatar_reais(total['resultado'])} | "
+            f"Dia {formatar_reais(total['resultado_dia'])} "
+            f"({formatar_percentual(total['retorno_dia'])}){aviso}")
+
+        self.tree_contas.delete(*self.tree_contas.get_children())
+        for i, conta in enumerate(resumo.contas):
+            self.tree_contas.insert('', tk.END, values=(
+                conta, formatar_reais(resumo.valor[i]), formatar_reais(resumo.resultado[i]),
+                formatar_reais(resumo.resultado_dia[i]),
+                formatar_percentual(resumo.retorno_dia[i])))
+
+        carteira, posicoes = resumo.carteira, resumo.posicoes
+        self.tree_posicoes.delete(*self.tree_posicoes.get_children())
+        for i in resumo.maiores_do_dia(self.MAIORES):
+            self.tree_posicoes.insert('', tk.END, values=(
+                carteira.contas[carteira.conta[i]], carteira.tickers[carteira.ticker[i]],
+                f"{carteira.quantidade[i]:g}", formatar_reais(posicoes['preco'][i]),
+                formatar_reais(posicoes['resultado'][i]),
+                formatar_reais(posicoes['resultado_dia'][i])))
+
+        self.desenhar_setores(resumo)
+
+    def desenhar_setores(self, resumo):
+        """Barras horizontais com a fatia de cada setor no valor da carteira"""
+        exposicao = resumo.exposicao.sum(axis=0)
+        ordem = np.argsort(-np.abs(exposicao))
+        nomes = [resumo.setores[i] for i in ordem[:self.MAX_SETORES]]
+        valores = list(exposicao[ordem[:self.MAX_SETORES]])
+        if len(ordem) > self.MAX_SETORES:
+            nomes.append("Outros")
+            valores.append(exposicao[ordem[self.MAX_SETORES:]].sum())
+        total = np.abs(exposicao).sum() or 1.0
+        fatias = np.array(valores) / total * 100
+
+        self.ax.clear()
+        posicoes = np.arange(len(nomes))[::-1]
+        cores = ['#27ae60' if fatia >= 0 else '#c0392b' for fatia in fatias]
+        self.ax.barh(posicoes, fatias, color=cores)
+        self.ax.set_yticks(posicoes, nomes, fontsize=9)
+        self.ax.set_xlabel("% do valor da carteira")
+        self.ax.grid(True, axis='x', alpha=0.3)
+        self.fig.tight_layout()
+        self.canvas.draw_idle()
@@ -0,0 +1,208 @@
+"""Janela do histórico longo: download em segundo plano e gráfico com zoom
+
+O gráfico usa a barra de navegação do matplotlib (arrastar e ampliar). A cada
+mudança do eixo x, a janela visível é recortada do nível de detalhe adequado
+(barras originais, 1h ou 1d), de modo que o número de pontos desenhados
+acompanha a largura em pixels e não o tamanho do período.
+"""
+import os
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+
+from historico import LIMITES_YAHOO, PASTA_HISTORICO, ArquivoHistorico, Backfill, NiveisDetalhe
+
+# Época do matplotlib em segundos Unix, para converter horários sem date2num
+EPOCA_MATPLOTLIB = int(np.datetime64(mdates.get_epoch(), 's').astype(np.int64))
+
+
+def segundos_para_num(ts):
+    return (np.asarray(ts, dtype=float) - EPOCA_MATPLOTLIB) / 86400
+
+
+def num_para_segundos(x):
+    return x * 86400 + EPOCA_MATPLOTLIB
+
+
+class JanelaHistorico:
+    """Toplevel com o histórico longo de uma ação"""
+
+    # Espera (ms) após o último movimento do zoom antes de recortar de novo
+    ESPERA_ZOOM_MS = 120
+
+    # Data inicial padrão do download, por intervalo
+    DESDE_PADRAO = {'1d': '2010-01-01', '1h': '2023-01-01'}
+
+    def __init__(self, pai, nucleo, acoes, ticker=None):
+        self.pai = pai
+        self.nucleo = nucleo
+        self.arquivo = ArquivoHistorico(os.path.join(PASTA_HISTORICO, nucleo.fonte.nome))
+        self.backfill = Backfill(nucleo.fonte, self.arquivo, politica=nucleo.politica,
+                                 disjuntor=nucleo.disjuntor(), metricas=nucleo.metricas)
+        self.niveis = None
+        self.aviso = ""
+        self.agendamento_zoom = None
+        self.cancelar_evento = threading.Event()
+
+        self.janela = tk.Toplevel(pai)
+        self.janela.title("Histórico")
+        self.janela.geometry("1100x650")
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+
+        controles = ttk.Frame(self.janela, padding=8)
+        controles.pack(fill=tk.X)
+        ttk.Label(controles, text="Ação:").pack(side=tk.LEFT)
+        self.ticker_var = tk.StringVar(value=ticker or next(iter(acoes), ''))
+        combo = ttk.Combobox(controles, textvariable=self.ticker_var, values=list(acoes), width=14)
+        combo.pack(side=tk.LEFT, padx=(5, 15))
+        combo.bind('<<ComboboxSelected>>', lambda e: self.carregar())
+
+        ttk.Label(controles, text="Intervalo:").pack(side=tk.LEFT)
+        self.intervalo_var = tk.StringVar(value='1d')
+        combo = ttk.Combobox(controles, textvariable=self.intervalo_var, width=6,
+                             values=list(LIMITES_YAHOO), state="readonly")
+        combo.pack(side=tk.LEFT, padx=(5, 15))
+        combo.bind('<<ComboboxSelected>>', lambda e: self.trocar_intervalo())
+
+        ttk.Label(controles, text="Desde:").pack(side=tk.LEFT)
+        self.desde_var = tk.StringVar(value=self.DESDE_PADRAO['1d'])
+        ttk.Entry(controles, textvariable=self.desde_var, width=12).pack(side=tk.LEFT, padx=5)
+        self.btn_baixar = ttk.Button(controles, text="BAIXAR", command=self.baixar)
+        self.btn_baixar.pack(side=tk.LEFT, padx=5)
+
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(controles, textvariable=self.status_var).pack(side=tk.LEFT, padx=15)
+
+        self.fig = Figure(figsize=(11, 5.5), facecolor='#ecf0f1')
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_facecolor('#ffffff')
+        self.ax.grid(True, alpha=0.3)
+        self.linha, = self.ax.plot([], [], color='#2980b9', linewidth=1.2)
+        self.faixa = None
+
+        self.canvas = FigureCanvasTkAgg(self.fig, self.janela)
+        NavigationToolbar2Tk(self.canvas, self.janela).update()
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.agendar_recorte())
+
+        self.carregar()
+
+    def fechar(self):
+        self.cancelar_evento.set()
+        self.janela.destroy()
+
+    def trocar_intervalo(self):
+        intervalo = self.intervalo_var.get()
+        desde = self.DESDE_PADRAO.get(intervalo)
+        if desde is None:
+            # Intradiário: só o que a fonte ainda guarda
+            dias = LIMITES_YAHOO[intervalo][0]
+            desde = f"{pd.Timestamp.now() - pd.Timedelta(days=dias - 1):%Y-%m-%d}"
+        self.desde_var.set(desde)
+        self.carregar()
+
+    def carregar(self):
+        """Lê do disco o histórico já baixado (em segundo plano) e desenha"""
+        ticker, intervalo = self.ticker_var.get().strip().upper(), self.intervalo_var.get()
+        self.status_var.set(f"Carregando {ticker} {intervalo}...")
+
+        def thread_leitura():
+            barras = self.arquivo.ler(ticker, intervalo)
+            niveis = None
+            if barras is not None and len(barras['ts']):
+                niveis = NiveisDetalhe(barras, intervalo)
+            self.pai.after(0, lambda: self.mostrar(ticker, intervalo, niveis))
+
+        threading.Thread(target=thread_leitura, daemon=True).start()
+
+    def mostrar(self, ticker, intervalo, niveis):
+        if not self.janela.winfo_exists():
+            return
+        self.niveis = niveis
+        if niveis is None:
+            self.status_var.set(f"Sem histórico de {ticker} {intervalo} - use BAIXAR")
+            self.linha.set_data([], [])
+            self.canvas.draw_idle()
+            return
+
+        fuso = niveis.fuso or 'UTC'
+        localizador = mdates.AutoDateLocator(tz=fuso)
+        self.ax.xaxis.set_major_locator(localizador)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(localizador, tz=fuso))
+        self.ax.set_title(f"{ticker} - {intervalo}", fontsize=12, fontweight='bold')
+        inicio, fim = niveis.extensao()
+        # Limpa o histórico de zoom da barra de navegação: o eixo mudou de dados
+        self.canvas.toolbar.update()
+        self.ax.set_xlim(segundos_para_num(inicio), segundos_para_num(fim))
+        self.recortar()
+        self.canvas.toolbar.push_current()
+
+    def agendar_recorte(self):
+        if self.agendamento_zoom is None:
+            self.agendamento_zoom = self.pai.after(self.ESPERA_ZOOM_MS, self.recortar)
+
+    def recortar(self):
+        """Redesenha a parte visível no nível de detalhe que cabe na largura"""
+        self.agendamento_zoom = None
+        if self.niveis is None or not self.janela.winfo_exists():
+            return
+        x0, x1 = self.ax.get_xlim()
+        pixels = self.ax.get_window_extent().width
+        nivel, ts, fechamento, maxima, minima = self.niveis.janela(
+            num_para_segundos(x0), num_para_segundos(x1), pixels)
+
+        x = segundos_para_num(ts)
+        self.linha.set_data(x, fechamento)
+        if self.faixa is not None:
+            self.faixa.remove()
+        self.faixa = self.ax.fill_between(x, minima, maxima, color='#2980b9', alpha=0.15,
+                                          linewidth=0)
+        if len(ts):
+            baixo, alto = np.nanmin(minima), np.nanmax(maxima)
+            margem = (alto - baixo) * 0.05 or abs(alto) * 0.01 or 1
+            self.ax.set_ylim(baixo - margem, alto + margem)
+        self.status_var.set(f"{len(ts)} barras de {nivel} na tela{self.aviso}")
+        self.canvas.draw_idle()
+
+    def baixar(self):
+        """Baixa em segundo plano os pedaços que faltam e recarrega o gráfico"""
+        ticker, intervalo = self.ticker_var.get().strip().upper(), self.intervalo_var.get()
+        try:
+            desde = pd.Timestamp(self.desde_var.get())
+        except ValueError:
+            self.status_var.set("Data inicial inválida (use AAAA-MM-DD)")
+            return
+        self.btn_baixar.config(state='disabled')
+        self.cancelar_evento.clear()
+
+        def ao_progresso(feitos, total, pedaco, erro):
+            self.pai.after(0, lambda: self.status_var.set(
+                f"Baixando {ticker}: {feitos}/{total} pedaços"))
+
+        def thread_backfill():
+            try:
+                resumo = self.backfill.executar([ticker], intervalo, desde,
+                                                ao_progresso=ao_progresso,
+                                                cancelado=self.cancelar_evento.is_set)
+            except Exception as e:
+                print(f"Erro no download do histórico: {e}")
+                resumo = None
+            self.pai.after(0, lambda: self.finalizar_download(resumo))
+
+        threading.Thread(target=thread_backfill, daemon=True).start()
+
+    def finalizar_download(self, resumo):
+        if not self.janela.winfo_exists():
+            return
+        self.btn_baixar.config(state='normal')
+        self.aviso = ""
+        if resumo is None or resumo['falhas']:
+            falhas = resumo['falhas'] if resumo is not None else 'alguns'
+            self.aviso = f" ({falhas} pedaços falharam - BAIXAR de novo retoma)"
+        self.carregar()
@@ -0,0 +1,157 @@
+"""Janela de triagem: ranking filtrado e mapa de calor das correlações
+
+O cálculo fica no núcleo (ver triagem.py); a janela confere periodicamente
+se há uma versão nova e a desenha. O mapa de calor é uma única imagem
+(`imshow`) cujos dados são trocados a cada versão, sem rótulos por ação
+acima de algumas dezenas delas, o que o mantém rápido com 500+ ações; as
+ações são ordenadas para aproximar as correlacionadas.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+
+from triagem import CAMPOS, CAMPOS_TRIAGEM
+
+COLUNAS = ('Ação',) + CAMPOS_TRIAGEM + ('rsi',)
+TITULOS = {'momento': 'Momento', 'volatilidade_janela': 'Volatilidade',
+           'anomalia_volume': 'Volume (z)', 'correlacao_media': 'Correl. média', 'rsi': 'RSI'}
+
+
+class JanelaTriagem:
+    """Toplevel com o ranking das ações e o mapa de calor das correlações"""
+
+    # Intervalo (ms) entre as verificações de uma versão nova no núcleo
+    INTERVALO_MS = 1000
+    # Linhas no ranking
+    LIMITE = 100
+    # Acima de tantas ações o mapa de calor fica sem rótulos nos eixos
+    MAX_ROTULOS = 40
+
+    def __init__(self, pai, nucleo):
+        self.pai = pai
+        self.nucleo = nucleo
+        self.resultado = None
+        self.imagem = None
+        self.rotulos = None
+
+        self.janela = tk.Toplevel(pai)
+        self.janela.title("Triagem e correlação")
+        self.janela.geometry("1250x700")
+
+        barra = ttk.Frame(self.janela, padding=8)
+        barra.pack(fill=tk.X)
+        ttk.Label(barra, text="Filtro:").pack(side=tk.LEFT)
+        self.consulta_var = tk.StringVar()
+        consulta = ttk.Entry(barra, textvariable=self.consulta_var, width=50)
+        consulta.pack(side=tk.LEFT, padx=5)
+        consulta.bind('<Return>', lambda evento: self.mostrar_ranking())
+        ttk.Label(barra, text="Ordenar por:").pack(side=tk.LEFT, padx=(10, 0))
+        self.ordem_var = tk.StringVar(value='momento')
+        ordem = ttk.Combobox(barra, textvariable=self.ordem_var, values=list(CAMPOS),
+                             state='readonly', width=20)
+        ordem.pack(side=tk.LEFT, padx=5)
+        ordem.bind('<<ComboboxSelected>>', lambda evento: self.mostrar_ranking())
+        self.crescente_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(barra, text="Crescente", variable=self.crescente_var,
+                        command=self.mostrar_ranking).pack(side=tk.LEFT, padx=5)
+        self.status_var = tk.StringVar(value="Aguardando a primeira atualização")
+        ttk.Label(barra, textvariable=self.status_var).pack(side=tk.RIGHT)
+
+        corpo = ttk.Frame(self.janela, padding=(8, 0, 8, 8))
+        corpo.pack(fill=tk.BOTH, expand=True)
+        quadro_tabela = ttk.Frame(corpo)
+        quadro_tabela.pack(side=tk.LEFT, fill=tk.BOTH)
+        self.tree = ttk.Treeview(quadro_tabela, columns=COLUNAS, show='headings', height=25)
+        for coluna in COLUNAS:
+            self.tree.heading(coluna, text=TITULOS.get(coluna, coluna))
+            self.tree.column(coluna, width=95, anchor='w' if coluna == 'Ação' else 'e')
+        rolagem = ttk.Scrollbar(quadro_tabela, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=rolagem.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        rolagem.pack(side=tk.RIGHT, fill=tk.Y)
+
+        quadro_grafico = ttk.Frame(corpo)
+        quadro_grafico.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(8, 0))
+        self.fig = Figure(figsize=(6, 6), facecolor='#ecf0f1')
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, quadro_grafico)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.canvas.mpl_connect('motion_notify_event', self.ao_mover)
+
+        self.verificar()
+
+    def verificar(self):
+        """Redesenha quando o núcleo publicar uma versão nova da triagem"""
+        if not self.janela.winfo_exists():
+            return
+        resultado = self.nucleo.triagem.resultado()
+        if resultado.tickers and (self.resultado is None
+                                  or resultado.versao != self.resultado.versao):
+            self.resultado = resultado
+            self.mostrar_ranking()
+            self.desenhar_mapa()
+        self.janela.after(self.INTERVALO_MS, self.verificar)
+
+    def mostrar_ranking(self):
+        resultado = self.resultado
+        if resultado is None:
+            return
+        try:
+            indices = resultado.ranking(self.ordem_var.get(), self.LIMITE,
+                                        crescente=self.crescente_var.get(),
+                                        consulta=self.consulta_var.get())
+        except ValueError as e:
+            self.status_var.set(str(e))
+            return
+        self.tree.delete(*self.tree.get_children())
+        for linha in resultado.linhas(indices):
+            self.tree.insert('', tk.END, values=(linha['ticker'],) + tuple(
+                "N/A" if np.isnan(linha[campo]) else f"{linha[campo]:.4f}"
+                for campo in COLUNAS[1:]))
+        self.status_var.set(f"{len(indices)} de {len(resultado.tickers)} ações "
+                            f"(versão {resultado.versao})")
+
+    def desenhar_mapa(self):
+        """Mapa de calor da correlação, reaproveitando a imagem se o tamanho não mudou"""
+        resultado = self.resultado
+        ordem = resultado.ordem_agrupada()
+        matriz = resultado.correlacao[np.ix_(ordem, ordem)]
+        self.ordem = ordem
+        nomes = [resultado.tickers[i].split('.')[0] for i in ordem]
+        if self.imagem is not None and self.imagem.get_array().shape == matriz.shape:
+            self.imagem.set_data(matriz)
+        else:
+            self.fig.clear()
+            self.ax = self.fig.add_subplot(111)
+            self.imagem = self.ax.imshow(matriz, cmap='RdBu_r', vmin=-1, vmax=1,
+                                         interpolation='nearest', aspect='auto')
+            self.fig.colorbar(self.imagem, ax=self.ax, fraction=0.046, pad=0.04)
+            self.ax.set_title(f"Correlação dos retornos ({len(nomes)} ações)")
+            self.rotulos = None
+        # A ordem (ou a lista) pode mudar sem mudar o tamanho da matriz
+        if nomes != self.rotulos:
+            self.rotulos = nomes
+            if len(nomes) <= self.MAX_ROTULOS:
+                self.ax.set_xticks(range(len(nomes)), nomes, rotation=90, fontsize=7)
+                self.ax.set_yticks(range(len(nomes)), nomes, fontsize=7)
+            else:
+                self.ax.set_xticks([])
+                self.ax.set_yticks([])
+            self.fig.tight_layout()
+        self.canvas.draw_idle()
+
+    def ao_mover(self, evento):
+        """Mostra o par e a correlação sob o cursor"""
+        if evento.inaxes is not self.ax or self.resultado is None or evento.xdata is None:
+            return
+        i, j = int(round(evento.ydata)), int(round(evento.xdata))
+        if not (0 <= i < len(self.ordem) and 0 <= j < len(self.ordem)):
+            return
+        a, b = self.ordem[i], self.ordem[j]
+        valor = self.resultado.correlacao[a, b]
+        texto = "N/A" if np.isnan(valor) else f"{valor:+.3f}"
+        self.status_var.set(f"{self.resultado.tickers[a]} x {self.resultado.tickers[b]}: "
+                            f"{texto} ({self.resultado.observacoes[a, b]} barras em comum)")
@@ -0,0 +1,185 @@
+"""Listas de ações (watchlists) lidas de arquivos CSV, JSON ou TOML
+
+Cada lista tem grupos (IBOV, FIIs, BDRs...) e um índice para busca rápida
+por código ou nome. Formatos aceitos:
+
+CSV, com cabeçalho `ticker,nome,grupo` (vários grupos separados por `;`):
+
+    ticker,nome,grupo
+    PETR4,Petrobras,IBOV;Petróleo
+
+JSON, com grupos como listas de códigos ou objetos código -> nome:
+
+    {"nome": "B3", "grupos": {"IBOV": {"PETR4": "Petrobras"}, "FIIs": ["HGLG11"]}}
+
+TOML, no mesmo formato do JSON:
+
+    nome = "B3"
+    [grupos.IBOV]
+    PETR4 = "Petrobras"
+
+Códigos sem sufixo recebem `.SA` (padrão do Yahoo para a B3).
+"""
+import bisect
+import csv
+import json
+import os
+import unicodedata
+
+SUFIXO_PADRAO = '.SA'
+EXTENSOES = ('.csv', '.json', '.toml')
+
+# Ações brasileiras mais negociadas (sem emojis nos códigos)
+ACOES_PADRAO = {
+    'PETR4.SA': 'Petrobras',
+    'VALE3.SA': 'Vale',
+    'ITUB4.SA': 'Itaú Unibanco',
+    'BBDC4.SA': 'Bradesco',
+    'B3SA3.SA': 'B3',
+    'WEGE3.SA': 'Weg',
+    'ABEV3.SA': 'Ambev',
+    'BBAS3.SA': 'Banco do Brasil',
+    'PETR3.SA': 'Petrobras PN'
+}
+
+
+def normalizar_ticker(ticker, sufixo=SUFIXO_PADRAO):
+    ticker = ticker.strip().upper()
+    if ticker and sufixo and '.' not in ticker and not ticker.startswith('^'):
+        ticker += sufixo
+    return ticker
+
+
+def _sem_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+class ListaAcoes:
+    """Lista de ações com grupos e índice de busca"""
+
+    def __init__(self, nome, ativos=None, grupos=None):
+        self.nome = nome
+        self.ativos = dict(ativos or {})
+        self.grupos = {grupo: list(tickers) for grupo, tickers in (grupos or {}).items()}
+        self._indexar()
+
+    def _indexar(self):
+        # Códigos sem sufixo, ordenados, para busca por prefixo com bisect
+        self._codigos = sorted((ticker.split('.')[0], ticker) for ticker in self.ativos)
+        self._nomes = [(_sem_acentos(nome), ticker) for ticker, nome in self.ativos.items()]
+
+    def __len__(self):
+        return len(self.ativos)
+
+    def __contains__(self, ticker):
+        return ticker in self.ativos
+
+    def acoes(self, grupo=None):
+        """Dicionário ticker -> nome de um grupo (ou da lista toda)"""
+        if grupo is None:
+            return dict(self.ativos)
+        return {ticker: self.ativos[ticker] for ticker in self.grupos.get(grupo, ())}
+
+    def buscar(self, texto, limite=50):
+        """Ações cujo código começa com `texto` ou cujo nome o contém"""
+        texto = texto.strip()
+        if not texto:
+            return {}
+        prefixo = texto.upper().split('.')[0]
+        encontrados = []
+        posicao = bisect.bisect_left(self._codigos, (prefixo, ''))
+        while (posicao < len(self._codigos) and len(encontrados) < limite
+               and self._codigos[posicao][0].startswith(prefixo)):
+            encontrados.append(self._codigos[posicao][1])
+            posicao += 1
+
+        if len(encontrados) < limite:
+            procurado = _sem_acentos(texto)
+            vistos = set(encontrados)
+            for nome, ticker in self._nomes:
+                if procurado in nome and ticker not in vistos:
+                    encontrados.append(ticker)
+                    if len(encontrados) >= limite:
+                        break
+        return {ticker: self.ativos[ticker] for ticker in encontrados}
+
+
+def _adicionar(ativos, grupos, grupo, ticker, nome, sufixo):
+    ticker = normalizar_ticker(ticker, sufixo)
+    if not ticker:
+        return
+    if nome or ticker not in ativos:
+        ativos[ticker] = nome or ativos.get(ticker) or ticker.split('.')[0]
+    if grupo:
+        membros = grupos.setdefault(grupo, [])
+        if ticker not in membros:
+            membros.append(ticker)
+
+
+def _de_grupos(nome, dados, sufixo):
+    """Monta a lista a partir do formato {'nome': ..., 'grupos': {...}} (JSON/TOML)"""
+    ativos, grupos = {}, {}
+    for grupo, membros in dados.get('grupos', {}).items():
+        if isinstance(membros, dict):
+            # TOML pode trazer a lista em `ativos`: [grupos.X] ativos = [...]
+            itens = membros.get('ativos', membros)
+        else:
+            itens = membros
+        if isinstance(itens, dict):
+            itens = itens.items()
+        else:
+            itens = [(item, None) if isinstance(item, str)
+                     else (item.get('ticker', ''), item.get('nome')) for item in itens]
+        for ticker, nome_ativo in itens:
+            _adicionar(ativos, grupos, grupo, ticker, nome_ativo, sufixo)
+    return ListaAcoes(dados.get('nome', nome), ativos, grupos)
+
+
+def carregar_lista(caminho, sufixo=SUFIXO_PADRAO):
+    """Lê uma lista de ações de um arquivo CSV, JSON ou TOML"""
+    nome, extensao = os.path.splitext(os.path.basename(caminho))
+    extensao = extensao.lower()
+
+    if extensao == '.csv':
+        ativos, grupos = {}, {}
+        with open(caminho, newline='', encoding='utf-8-sig') as f:
+            for linha in csv.DictReader(f):
+                linha = {(chave or '').strip().lower(): (valor or '').strip()
+                         for chave, valor in linha.items()}
+                ticker = linha.get('ticker') or linha.get('codigo') or linha.get('código', '')
+                nomes_grupos = [g.strip() for g in linha.get('grupo', '').split(';') if g.strip()]
+                for grupo in nomes_grupos or [None]:
+                    _adicionar(ativos, grupos, grupo, ticker, linha.get('nome'), sufixo)
+        return ListaAcoes(nome, ativos, grupos)
+
+    if extensao == '.json':
+        with open(caminho, encoding='utf-8') as f:
+            return _de_grupos(nome, json.load(f), sufixo)
+
+    if extensao == '.toml':
+        import tomllib
+        with open(caminho, 'rb') as f:
+            return _de_grupos(nome, tomllib.load(f), sufixo)
+
+    raise ValueError(f"Formato de lista não suportado: {caminho}")
+
+
+def carregar_listas(caminhos, sufixo=SUFIXO_PADRAO):
+    """Lê vários arquivos (ou pastas com arquivos) e devolve nome -> ListaAcoes"""
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos.extend(os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))
+                            if nome.lower().endswith(EXTENSOES))
+        else:
+            arquivos.append(caminho)
+
+    listas = {}
+    for arquivo in arquivos:
+        try:
+            lista = carregar_lista(arquivo, sufixo)
+            listas[lista.nome] = lista
+        except Exception as e:
+            print(f"Erro ao carregar a lista {arquivo}: {e}")
+    return listas
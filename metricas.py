@@ -0,0 +1,169 @@
+"""Métricas das atualizações: contadores, tempos por etapa e exportação
+
+`Metricas` guarda contadores e tempos (com rótulos, no estilo do Prometheus)
+de forma segura entre threads. Os mesmos números alimentam o painel de
+diagnóstico da janela, o log JSON (`RegistroJson`) e o texto no formato de
+exposição do Prometheus (`texto_prometheus`).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+PREFIXO = 'cotacoes_'
+QUANTIS = (0.5, 0.9, 0.99)
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def _rotulos_texto(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for k, v in pares)
+    return '{' + texto + '}'
+
+
+class Metricas:
+    """Contadores, medidores e tempos das etapas de atualização
+
+    Os tempos guardam contagem e soma totais e as últimas `amostras`
+    observações, usadas para os quantis.
+    """
+
+    def __init__(self, amostras=512):
+        self.amostras = amostras
+        self.contadores = {}
+        self.medidores = {}
+        self.tempos = {}
+        self.trava = threading.Lock()
+        self.inicio = time.time()
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self.trava:
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def definir(self, nome, valor, **rotulos):
+        with self.trava:
+            self.medidores[_chave(nome, rotulos)] = float(valor)
+
+    def observar(self, nome, segundos, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self.trava:
+            tempo = self.tempos.get(chave)
+            if tempo is None:
+                tempo = self.tempos[chave] = [0, 0.0, deque(maxlen=self.amostras)]
+            tempo[0] += 1
+            tempo[1] += segundos
+            tempo[2].append(segundos)
+
+    @contextmanager
+    def cronometro(self, nome, **rotulos):
+        """Mede o tempo do bloco `with` e registra em `nome`"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def contador(self, nome, **rotulos):
+        with self.trava:
+            if rotulos:
+                return self.contadores.get(_chave(nome, rotulos), 0)
+            return sum(v for (n, _), v in self.contadores.items() if n == nome)
+
+    def instantaneo(self):
+        """Cópia dos valores atuais (para o painel e o log JSON)"""
+        with self.trava:
+            contadores = dict(self.contadores)
+            medidores = dict(self.medidores)
+            tempos = {chave: (t[0], t[1], np.array(t[2])) for chave, t in self.tempos.items()}
+
+        def nome_completo(chave):
+            nome, rotulos = chave
+            return nome + _rotulos_texto(rotulos)
+
+        resumo_tempos = {}
+        for chave, (contagem, soma, recentes) in tempos.items():
+            item = {'contagem': contagem, 'soma': soma,
+                    'media': soma / contagem if contagem else 0.0}
+            if len(recentes):
+                for q in QUANTIS:
+                    item[f'p{int(q * 100)}'] = float(np.quantile(recentes, q))
+                item['max'] = float(recentes.max())
+            resumo_tempos[nome_completo(chave)] = item
+        return {
+            'contadores': {nome_completo(c): v for c, v in contadores.items()},
+            'medidores': {nome_completo(c): v for c, v in medidores.items()},
+            'tempos': resumo_tempos,
+        }
+
+    def texto_prometheus(self):
+        """Métricas no formato de exposição em texto do Prometheus"""
+        with self.trava:
+            contadores = sorted(self.contadores.items())
+            medidores = sorted(self.medidores.items())
+            tempos = sorted((chave, (t[0], t[1], np.array(t[2])))
+                            for chave, t in self.tempos.items())
+
+        linhas = []
+        vistos = set()
+
+        def cabecalho(nome, tipo):
+            if nome not in vistos:
+                vistos.add(nome)
+                linhas.append(f'# TYPE {nome} {tipo}')
+
+        for (nome, rotulos), valor in contadores:
+            cabecalho(PREFIXO + nome, 'counter')
+            linhas.append(f'{PREFIXO}{nome}{_rotulos_texto(rotulos)} {valor}')
+        for (nome, rotulos), valor in medidores:
+            cabecalho(PREFIXO + nome, 'gauge')
+            linhas.append(f'{PREFIXO}{nome}{_rotulos_texto(rotulos)} {valor:.6g}')
+        for (nome, rotulos), (contagem, soma, recentes) in tempos:
+            completo = PREFIXO + nome
+            cabecalho(completo, 'summary')
+            if len(recentes):
+                for q in QUANTIS:
+                    linhas.append(f'{completo}{_rotulos_texto(rotulos, [("quantile", q)])} '
+                                  f'{np.quantile(recentes, q):.6g}')
+            linhas.append(f'{completo}_sum{_rotulos_texto(rotulos)} {soma:.6g}')
+            linhas.append(f'{completo}_count{_rotulos_texto(rotulos)} {contagem}')
+        linhas.append(f'# TYPE {PREFIXO}inicio_segundos gauge')
+        linhas.append(f'{PREFIXO}inicio_segundos {self.inicio:.0f}')
+        return '\n'.join(linhas) + '\n'
+
+    def gravar_prometheus(self, caminho):
+        """Grava o texto do Prometheus de forma atômica (coletor por arquivo)"""
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(self.texto_prometheus())
+        os.replace(temporario, caminho)
+
+
+class RegistroJson:
+    """Log estruturado: um objeto JSON por linha, anexado ao arquivo"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.trava = threading.Lock()
+
+    def registrar(self, evento, **campos):
+        linha = {'horario': datetime.now().isoformat(timespec='milliseconds'),
+                 'evento': evento, **campos}
+        texto = json.dumps(linha, ensure_ascii=False, default=str)
+        with self.trava:
+            try:
+                with open(self.caminho, 'a', encoding='utf-8') as f:
+                    f.write(texto + '\n')
+            except OSError as e:
+                print(f"Erro ao gravar log JSON: {e}")
@@ -0,0 +1,188 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class LimitadorTaxa:
+    """Limita o número de requisições por segundo (balde de fichas)"""
+
+    def __init__(self, requisicoes_por_segundo, rajada=None):
+        self.taxa = float(requisicoes_por_segundo)
+        self.capacidade = float(rajada if rajada is not None else max(1.0, self.taxa))
+        self.fichas = self.capacidade
+        self.ultimo = time.monotonic()
+        self.trava = threading.Lock()
+
+    def aguardar(self):
+        """Bloqueia até que uma requisição possa ser feita"""
+        if self.taxa <= 0:
+            return
+        while True:
+            with self.trava:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                espera = (1 - self.fichas) / self.taxa
+            time.sleep(espera)
+
+
+class ResultadoBusca:
+    """Resultado da busca de um único ticker"""
+
+    __slots__ = ('ticker', 'dados', 'erro', 'duracao')
+
+    def __init__(self, ticker, dados=None, erro=None, duracao=0.0):
+        self.ticker = ticker
+        self.dados = dados
+        self.erro = erro
+        self.duracao = duracao
+
+    @property
+    def ok(self):
+        return self.erro is None and self.dados is not None
+
+    def __repr__(self):
+        estado = 'ok' if self.ok else f'erro={self.erro!r}'
+        return f"ResultadoBusca({self.ticker}, {estado}, {self.duracao:.2f}s)"
+
+
+class MotorBusca:
+    """Baixa e processa os dados de vários tickers em paralelo
+
+    `baixar(ticker)` devolve os dados brutos de um ticker e `baixar_lote(tickers)`
+    (opcional) devolve um dicionário ticker -> dados para vários de uma vez.
+    `processar(dados, ticker)` é aplicado na própria thread de trabalho.
+    Qualquer função com essa assinatura serve, inclusive uma fonte falsa local.
+    """
+
+    def __init__(self, baixar, processar=None, baixar_lote=None,
+                 max_concorrencia=8, requisicoes_por_segundo=4.0, tamanho_lote=50,
+                 metricas=None):
+        self.baixar = baixar
+        self.processar = processar
+        self.baixar_lote = baixar_lote
+        self.max_concorrencia = max(1, int(max_concorrencia))
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo, rajada=self.max_concorrencia)
+        self.metricas = metricas
+        # Duração do último download de cada ticker (para o painel, fora das métricas)
+        self.ultimas_buscas = {}
+        self.trava_ultimas = threading.Lock()
+
+    def _processar(self, dados, ticker):
+        if self.processar is None:
+            return dados
+        if self.metricas is None:
+            return self.processar(dados, ticker)
+        with self.metricas.cronometro('processamento_segundos'):
+            return self.processar(dados, ticker)
+
+    def _contar(self, resultado, erro=None):
+        """Registra o resultado de um ticker nas métricas"""
+        if self.metricas is None:
+            return
+        self.metricas.incrementar('buscas_total', resultado='ok' if resultado.ok else 'erro')
+        if not resultado.ok:
+            tipo = type(erro).__name__ if erro is not None else 'SemDados'
+            self.metricas.incrementar('erros_total', tipo=tipo)
+
+    def _buscar_um(self, ticker):
+        inicio = time.perf_counter()
+        try:
+            self.limitador.aguardar()
+            inicio_download = time.perf_counter()
+            brutos = self.baixar(ticker)
+            agora = time.perf_counter()
+            with self.trava_ultimas:
+                self.ultimas_buscas[ticker] = agora - inicio_download
+            if self.metricas is not None:
+                self.metricas.observar('espera_limite_segundos', inicio_download - inicio)
+                self.metricas.observar('busca_segundos', agora - inicio_download)
+                self.metricas.definir('busca_ultima_segundos', agora - inicio_download)
+            dados = self._processar(brutos, ticker)
+            erro = None if dados is not None else "sem dados"
+            resultado = ResultadoBusca(ticker, dados, erro, time.perf_counter() - inicio)
+            self._contar(resultado)
+            return resultado
+        except Exception as e:
+            resultado = ResultadoBusca(ticker, None, str(e), time.perf_counter() - inicio)
+            self._contar(resultado, e)
+            return resultado
+
+    def mais_lentas(self, limite=20):
+        """[(segundos, ticker)] dos últimos downloads mais lentos"""
+        with self.trava_ultimas:
+            ultimas = [(segundos, ticker) for ticker, segundos in self.ultimas_buscas.items()]
+        return sorted(ultimas, reverse=True)[:limite]
+
+    def _buscar_grupo(self, tickers):
+        inicio = time.perf_counter()
+        try:
+            self.limitador.aguardar()
+            brutos = self.baixar_lote(tickers) or {}
+        except Exception as e:
+            brutos = {}
+            print(f"Erro no download em lote: {e}")
+            if self.metricas is not None:
+                self.metricas.incrementar('erros_lote_total', tipo=type(e).__name__)
+        duracao = time.perf_counter() - inicio
+        if self.metricas is not None:
+            self.metricas.observar('busca_lote_segundos', duracao)
+
+        resultados = {}
+        for ticker in tickers:
+            dados = brutos.get(ticker)
+            if dados is None:
+                # Tickers que o lote não trouxe são buscados individualmente
+                resultados[ticker] = self._buscar_um(ticker)
+                continue
+            try:
+                dados = self._processar(dados, ticker)
+                erro = None if dados is not None else "sem dados"
+                resultados[ticker] = ResultadoBusca(ticker, dados, erro, duracao)
+                self._contar(resultados[ticker])
+            except Exception as e:
+                resultados[ticker] = ResultadoBusca(ticker, None, str(e), duracao)
+                self._contar(resultados[ticker], e)
+        return resultados
+
+    def buscar(self, tickers, lote=False, ao_concluir=None, cancelado=None):
+        """Busca todos os tickers e devolve um dicionário ticker -> ResultadoBusca
+
+        `ao_concluir(resultado)` é chamado a cada ticker concluído (na thread de
+        trabalho) e `cancelado()` interrompe o envio de novas tarefas.
+        """
+        tickers = list(tickers)
+        if lote and self.baixar_lote is not None:
+            tarefas = [tickers[i:i + self.tamanho_lote]
+                       for i in range(0, len(tickers), self.tamanho_lote)]
+            executar = self._buscar_grupo
+        else:
+            tarefas = tickers
+            executar = self._buscar_um
+
+        resultados = {}
+        with ThreadPoolExecutor(max_workers=self.max_concorrencia) as executor:
+            futuros = []
+            for tarefa in tarefas:
+                if cancelado is not None and cancelado():
+                    break
+                futuros.append(executor.submit(self._executar, executar, tarefa, cancelado))
+
+            for futuro in as_completed(futuros):
+                parciais = futuro.result()
+                if isinstance(parciais, ResultadoBusca):
+                    parciais = {parciais.ticker: parciais}
+                for ticker, resultado in parciais.items():
+                    resultados[ticker] = resultado
+                    if ao_concluir is not None:
+                        ao_concluir(resultado)
+        return resultados
+
+    def _executar(self, executar, tarefa, cancelado):
+        if cancelado is not None and cancelado():
+            return {}
+        return executar(tarefa)
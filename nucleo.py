@@ -0,0 +1,513 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from motor_busca import MotorBusca, ResultadoBusca
+from busca_processos import CoordenadorProcessos, desempacotar
+from cache_barras import CacheBarras
+from fonte_dados import FonteYahoo
+from indicadores import IndicadoresIncrementais
+from armazem_barras import ArmazemBarras, VistaQuadros
+from gravacao import GravadorSessao
+from alertas import EntregaRegistro, MotorAlertas, entrega_terminal
+from listas import ACOES_PADRAO
+from metricas import Metricas, RegistroJson
+from resiliencia import Disjuntor, ErroSemDados, PoliticaRetentativa
+from triagem import MotorTriagem
+
+
+def juntar_ganchos(ganchos):
+    """Um único `ao_adicionar` que chama todos os ganchos (None se não houver)"""
+    if len(ganchos) <= 1:
+        return ganchos[0] if ganchos else None
+
+    def ao_adicionar(*argumentos):
+        for gancho in ganchos:
+            gancho(*argumentos)
+    return ao_adicionar
+
+
+def limpar_barras(dados, minimo=2):
+    """Ordena e limpa as barras OHLCV (None se sobrarem menos de `minimo`)"""
+    if dados is None or dados.empty:
+        return None
+
+    # Verificar se temos as colunas básicas
+    if 'Close' not in dados.columns:
+        return None
+
+    # Garantir que o índice é datetime
+    if not isinstance(dados.index, pd.DatetimeIndex):
+        dados.index = pd.to_datetime(dados.index)
+
+    # Ordenar por data
+    dados = dados.sort_index()
+
+    # Preencher valores faltantes para Close
+    dados['Close'] = dados['Close'].ffill()
+
+    # Se faltar outras colunas, criar com base no Close
+    if 'Open' not in dados.columns:
+        dados['Open'] = dados['Close']
+    if 'High' not in dados.columns:
+        dados['High'] = dados['Close']
+    if 'Low' not in dados.columns:
+        dados['Low'] = dados['Close']
+
+    # Remover linhas com Close inválido
+    dados = dados[dados['Close'] > 0]
+
+    if len(dados) < minimo:
+        return None
+    return dados
+
+
+class NucleoCotacoes:
+    """Busca, processa e guarda as cotações, sem depender da interface gráfica
+
+    É usado tanto pela janela Tk (`analisador_acoes.py`) quanto pelo serviço
+    sem interface (`servico.py`).
+    """
+
+    # Limites do motor de busca paralela
+    MAX_CONCORRENCIA = 8
+    REQUISICOES_POR_SEGUNDO = 4.0
+    TAMANHO_LOTE = 50
+    # Processos de busca para universos grandes (0 = só as threads do motor)
+    PROCESSOS = 0
+
+    # Intervalos e períodos tentados em ordem, do mais detalhado ao mais amplo
+    INTERVALOS_TENTATIVA = [
+        ("15m", "1d"),
+        ("1h", "2d"),
+        ("1d", "5d")
+    ]
+
+    # Retentativas por chamada à fonte e disjuntor por host
+    MAX_TENTATIVAS = 3
+    ESPERA_BASE = 0.5
+    ESPERA_MAXIMA = 8.0
+    FALHAS_PARA_ABRIR = 5
+    TEMPO_DISJUNTOR_ABERTO = 60.0
+
+    # Cache local de barras
+    PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+    BARRAS_CARREGADAS = 200
+    RETENCAO_DIAS = 30
+    RETENCAO_MAX_MB = 200
+
+    # Armazém de barras em memória: barras por ticker, limite de tickers e
+    # quantas barras os quadros de `dados_acoes` mostram
+    CAPACIDADE_BARRAS = 256
+    MAX_TICKERS = 4096
+    JANELA_EXIBICAO = 50
+
+    def __init__(self, fonte=None, acoes=None, pasta_cache=None, log_json=None, processos=None,
+                 gravar=None):
+        self.metricas = Metricas()
+        self.registro = RegistroJson(log_json) if log_json else None
+        self.fonte = fonte if fonte is not None else FonteYahoo()
+        self.acoes = dict(acoes if acoes is not None else ACOES_PADRAO)
+
+        self.barras = ArmazemBarras(self.CAPACIDADE_BARRAS,
+                                    max_tickers=max(self.MAX_TICKERS, len(self.acoes)))
+        # Só as ações monitoradas entram nos indicadores, alertas, triagem e gravação
+        self.dados_acoes = VistaQuadros(self.barras, janela=self.JANELA_EXIBICAO,
+                                        tickers=self.acoes)
+        # Escritas no armazém e atualização dos indicadores (e do que depende
+        # deles) vêm de threads diferentes: busca, troca de lista e carteira
+        self.trava_estado = threading.RLock()
+        self.ultima_atualizacao = None
+        self.falhas_ultima_atualizacao = 0
+        self.indicadores = IndicadoresIncrementais()
+        self.valores_indicadores = {}
+        # Regras de alerta (definidas depois, com `alertas.definir_regras`)
+        self.alertas = MotorAlertas(entregas=[entrega_terminal], metricas=self.metricas)
+        if self.registro is not None:
+            self.alertas.adicionar_entrega(EntregaRegistro(self.registro))
+        # Correlação, rankings e filtros entre as ações (ver triagem.py)
+        self.triagem = MotorTriagem(metricas=self.metricas)
+        # Carteira (definida com `definir_carteira`) e o resumo da última marcação
+        self.carteira = None
+        self.resumo_carteira = None
+        # Gravação da sessão (pasta em `gravar`), reproduzível com FonteGravacao
+        self.gravador = None
+        if gravar:
+            self.gravador = GravadorSessao(
+                gravar, prefixo=self.fonte.nome, metricas=self.metricas,
+                intervalo_de=lambda ticker: self.intervalo_preferido.get(ticker, ''))
+
+        if self.fonte.persistente:
+            caminho_cache = os.path.join(pasta_cache or self.PASTA_CACHE,
+                                         f'barras_{self.fonte.nome}.sqlite')
+        else:
+            caminho_cache = ':memory:'
+        self.cache = CacheBarras(caminho_cache,
+                                 idade_maxima_dias=self.RETENCAO_DIAS,
+                                 tamanho_maximo_mb=self.RETENCAO_MAX_MB)
+
+        self.politica = PoliticaRetentativa(self.MAX_TENTATIVAS, self.ESPERA_BASE,
+                                            self.ESPERA_MAXIMA, metricas=self.metricas)
+        self.disjuntores = {}
+        self.trava_disjuntores = threading.Lock()
+        # Intervalo que funcionou na última busca de cada ticker
+        self.intervalo_preferido = {}
+
+        self.motor = MotorBusca(self.baixar_dados_simples,
+                                processar=self.processar_dados_corrigido,
+                                baixar_lote=self.baixar_dados_lote,
+                                max_concorrencia=self.MAX_CONCORRENCIA,
+                                requisicoes_por_segundo=self.REQUISICOES_POR_SEGUNDO,
+                                tamanho_lote=self.TAMANHO_LOTE,
+                                metricas=self.metricas)
+        processos = self.PROCESSOS if processos is None else processos
+        self.coordenador = None
+        if processos:
+            self.coordenador = CoordenadorProcessos(
+                self.fonte, processos,
+                requisicoes_por_segundo=self.REQUISICOES_POR_SEGUNDO,
+                politica=(self.MAX_TENTATIVAS, self.ESPERA_BASE, self.ESPERA_MAXIMA),
+                disjuntor=(self.FALHAS_PARA_ABRIR, self.TEMPO_DISJUNTOR_ABERTO),
+                metricas=self.metricas)
+
+    def fechar(self):
+        """Libera o cache em disco e os processos de busca"""
+        if self.coordenador is not None:
+            self.coordenador.fechar()
+        self.cache.fechar()
+
+    def verificar_conexao(self):
+        """Verifica se a fonte de dados está respondendo"""
+        return self.fonte.verificar_conexao()
+
+    def disjuntor(self, host=None):
+        """Disjuntor do host (o da fonte atual por padrão)"""
+        host = host or self.fonte.host
+        with self.trava_disjuntores:
+            if host not in self.disjuntores:
+                self.disjuntores[host] = Disjuntor(self.FALHAS_PARA_ABRIR,
+                                                   self.TEMPO_DISJUNTOR_ABERTO)
+            return self.disjuntores[host]
+
+    def fonte_disponivel(self):
+        """Indica se o disjuntor da fonte está deixando as chamadas passarem"""
+        return self.disjuntor().estado != Disjuntor.ABERTO
+
+    def _chamar_fonte(self, funcao):
+        return self.politica.executar(funcao, self.disjuntor())
+
+    def _intervalos_para(self, ticker):
+        """Intervalos a tentar, começando pelo que funcionou da última vez"""
+        preferido = self.intervalo_preferido.get(ticker)
+        if preferido is None:
+            return self.INTERVALOS_TENTATIVA
+        return sorted(self.INTERVALOS_TENTATIVA, key=lambda par: par[0] != preferido)
+
+    def carregar_cache(self, tickers=None):
+        """Carrega os dados do cache local sem acessar a rede"""
+        if tickers is None:
+            try:
+                self.cache.aplicar_retencao()
+            except Exception as e:
+                print(f"Erro ao aplicar retenção do cache: {e}")
+
+        carregados = {}
+        for ticker in list(self.acoes if tickers is None else tickers):
+            for intervalo, _ in self.INTERVALOS_TENTATIVA:
+                dados = self.processar_dados_corrigido(
+                    self.cache.carregar(ticker, intervalo, limite=self.BARRAS_CARREGADAS), ticker)
+                if dados is not None and len(dados) > 2:
+                    carregados[ticker] = dados
+                    break
+        with self.trava_estado:
+            for ticker, dados in carregados.items():
+                self.barras.gravar(ticker, dados)
+            self.atualizar_indicadores()
+        return bool(self.dados_acoes)
+
+    def definir_acoes(self, acoes, carregar=True):
+        """Troca a lista de ações monitoradas e carrega do cache só as novas
+
+        O dicionário `acoes` é alterado no lugar, para que quem guardou a
+        referência (a janela Tk) enxergue a troca. As ações que saíram da
+        lista deixam o armazém (continuam no cache em disco). Com
+        `carregar=False` o cache não é lido (quem chama já fez isso em outra
+        thread) e os indicadores ficam para `atualizar_indicadores`.
+        """
+        acoes = dict(acoes)
+        novas = [ticker for ticker in acoes if ticker not in self.barras]
+        with self.trava_estado:
+            self.acoes.clear()
+            self.acoes.update(acoes)
+            self.dados_acoes.restringir(acoes)
+            for ticker in self.barras.tickers():
+                if ticker not in acoes:
+                    self.barras.remover(ticker)
+        if carregar:
+            self.carregar_cache(novas)
+
+    def baixar_dados_simples(self, ticker):
+        """Baixa só as barras que faltam no cache, com retentativas e fallback de intervalo
+
+        Só a falta de dados leva ao próximo intervalo. Erros de rede, limite
+        de taxa ou disjuntor aberto encerram a busca do ticker (o erro chega
+        ao motor de busca), sem repetir a chamada em cada intervalo.
+        """
+        for intervalo, periodo in self._intervalos_para(ticker):
+            if self.cache.esta_atualizado(ticker, intervalo):
+                self.metricas.incrementar('cache_total', resultado='acerto')
+            else:
+                ultimo = self.cache.ultimo_timestamp(ticker, intervalo)
+                self.metricas.incrementar('cache_total',
+                                          resultado='falta' if ultimo is None else 'incremental')
+                try:
+                    if ultimo is not None:
+                        # A última barra pode estar incompleta: buscar a partir dela
+                        novos = self._chamar_fonte(
+                            lambda: self.fonte.historico(ticker, intervalo, inicio=ultimo))
+                    else:
+                        novos = self._chamar_fonte(
+                            lambda: self.fonte.historico(ticker, intervalo, periodo=periodo))
+                    self.cache.salvar(ticker, intervalo, novos)
+                except ErroSemDados:
+                    pass
+
+            dados = self.cache.carregar(ticker, intervalo, limite=self.BARRAS_CARREGADAS)
+            if dados is not None and len(dados) > 2:
+                self.intervalo_preferido[ticker] = intervalo
+                return dados
+
+        raise ErroSemDados(f"nenhum intervalo com dados para {ticker}")
+
+    def baixar_dados_lote(self, tickers):
+        """Baixa vários tickers de uma vez, uma requisição por intervalo preferido
+
+        Cada ticker entra no lote do intervalo que funcionou da última vez
+        (o primeiro da lista, se ainda não há um), como na busca individual.
+        """
+        padrao = self.INTERVALOS_TENTATIVA[0][0]
+        grupos = {}
+        for ticker in tickers:
+            grupos.setdefault(self.intervalo_preferido.get(ticker, padrao), []).append(ticker)
+
+        resultado = {}
+        for intervalo, periodo in self.INTERVALOS_TENTATIVA:
+            grupo = grupos.get(intervalo)
+            if not grupo:
+                continue
+            brutos = self._chamar_fonte(
+                lambda: self.fonte.historico_lote(grupo, intervalo, periodo))
+            for ticker, dados_ticker in brutos.items():
+                # Poucas barras: deixar o ticker para a busca individual com fallback
+                if len(dados_ticker) > 2:
+                    self.cache.salvar(ticker, intervalo, dados_ticker)
+                    resultado[ticker] = self.cache.carregar(ticker, intervalo,
+                                                            limite=self.BARRAS_CARREGADAS)
+                    self.intervalo_preferido[ticker] = intervalo
+        return resultado
+
+    def processar_dados_corrigido(self, dados, ticker):
+        """Processa e limpa os dados de forma correta"""
+        try:
+            dados = limpar_barras(dados)
+            if dados is None:
+                return None
+            return dados.tail(self.JANELA_EXIBICAO)
+
+        except Exception as e:
+            print(f"Erro processando {ticker}: {e}")
+            return None
+
+    def buscar_em_processos(self, tickers, ao_concluir=None, cancelado=None):
+        """Busca os tickers no pool de processos e grava as barras no cache e no armazém
+
+        O plano de cada ticker (cache atualizado, busca incremental ou
+        completa) sai do cache local; os processos só baixam e limpam. Não há
+        busca em lote aqui: os tickers já são divididos entre os processos.
+        Os resultados trazem em `dados` o número de barras gravadas.
+        """
+        resultados = {}
+        pedidos = []
+        for ticker in tickers:
+            tentativas = []
+            for intervalo, periodo in self._intervalos_para(ticker):
+                if self.cache.esta_atualizado(ticker, intervalo):
+                    tentativas.append((intervalo, None, None))
+                    break
+                ultimo = self.cache.ultimo_timestamp(ticker, intervalo)
+                tentativas.append((intervalo, periodo,
+                                   None if ultimo is None else int(ultimo.timestamp())))
+            primeira = tentativas[0]
+            self.metricas.incrementar('cache_total', resultado='acerto' if primeira[1] is None
+                                      else 'falta' if primeira[2] is None else 'incremental')
+            if primeira[1] is None:
+                # Cache atualizado: resolvido aqui mesmo, sem ir aos processos
+                self._concluir_processo(resultados, ticker, primeira[0], None, None, None, 0.0,
+                                        ao_concluir)
+            else:
+                pedidos.append((ticker, tentativas))
+
+        for pacote in self.coordenador.executar(pedidos, cancelado=cancelado):
+            with self.metricas.cronometro('armazem_segundos'):
+                for ticker, intervalo, ts, valores, fuso, duracao in desempacotar(pacote):
+                    self._concluir_processo(resultados, ticker, intervalo, ts, valores, fuso,
+                                            duracao, ao_concluir)
+            for ticker, (tipo, mensagem, duracao) in pacote['erros'].items():
+                self.metricas.incrementar('erros_total', tipo=tipo)
+                self._concluir(resultados, ResultadoBusca(ticker, None, mensagem, duracao),
+                               ao_concluir)
+        return resultados
+
+    def _concluir_processo(self, resultados, ticker, intervalo, ts, valores, fuso, duracao,
+                           ao_concluir):
+        """Grava as barras novas de um ticker vindas de um processo"""
+        try:
+            if ts is not None and len(ts):
+                self.cache.salvar_vetores(ticker, intervalo, ts, valores, fuso)
+            if ticker in self.barras and self.intervalo_preferido.get(ticker) == intervalo:
+                with self.trava_estado:
+                    gravadas = 0 if ts is None else self.barras.gravar_vetores(
+                        ticker, ts * 1_000_000_000, valores, fuso)
+            else:
+                # Primeira vez (ou outro intervalo): parte das últimas barras do cache
+                dados = self.processar_dados_corrigido(
+                    self.cache.carregar(ticker, intervalo, limite=self.BARRAS_CARREGADAS), ticker)
+                if dados is None or len(dados) <= 2:
+                    raise ErroSemDados(f"nenhum intervalo com dados para {ticker}")
+                with self.trava_estado:
+                    gravadas = self.barras.gravar(ticker, dados)
+            self.intervalo_preferido[ticker] = intervalo
+            resultado = ResultadoBusca(ticker, gravadas, None, duracao)
+        except Exception as e:
+            self.metricas.incrementar('erros_total', tipo=type(e).__name__)
+            resultado = ResultadoBusca(ticker, None, str(e), duracao)
+        self._concluir(resultados, resultado, ao_concluir)
+
+    def _concluir(self, resultados, resultado, ao_concluir):
+        resultados[resultado.ticker] = resultado
+        self.metricas.incrementar('buscas_total', resultado='ok' if resultado.ok else 'erro')
+        if ao_concluir is not None:
+            ao_concluir(resultado)
+
+    def atualizar(self, tickers=None, lote=False, ao_concluir=None, cancelado=None):
+        """Baixa e processa os tickers (todos por padrão) e guarda os resultados"""
+        tickers = list(self.acoes) if tickers is None else list(tickers)
+        antes = self.metricas.instantaneo()['contadores']
+        inicio = time.perf_counter()
+        if self.coordenador is not None:
+            # Os pacotes dos processos já são gravados no armazém ao chegar
+            resultados = self.buscar_em_processos(tickers, ao_concluir=ao_concluir,
+                                                  cancelado=cancelado)
+        else:
+            resultados = self.motor.buscar(tickers, lote=lote, ao_concluir=ao_concluir,
+                                           cancelado=cancelado)
+        duracao_busca = time.perf_counter() - inicio
+
+        with self.trava_estado:
+            with self.metricas.cronometro('armazem_segundos'):
+                for ticker, resultado in resultados.items():
+                    if not resultado.ok:
+                        print(f"Falha em {ticker}: {resultado.erro}")
+                    elif self.coordenador is None:
+                        self.barras.gravar(ticker, resultado.dados)
+            self.falhas_ultima_atualizacao = sum(1 for r in resultados.values() if not r.ok)
+            with self.metricas.cronometro('indicadores_segundos'):
+                self.atualizar_indicadores()
+        self.ultima_atualizacao = datetime.now()
+
+        duracao = time.perf_counter() - inicio
+        self.metricas.observar('atualizacao_segundos', duracao)
+        self.metricas.incrementar('atualizacoes_total')
+        self.metricas.definir('ultima_atualizacao_falhas', self.falhas_ultima_atualizacao)
+        self.metricas.definir('disjuntor_aberto', 0 if self.fonte_disponivel() else 1,
+                              host=self.fonte.host)
+        self.metricas.definir('armazem_bytes', self.barras.memoria_bytes())
+        if self.registro is not None:
+            self._registrar_atualizacao(tickers, resultados, antes, duracao, duracao_busca)
+        return resultados
+
+    def _registrar_atualizacao(self, tickers, resultados, antes, duracao, duracao_busca):
+        """Grava uma linha no log JSON com o resumo da atualização"""
+        depois = self.metricas.instantaneo()['contadores']
+        variacao = {nome: valor - antes.get(nome, 0) for nome, valor in depois.items()
+                    if valor != antes.get(nome, 0)}
+        latencias = sorted(r.duracao for r in resultados.values())
+        self.registro.registrar(
+            'atualizacao',
+            fonte=self.fonte.nome,
+            tickers=len(tickers),
+            falhas=self.falhas_ultima_atualizacao,
+            duracao_segundos=round(duracao, 4),
+            busca_segundos=round(duracao_busca, 4),
+            latencia_ticker={
+                'p50': round(latencias[len(latencias) // 2], 4) if latencias else None,
+                'max': round(latencias[-1], 4) if latencias else None,
+            },
+            contadores=variacao,
+            erros={t: r.erro for t, r in resultados.items() if not r.ok},
+        )
+
+    def definir_carteira(self, carteira):
+        """Passa a marcar a carteira a mercado a cada atualização (None desliga)"""
+        with self.trava_estado:
+            self.carteira = carteira
+            self.resumo_carteira = None
+            if carteira is not None:
+                self.resumo_carteira = carteira.marcar_indicadores(self.indicadores)
+
+    def atualizar_indicadores(self):
+        """Aplica as barras novas ao estado incremental dos indicadores"""
+        with self.trava_estado:
+            self._atualizar_indicadores()
+
+    def _atualizar_indicadores(self):
+        try:
+            ganchos = [self.alertas.avaliar] if self.alertas.regras else []
+            ganchos.append(self.triagem.ao_adicionar)
+            if self.gravador is not None:
+                ganchos.append(self.gravador.ao_adicionar)
+            self.indicadores.atualizar(self.dados_acoes, ao_adicionar=juntar_ganchos(ganchos))
+            self.valores_indicadores = self.indicadores.por_ticker()
+            self.alertas.concluir()
+            with self.metricas.cronometro('triagem_segundos'):
+                self.triagem.concluir(self.indicadores)
+            if self.carteira is not None:
+                with self.metricas.cronometro('carteira_segundos'):
+                    self.resumo_carteira = self.carteira.marcar_indicadores(self.indicadores)
+            if self.gravador is not None:
+                self.gravador.concluir(self.indicadores)
+        except Exception as e:
+            print(f"Erro ao calcular indicadores: {e}")
+
+    def cotacao(self, ticker):
+        """Resumo numérico da última barra de um ticker (ou None)"""
+        dados = self.dados_acoes.get(ticker)
+        if dados is None or len(dados) < 2:
+            return None
+        fechamento = dados['Close']
+        ultimo = float(fechamento.iat[-1])
+        anterior = float(fechamento.iat[-2])
+        volume = dados['Volume'].iat[-1] if 'Volume' in dados.columns else 0
+        return {
+            'ticker': ticker,
+            'nome': self.acoes.get(ticker, ticker),
+            'preco': ultimo,
+            'variacao': (ultimo - anterior) / anterior * 100,
+            'minimo': float(dados['Low'].min()),
+            'maximo': float(dados['High'].max()),
+            'volume': float(volume) if pd.notna(volume) else 0.0,
+            'horario': dados.index[-1].isoformat(),
+            'indicadores': self.valores_indicadores.get(ticker, {}),
+        }
+
+    def cotacoes(self):
+        """Resumo de todos os tickers com dados"""
+        resumo = []
+        for ticker in self.acoes:
+            cotacao = self.cotacao(ticker)
+            if cotacao is not None:
+                resumo.append(cotacao)
+        return resumo
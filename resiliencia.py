@@ -0,0 +1,167 @@
+"""Camada de resiliência das buscas: erros tipados, retentativas e disjuntor"""
+import random
+import threading
+import time
+
+
+class ErroFonte(Exception):
+    """Falha ao obter dados da fonte"""
+
+    transitorio = False
+
+
+class ErroRede(ErroFonte):
+    """Falha de conexão ou tempo esgotado (vale tentar de novo)"""
+
+    transitorio = True
+
+
+class ErroLimiteTaxa(ErroFonte):
+    """A fonte recusou a requisição por excesso de chamadas"""
+
+    transitorio = True
+
+
+class ErroSemDados(ErroFonte):
+    """A fonte respondeu, mas sem barras para o ticker/intervalo pedido"""
+
+
+class ErroCircuitoAberto(ErroFonte):
+    """Disjuntor aberto: a fonte está sendo poupada após falhas seguidas"""
+
+
+def classificar_erro(erro):
+    """Converte uma exceção qualquer da fonte em um ErroFonte
+
+    Só falhas de rede e HTTP conhecidas são passageiras; o resto (inclusive
+    erros de programação como KeyError) vira um ErroFonte sem retentativa,
+    que não conta para o disjuntor.
+    """
+    if isinstance(erro, ErroFonte):
+        return erro
+    nome = type(erro).__name__
+    texto = str(erro)
+    minusculo = texto.lower()
+    if 'RateLimit' in nome or '429' in texto or 'too many requests' in minusculo:
+        return ErroLimiteTaxa(texto or nome)
+    if ('no data found' in minusculo or 'delisted' in minusculo
+            or 'no timezone found' in minusculo or 'not found' in minusculo):
+        return ErroSemDados(texto or nome)
+    # As exceções do requests e do curl_cffi (usados pelo yfinance) derivam de OSError
+    if (isinstance(erro, (ConnectionError, TimeoutError, OSError))
+            or 'Timeout' in nome or 'Connection' in nome or nome in ('HTTPError', 'CurlError')
+            or 'timed out' in minusculo):
+        return ErroRede(texto or nome)
+    return ErroFonte(f"{nome}: {texto}")
+
+
+class Disjuntor:
+    """Disjuntor por host: abre após falhas seguidas e testa a volta aos poucos
+
+    Fechado: tudo passa. Aberto: nada passa até `tempo_aberto` segundos
+    depois da abertura. Meio-aberto: deixa uma requisição de teste passar;
+    se ela der certo o disjuntor fecha, senão abre de novo.
+    """
+
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio-aberto'
+
+    def __init__(self, limiar_falhas=5, tempo_aberto=30.0):
+        self.limiar_falhas = limiar_falhas
+        self.tempo_aberto = tempo_aberto
+        self.estado = self.FECHADO
+        self.falhas = 0
+        self.aberto_em = 0.0
+        self.teste_em_andamento = False
+        self.trava = threading.Lock()
+
+    def permitir(self):
+        with self.trava:
+            if self.estado == self.FECHADO:
+                return True
+            if self.estado == self.ABERTO:
+                if time.monotonic() - self.aberto_em < self.tempo_aberto:
+                    return False
+                self.estado = self.MEIO_ABERTO
+                self.teste_em_andamento = False
+            if self.teste_em_andamento:
+                return False
+            self.teste_em_andamento = True
+            return True
+
+    def sucesso(self):
+        with self.trava:
+            self.estado = self.FECHADO
+            self.falhas = 0
+            self.teste_em_andamento = False
+
+    def liberar_teste(self):
+        """Libera a vez de teste sem contar sucesso nem falha (erro alheio à fonte)"""
+        with self.trava:
+            self.teste_em_andamento = False
+
+    def falha(self):
+        """Registra uma falha; indica se o disjuntor acabou de abrir"""
+        with self.trava:
+            self.falhas += 1
+            self.teste_em_andamento = False
+            if self.estado == self.ABERTO:
+                return False
+            if self.estado == self.MEIO_ABERTO or self.falhas >= self.limiar_falhas:
+                self.estado = self.ABERTO
+                self.aberto_em = time.monotonic()
+                return True
+            return False
+
+
+class PoliticaRetentativa:
+    """Repete chamadas que falham por motivo passageiro, com espera exponencial
+
+    A espera da tentativa k é sorteada entre 0 e min(maximo, base * 2**k)
+    ("full jitter"), para que várias threads não voltem todas juntas. Erros
+    de limite de taxa usam `base_limite_taxa`, que costuma ser maior.
+    """
+
+    def __init__(self, max_tentativas=3, base=0.5, maximo=8.0, base_limite_taxa=2.0,
+                 aleatorio=None, metricas=None):
+        self.max_tentativas = max_tentativas
+        self.base = base
+        self.maximo = maximo
+        self.base_limite_taxa = base_limite_taxa
+        self.aleatorio = aleatorio or random.Random()
+        self.retentativas = 0
+        self.metricas = metricas
+
+    def espera(self, tentativa, erro):
+        base = self.base_limite_taxa if isinstance(erro, ErroLimiteTaxa) else self.base
+        return self.aleatorio.uniform(0, min(self.maximo, base * 2 ** tentativa))
+
+    def executar(self, funcao, disjuntor=None, cancelado=None):
+        """Chama `funcao()` com retentativas; levanta sempre um ErroFonte"""
+        for tentativa in range(self.max_tentativas):
+            if disjuntor is not None and not disjuntor.permitir():
+                raise ErroCircuitoAberto("fonte temporariamente suspensa após falhas seguidas")
+            try:
+                resultado = funcao()
+            except Exception as e:
+                erro = classificar_erro(e)
+                if disjuntor is not None and erro.transitorio:
+                    if disjuntor.falha() and self.metricas is not None:
+                        self.metricas.incrementar('disjuntor_aberturas_total')
+                elif disjuntor is not None and isinstance(erro, ErroSemDados):
+                    # A fonte respondeu, só que sem dados: o host está saudável
+                    disjuntor.sucesso()
+                elif disjuntor is not None:
+                    disjuntor.liberar_teste()
+                ultima = tentativa == self.max_tentativas - 1
+                if not erro.transitorio or ultima or (cancelado is not None and cancelado()):
+                    raise erro from e
+                self.retentativas += 1
+                if self.metricas is not None:
+                    self.metricas.incrementar('retentativas_total', tipo=type(erro).__name__)
+                time.sleep(self.espera(tentativa, erro))
+                continue
+            if disjuntor is not None:
+                disjuntor.sucesso()
+            return resultado
@@ -0,0 +1,385 @@
+"""Serviço de cotações sem interface gráfica
+
+Atualiza a lista de ações durante o pregão, na cadência de cada ação, e publica as cotações para vários
+clientes ao mesmo tempo, para que um único processo consulte a fonte de dados:
+
+    GET /cotacoes              último resumo de todas as ações (JSON)
+    GET /barras/<TICKER>       barras do ticker (JSON), ?limite=N
+    GET /stream                eventos (Server-Sent Events) a cada atualização
+    GET /saude                 estado do serviço
+    GET /metrics               métricas no formato de texto do Prometheus
+    GET /busca?q=TEXTO         ações da lista cujo código ou nome casa com o texto
+    GET /alertas               alertas disparados recentemente (JSON)
+    GET /carteira              carteira marcada a mercado (JSON), ?limite=N posições
+    GET /triagem               ranking das ações (JSON): ?ordem=CAMPO&crescente=1&limite=N
+                               e ?q=CONSULTA para filtrar (ver triagem.py)
+    GET /correlacao            matriz de correlação (JSON); ?ticker=X&limite=N dá as
+                               ações mais correlacionadas com X
+
+Com --arquivo, o resumo também é gravado em disco a cada atualização;
+--metricas-arquivo grava as métricas (coletor por arquivo do Prometheus) e
+--log-json anexa um resumo JSON de cada atualização. --lista e --grupo
+escolhem as ações monitoradas a partir de arquivos de listas (ver listas.py).
+--alertas carrega regras de alerta (ver alertas.py) e --webhook envia cada
+alerta disparado por POST a uma URL. --carteira acrescenta às ações
+monitoradas as de uma carteira (ver carteira.py), marcada a cada atualização.
+
+    python servico.py --porta 8765 --intervalo 60
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from agendador import Agendador, CalendarioB3
+from alertas import EntregaWebhook, carregar_arquivos_regras
+from carteira import carregar_carteira
+from fonte_dados import criar_fonte
+from gravacao import PASTA_GRAVACOES
+from listas import ListaAcoes, carregar_listas
+from nucleo import ACOES_PADRAO, NucleoCotacoes
+
+
+def _json_bytes(objeto):
+    return json.dumps(objeto, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+def _numero(valor):
+    valor = float(valor)
+    return valor if math.isfinite(valor) else None
+
+
+def _limpar(objeto):
+    """Troca NaN/infinito por None para gerar JSON válido"""
+    if isinstance(objeto, dict):
+        return {chave: _limpar(valor) for chave, valor in objeto.items()}
+    if isinstance(objeto, list):
+        return [_limpar(valor) for valor in objeto]
+    if isinstance(objeto, float):
+        return _numero(objeto)
+    return objeto
+
+
+class ServicoCotacoes:
+    """Atualiza o núcleo conforme a agenda e guarda o último resumo publicado"""
+
+    # Espera máxima entre verificações da agenda (s)
+    ESPERA_MAXIMA_AGENDA = 30
+    # Máximo de ações por atualização (o restante fica para as seguintes)
+    MAX_POR_ATUALIZACAO = 100
+
+    def __init__(self, nucleo, intervalo_segundos=120, lote=False, arquivo=None,
+                 arquivo_metricas=None, lista=None):
+        self.nucleo = nucleo
+        self.lista = lista or ListaAcoes('Padrão', nucleo.acoes)
+        self.agendador = Agendador(CalendarioB3() if nucleo.fonte.tempo_real else None,
+                                   cadencia_base=intervalo_segundos)
+        self.lote = lote
+        self.arquivo = arquivo
+        self.arquivo_metricas = arquivo_metricas
+        self.versao = 0
+        self.resumo = _json_bytes({'versao': 0, 'cotacoes': []})
+        self.condicao = threading.Condition()
+        self.parar_evento = threading.Event()
+        self.thread = None
+
+    def iniciar(self):
+        """Carrega o cache e inicia a thread de atualização"""
+        if self.nucleo.carregar_cache():
+            self._publicar()
+        self.thread = threading.Thread(target=self._laco, daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.parar_evento.set()
+        with self.condicao:
+            self.condicao.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.nucleo.fechar()
+
+    def _laco(self):
+        while not self.parar_evento.is_set():
+            agora = time.time()
+            vencidos = self.agendador.vencidos(self.nucleo.acoes, agora,
+                                               self.MAX_POR_ATUALIZACAO)
+            if vencidos:
+                try:
+                    self.nucleo.atualizar(vencidos, lote=self.lote,
+                                          cancelado=self.parar_evento.is_set)
+                    with self.nucleo.metricas.cronometro('publicacao_segundos'):
+                        self._publicar()
+                    if self.arquivo_metricas:
+                        self.nucleo.metricas.gravar_prometheus(self.arquivo_metricas)
+                    print(f"{datetime.now():%H:%M:%S} - {len(vencidos)} ações atualizadas "
+                          f"({self.nucleo.falhas_ultima_atualizacao} falhas, "
+                          f"{time.time() - agora:.1f}s)")
+                except Exception as e:
+                    print(f"Erro na atualização: {e}")
+                volatilidades = {ticker: valores.get('volatilidade')
+                                 for ticker, valores in self.nucleo.valores_indicadores.items()}
+                self.agendador.registrar(vencidos, time.time(), volatilidades)
+
+            espera = self.agendador.segundos_ate_proximo(self.nucleo.acoes, time.time())
+            self.parar_evento.wait(min(max(espera, 0.5), self.ESPERA_MAXIMA_AGENDA))
+
+    def _publicar(self):
+        """Serializa o resumo uma única vez e acorda os clientes de /stream"""
+        cotacoes = [_limpar(cotacao) for cotacao in self.nucleo.cotacoes()]
+        with self.condicao:
+            self.versao += 1
+            self.resumo = _json_bytes({
+                'versao': self.versao,
+                'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                'cotacoes': cotacoes,
+            })
+            self.condicao.notify_all()
+
+        if self.arquivo:
+            # Gravação atômica: leitores nunca veem um arquivo pela metade
+            temporario = self.arquivo + '.tmp'
+            with open(temporario, 'wb') as f:
+                f.write(self.resumo)
+            os.replace(temporario, self.arquivo)
+
+    def aguardar_versao(self, versao, tempo_limite):
+        """Espera um resumo mais novo que `versao`; devolve (versao, resumo)"""
+        with self.condicao:
+            self.condicao.wait_for(
+                lambda: self.versao > versao or self.parar_evento.is_set(), timeout=tempo_limite)
+            return self.versao, self.resumo
+
+    def barras(self, ticker, limite=None):
+        dados = self.nucleo.barras.quadro(ticker, limite or None, copiar=True)
+        if dados is None:
+            return None
+        return _json_bytes({
+            'ticker': ticker,
+            'barras': [
+                {'horario': horario.isoformat(),
+                 **{coluna.lower(): _numero(valor) for coluna, valor in barra.items()}}
+                for horario, barra in zip(dados.index,
+                                          dados[['Open', 'High', 'Low', 'Close', 'Volume']]
+                                          .to_dict('records'))
+            ],
+        })
+
+
+def criar_manipulador(servico):
+    """Cria a classe que atende as requisições HTTP do serviço"""
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, formato, *args):
+            pass
+
+        def _responder(self, corpo, status=200, tipo='application/json; charset=utf-8'):
+            self.send_response(status)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            partes = [parte for parte in url.path.split('/') if parte]
+
+            if partes == ['cotacoes']:
+                self._responder(servico.resumo)
+            elif len(partes) == 2 and partes[0] == 'barras':
+                try:
+                    limite = int(parse_qs(url.query).get('limite', ['0'])[0])
+                except ValueError:
+                    limite = 0
+                corpo = servico.barras(partes[1].upper(), limite)
+                if corpo is None:
+                    self._responder(_json_bytes({'erro': 'ticker sem dados'}), status=404)
+                else:
+                    self._responder(corpo)
+            elif partes == ['stream']:
+                self._stream()
+            elif partes == ['saude']:
+                self._responder(_json_bytes({
+                    'fonte': servico.nucleo.fonte.nome,
+                    'versao': servico.versao,
+                    'acoes': len(servico.nucleo.acoes),
+                    'falhas': servico.nucleo.falhas_ultima_atualizacao,
+                    'mercado_aberto': servico.agendador.mercado_aberto(),
+                    'fonte_disponivel': servico.nucleo.fonte_disponivel(),
+                }))
+            elif partes == ['busca']:
+                texto = parse_qs(url.query).get('q', [''])[0]
+                self._responder(_json_bytes([
+                    {'ticker': ticker, 'nome': nome,
+                     'monitorada': ticker in servico.nucleo.acoes}
+                    for ticker, nome in servico.lista.buscar(texto).items()]))
+            elif partes == ['alertas']:
+                alertas = list(servico.nucleo.alertas.recentes)
+                self._responder(_json_bytes([alerta.como_dicionario() for alerta in alertas]))
+            elif partes == ['carteira']:
+                try:
+                    limite = int(parse_qs(url.query).get('limite', ['20'])[0])
+                except ValueError:
+                    limite = 20
+                resumo = servico.nucleo.resumo_carteira
+                if resumo is None:
+                    self._responder(_json_bytes({'erro': 'sem carteira'}), status=404)
+                else:
+                    self._responder(_json_bytes(_limpar(resumo.como_dicionario(limite))))
+            elif partes == ['triagem']:
+                parametros = parse_qs(url.query)
+                resultado = servico.nucleo.triagem.resultado()
+                try:
+                    indices = resultado.ranking(
+                        parametros.get('ordem', ['momento'])[0],
+                        limite=int(parametros.get('limite', ['20'])[0]),
+                        crescente=parametros.get('crescente', ['0'])[0] in ('1', 'true'),
+                        consulta=parametros.get('q', [''])[0])
+                except ValueError as e:
+                    self._responder(_json_bytes({'erro': str(e)}), status=400)
+                    return
+                self._responder(_json_bytes(_limpar({
+                    'versao': resultado.versao, 'acoes': resultado.linhas(indices)})))
+            elif partes == ['correlacao']:
+                parametros = parse_qs(url.query)
+                resultado = servico.nucleo.triagem.resultado()
+                ticker = parametros.get('ticker', [''])[0].upper()
+                if not ticker:
+                    self._responder(_json_bytes(_limpar({
+                        'versao': resultado.versao, 'tickers': resultado.tickers,
+                        'correlacao': resultado.correlacao.round(4).tolist()})))
+                elif ticker not in resultado.posicoes:
+                    self._responder(_json_bytes({'erro': 'ticker sem dados'}), status=404)
+                else:
+                    try:
+                        limite = int(parametros.get('limite', ['10'])[0])
+                    except ValueError:
+                        limite = 10
+                    self._responder(_json_bytes(_limpar({
+                        'versao': resultado.versao, 'ticker': ticker,
+                        'correlacionadas': [{'ticker': par, 'correlacao': valor} for par, valor
+                                            in resultado.mais_correlacionadas(ticker, limite)]})))
+            elif partes == ['metrics']:
+                self._responder(servico.nucleo.metricas.texto_prometheus().encode('utf-8'),
+                                tipo='text/plain; version=0.0.4; charset=utf-8')
+            else:
+                self._responder(_json_bytes({'erro': 'rota não encontrada'}), status=404)
+
+        def _stream(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+
+            versao, resumo = 0, None
+            try:
+                while not servico.parar_evento.is_set():
+                    nova_versao, resumo = servico.aguardar_versao(versao, tempo_limite=15)
+                    if nova_versao > versao:
+                        versao = nova_versao
+                        self.wfile.write(b'event: cotacoes\ndata: ' + resumo + b'\n\n')
+                    else:
+                        # Comentário periódico mantém a conexão aberta
+                        self.wfile.write(b': ping\n\n')
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Manipulador
+
+
+def ler_argumentos():
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Serviço de cotações sem interface gráfica")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço de escuta")
+    parser.add_argument("--porta", type=int, default=8765, help="Porta HTTP")
+    parser.add_argument("--intervalo", type=float, default=120,
+                        help="Cadência base, em segundos, entre atualizações de cada ação")
+    parser.add_argument("--lote", action="store_true", help="Usar download em lote")
+    parser.add_argument("--arquivo", help="Gravar o último resumo neste arquivo JSON")
+    parser.add_argument("--lista", action="append",
+                        help="Arquivo CSV/JSON/TOML (ou pasta) com listas de ações; pode repetir")
+    parser.add_argument("--grupo", help="Grupo da lista a monitorar (padrão: a lista toda)")
+    parser.add_argument("--metricas-arquivo",
+                        help="Gravar as métricas (formato Prometheus) neste arquivo")
+    parser.add_argument("--log-json", help="Anexar um resumo JSON de cada atualização a este arquivo")
+    parser.add_argument("--alertas", action="append",
+                        help="Arquivo TOML/JSON com regras de alerta (ver alertas.py); pode repetir")
+    parser.add_argument("--webhook", help="URL que recebe cada alerta por POST (JSON)")
+    parser.add_argument("--fonte", default="yahoo",
+                        help="Fonte de dados: 'yahoo', 'replay[:PASTA]' (CSV/Parquet ou "
+                             "sintético) ou 'gravacao:ARQUIVO' (sessão gravada com --gravar)")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="Velocidade do relógio da fonte replay")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Latência simulada por requisição da fonte replay, em segundos")
+    parser.add_argument("--processos", type=int,
+                        help="Buscar em N processos (listas com centenas de ações)")
+    parser.add_argument("--gravar", nargs="?", const=PASTA_GRAVACOES,
+                        help="Gravar as barras vistas na sessão (em PASTA, padrão: gravacoes/)")
+    parser.add_argument("--carteira",
+                        help="Arquivo CSV/JSON/TOML com as posições da carteira (ver carteira.py)")
+    return parser.parse_args()
+
+
+def main():
+    """Função principal do serviço"""
+    argumentos = ler_argumentos()
+    fonte = criar_fonte(argumentos.fonte, velocidade=argumentos.velocidade,
+                        latencia=argumentos.latencia)
+    lista = None
+    listas = {}
+    acoes = ACOES_PADRAO
+    if argumentos.lista:
+        listas = carregar_listas(argumentos.lista)
+        if argumentos.grupo:
+            lista = next((l for l in listas.values() if argumentos.grupo in l.grupos), None)
+            if lista is None:
+                print(f"Grupo '{argumentos.grupo}' não encontrado nas listas")
+                return
+        elif listas:
+            lista = next(iter(listas.values()))
+        if lista is not None:
+            acoes = lista.acoes(argumentos.grupo)
+    carteira = None
+    if argumentos.carteira:
+        carteira = carregar_carteira(argumentos.carteira)
+        acoes = {**acoes, **carteira.acoes()}
+    nucleo = NucleoCotacoes(fonte=fonte, acoes=acoes, log_json=argumentos.log_json,
+                            processos=argumentos.processos, gravar=argumentos.gravar)
+    if carteira is not None:
+        nucleo.definir_carteira(carteira)
+    if argumentos.alertas:
+        nucleo.alertas.definir_regras(carregar_arquivos_regras(argumentos.alertas, listas))
+    if argumentos.webhook:
+        nucleo.alertas.adicionar_entrega(EntregaWebhook(argumentos.webhook))
+    servico = ServicoCotacoes(nucleo,
+                              intervalo_segundos=argumentos.intervalo, lote=argumentos.lote,
+                              arquivo=argumentos.arquivo,
+                              arquivo_metricas=argumentos.metricas_arquivo, lista=lista)
+    servico.iniciar()
+
+    servidor = ThreadingHTTPServer((argumentos.host, argumentos.porta), criar_manipulador(servico))
+    servidor.daemon_threads = True
+    print(f"Serviço de cotações em http://{argumentos.host}:{argumentos.porta} "
+          f"(fonte: {fonte.nome}, intervalo: {argumentos.intervalo:g}s)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando serviço...")
+    finally:
+        servidor.server_close()
+        servico.parar()
+
+
+if __name__ == "__main__":
+    main()
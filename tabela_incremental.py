@@ -0,0 +1,157 @@
+from datetime import datetime
+
+COLUNAS_TABELA = ('Ação', 'Último Preço (R$)', 'Variação %', 'Mínimo', 'Máximo', 'Volume',
+                  'RSI 14', 'MME 20', 'Volat. %', 'Atualização')
+
+
+def formatar_indicador(valor, formato):
+    """Formata um indicador, mostrando '-' enquanto não houver barras suficientes"""
+    if valor is None or valor != valor:
+        return "-"
+    return formato.format(valor)
+
+
+def formatar_volume(volume):
+    """Formata volume para formato legível"""
+    try:
+        volume_val = float(volume)
+        if volume_val >= 1_000_000_000:
+            return f"{volume_val/1_000_000_000:.1f} Bi"
+        elif volume_val >= 1_000_000:
+            return f"{volume_val/1_000_000:.1f} Mi"
+        elif volume_val >= 1_000:
+            return f"{volume_val/1_000:.1f} Mil"
+        else:
+            return f"{volume_val:.0f}"
+    except:
+        return "N/A"
+
+
+class DiferencasTabela:
+    """Alterações a aplicar na tabela: linhas novas, células alteradas e linhas removidas"""
+
+    __slots__ = ('inserir', 'alterar', 'remover', 'ordem')
+
+    def __init__(self):
+        self.inserir = []   # (ticker, valores)
+        self.alterar = []   # (ticker, {coluna: valor})
+        self.remover = []   # tickers
+        self.ordem = []     # ordem final dos tickers na tabela
+
+    def vazia(self):
+        return not (self.inserir or self.alterar or self.remover)
+
+
+class ModeloTabela:
+    """Mantém o conteúdo exibido por ticker e calcula só o que mudou
+
+    Cada ticker é uma linha com identificador estável (o próprio ticker).
+    Mínimo e máximo valem para as barras do quadro exibido (a janela) e são
+    acumulados a cada barra nova; o quadro só é relido quando a barra do
+    extremo sai da janela ou é a última (que ainda pode ser revisada).
+    """
+
+    def __init__(self, colunas=COLUNAS_TABELA):
+        self.colunas = colunas
+        self.linhas = {}
+        self.extremos = {}
+
+    def limpar(self):
+        self.linhas.clear()
+        self.extremos.clear()
+
+    @staticmethod
+    def _extremo(serie, anterior, ultimo, menor):
+        """(valor, horário) do extremo da série, reaproveitando o anterior se ainda vale"""
+        if anterior is not None and serie.index[0] <= anterior[1] < ultimo:
+            # Só as barras a partir da última vista (ela pode ter sido revisada)
+            novas = serie.iloc[serie.index.searchsorted(ultimo):]
+        else:
+            novas, anterior = serie, None
+        if not len(novas) or novas.isna().all():
+            return anterior
+        horario = novas.idxmin() if menor else novas.idxmax()
+        valor = novas[horario]
+        if anterior is not None and (anterior[0] <= valor if menor else anterior[0] >= valor):
+            return anterior
+        return valor, horario
+
+    def _extremos(self, ticker, dados):
+        baixa = dados['Low'] if 'Low' in dados.columns else dados['Close']
+        alta = dados['High'] if 'High' in dados.columns else dados['Close']
+
+        ultimo, minimo, maximo = self.extremos.get(ticker, (None, None, None))
+        if ultimo is None or ultimo > dados.index[-1]:
+            minimo = maximo = None
+        minimo = self._extremo(baixa, minimo, ultimo, menor=True)
+        maximo = self._extremo(alta, maximo, ultimo, menor=False)
+
+        self.extremos[ticker] = (dados.index[-1], minimo, maximo)
+        nan = float('nan')
+        return (minimo[0] if minimo else nan), (maximo[0] if maximo else nan)
+
+    def calcular_linha(self, ticker, nome, dados, indicadores=None):
+        """Calcula os valores exibidos de um ticker (sem a coluna de horário)"""
+        fechamento = dados['Close']
+        ultimo = fechamento.iat[-1]
+        preco_anterior = fechamento.iat[-2]
+        variacao = ((ultimo - preco_anterior) / preco_anterior) * 100
+        minimo, maximo = self._extremos(ticker, dados)
+        volume = dados['Volume'].iat[-1] if 'Volume' in dados.columns else 0
+
+        indicadores = indicadores or {}
+        volatilidade = indicadores.get('volatilidade')
+
+        # Indicar a direção da variação (usando texto simples)
+        seta = "▼" if variacao < 0 else "▲"
+        return (
+            f"{nome} ({ticker})",
+            f"R$ {ultimo:.2f}",
+            f"{seta} {variacao:+.2f}%",
+            f"R$ {minimo:.2f}",
+            f"R$ {maximo:.2f}",
+            formatar_volume(volume),
+            formatar_indicador(indicadores.get('rsi'), "{:.1f}"),
+            formatar_indicador(indicadores.get('ema'), "R$ {:.2f}"),
+            formatar_indicador(volatilidade * 100 if volatilidade is not None else None, "{:.2f}"),
+        )
+
+    def diferencas(self, acoes, dados_acoes, indicadores=None):
+        """Compara o estado atual com o exibido e devolve as alterações"""
+        diferencas = DiferencasTabela()
+        hora_atualizacao = datetime.now().strftime('%H:%M:%S')
+
+        for ticker, nome in acoes.items():
+            dados = dados_acoes.get(ticker)
+            if dados is None or len(dados) < 2:
+                if ticker in self.linhas:
+                    diferencas.ordem.append(ticker)
+                continue
+            try:
+                valores = self.calcular_linha(ticker, nome, dados,
+                                              (indicadores or {}).get(ticker))
+            except Exception as e:
+                print(f"Erro ao adicionar {ticker} na tabela: {e}")
+                if ticker in self.linhas:
+                    diferencas.ordem.append(ticker)
+                continue
+
+            diferencas.ordem.append(ticker)
+            anteriores = self.linhas.get(ticker)
+            if anteriores is None:
+                diferencas.inserir.append((ticker, valores + (hora_atualizacao,)))
+            else:
+                alteradas = {coluna: novo for coluna, novo, velho
+                             in zip(self.colunas, valores, anteriores) if novo != velho}
+                if not alteradas:
+                    continue
+                alteradas[self.colunas[-1]] = hora_atualizacao
+                diferencas.alterar.append((ticker, alteradas))
+            self.linhas[ticker] = valores
+
+        for ticker in list(self.linhas):
+            if ticker not in acoes:
+                diferencas.remover.append(ticker)
+                del self.linhas[ticker]
+                self.extremos.pop(ticker, None)
+        return diferencas
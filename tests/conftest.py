@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Os módulos ficam na raiz do repositório, sem pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def quadro(barras=None, semente=0, tendencia=0.0, fechamento=None, volume=None,
+           inicio='2024-04-01 13:00', freq='min', tz='UTC', faltando=()):
+    """Quadro OHLCV de teste, como os devolvidos pelas fontes
+
+    Sem `fechamento`, um passeio aleatório de `barras` barras a partir da
+    `semente`; `tendencia` (número ou vetor) soma ao retorno de cada barra.
+    Sem `volume`, volumes aleatórios. `faltando` tira barras pela posição.
+    """
+    aleatorio = np.random.default_rng(semente)
+    if fechamento is None:
+        fechamento = 100 * np.exp(np.cumsum(aleatorio.normal(0, 0.01, barras) + tendencia))
+    fechamento = np.asarray(fechamento, dtype=float)
+    if volume is None:
+        volume = aleatorio.integers(100, 1000, len(fechamento))
+    indice = pd.date_range(inicio, periods=len(fechamento), freq=freq, tz='UTC').tz_convert(tz)
+    dados = pd.DataFrame({'Open': fechamento * 0.999, 'High': fechamento * 1.01,
+                          'Low': fechamento * 0.99, 'Close': fechamento,
+                          'Volume': np.asarray(volume, dtype=float)}, index=indice)
+    return dados.drop(dados.index[list(faltando)])
@@ -0,0 +1,67 @@
+from datetime import date, datetime
+
+from agendador import FUSO_B3, Agendador, CalendarioB3, domingo_de_pascoa
+
+
+def test_domingo_de_pascoa():
+    assert domingo_de_pascoa(2024) == date(2024, 3, 31)
+    assert domingo_de_pascoa(2025) == date(2025, 4, 20)
+    assert domingo_de_pascoa(2026) == date(2026, 4, 5)
+
+
+def test_feriados_moveis_e_fixos():
+    feriados = CalendarioB3().feriados(2024)
+    for dia in (date(2024, 2, 12), date(2024, 2, 13), date(2024, 3, 29), date(2024, 5, 30),
+                date(2024, 1, 1), date(2024, 11, 20), date(2024, 12, 24)):
+        assert dia in feriados
+    assert date(2024, 4, 1) not in feriados
+
+
+def test_pregao_aberto():
+    calendario = CalendarioB3()
+    assert calendario.aberto(datetime(2024, 4, 1, 10, 0, tzinfo=FUSO_B3))
+    assert not calendario.aberto(datetime(2024, 4, 1, 9, 59, tzinfo=FUSO_B3))
+    assert not calendario.aberto(datetime(2024, 4, 1, 18, 0, tzinfo=FUSO_B3))
+    # Sexta-feira Santa e sábado
+    assert not calendario.aberto(datetime(2024, 3, 29, 12, 0, tzinfo=FUSO_B3))
+    assert not calendario.aberto(datetime(2024, 3, 30, 12, 0, tzinfo=FUSO_B3))
+
+
+def test_proxima_abertura_pula_feriado_e_fim_de_semana():
+    calendario = CalendarioB3()
+    depois_do_fechamento = datetime(2024, 3, 28, 19, 0, tzinfo=FUSO_B3)
+    assert calendario.proxima_abertura(depois_do_fechamento) == \
+        datetime(2024, 4, 1, 10, 0, tzinfo=FUSO_B3)
+    cedo = datetime(2024, 4, 2, 8, 0, tzinfo=FUSO_B3)
+    assert calendario.proxima_abertura(cedo) == datetime(2024, 4, 2, 10, 0, tzinfo=FUSO_B3)
+
+
+def test_feriados_extras():
+    calendario = CalendarioB3(feriados_extras=[date(2024, 4, 2)])
+    assert not calendario.aberto(datetime(2024, 4, 2, 12, 0, tzinfo=FUSO_B3))
+
+
+def test_mercado_fechado_nao_vence_nada():
+    agendador = Agendador(CalendarioB3())
+    sabado = datetime(2024, 3, 30, 12, 0, tzinfo=FUSO_B3).timestamp()
+    assert agendador.vencidos(['PETR4.SA'], sabado) == []
+    segunda = datetime(2024, 4, 1, 10, 0, tzinfo=FUSO_B3).timestamp()
+    assert agendador.segundos_ate_proximo(['PETR4.SA'], sabado) == segunda - sabado
+
+
+def test_cadencia_por_prioridade_e_volatilidade():
+    agendador = Agendador(cadencia_base=120)
+    agendador.definir_prioridade('A', 'alta')
+    agendador.registrar(['A', 'B', 'C'], 1000.0, {'A': 0.01, 'B': 0.01, 'C': 0.04})
+    assert agendador.cadencias['A'] == 60
+    assert agendador.cadencias['B'] == 120
+    assert agendador.cadencias['C'] == 60
+    assert agendador.vencidos(['A', 'B', 'C'], 1059.0) == []
+    assert agendador.vencidos(['A', 'B', 'C'], 1060.0) == ['A', 'C']
+
+
+def test_vencidos_com_limite_prioriza_os_mais_atrasados():
+    agendador = Agendador(cadencia_base=60)
+    agendador.registrar(['A'], 0.0)
+    agendador.registrar(['B'], 10.0)
+    assert agendador.vencidos(['B', 'A', 'C'], 100.0, limite=2) == ['C', 'A']
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from alertas import Alerta, MotorAlertas, NotificacaoDesktop, criar_regra
+from conftest import quadro
+from indicadores import IndicadoresIncrementais
+
+
+def rodar(motor, indicadores, dados_acoes):
+    indicadores.atualizar(dados_acoes, ao_adicionar=motor.avaliar)
+    return motor.concluir()
+
+
+def test_criar_regra():
+    regra = criar_regra({'tipo': 'preco', 'ticker': 'petr4', 'acima': 40})
+    assert regra.tickers == ['PETR4.SA']
+    assert (regra.campo, regra.alvo, regra.sinal, regra.cruzamento) == ('preco', 40.0, 1, True)
+    with pytest.raises(ValueError):
+        criar_regra({'tipo': 'cruzamento', 'campo': 'inexistente'})
+
+
+def test_historico_e_silencioso_e_cruzamento_dispara_uma_vez():
+    motor = MotorAlertas([criar_regra({'tipo': 'preco', 'ticker': 'A.SA', 'acima': 10})])
+    indicadores = IndicadoresIncrementais()
+    # O primeiro lote (histórico) só monta o estado
+    assert rodar(motor, indicadores, {'A.SA': quadro(fechamento=[9, 11, 9])}) == []
+    dados = quadro(fechamento=[9, 11, 9, 11, 12])
+    alertas = rodar(motor, indicadores, {'A.SA': dados})
+    assert [(a.ticker, a.horario) for a in alertas] == [('A.SA', dados.index[3])]
+
+
+def test_troca_de_lista_mantem_o_estado_dos_que_continuam():
+    motor = MotorAlertas([criar_regra({'tipo': 'volume', 'fator': 3})])
+    indicadores = IndicadoresIncrementais()
+    normal = [100.0] * 30
+    rodar(motor, indicadores, {'A.SA': quadro(fechamento=[10] * 30, volume=normal),
+                               'B.SA': quadro(fechamento=[10] * 30, volume=normal)})
+    media = motor.estado['media_volume'][motor.tickers.index('B.SA')]
+
+    # B continua com a média do volume; C entra e só reaplica o histórico
+    # Como na vista do armazém: B só traz as barras recentes
+    alertas = rodar(motor, indicadores, {'B.SA': quadro(fechamento=[10] * 31, volume=normal + [500.0]).iloc[-3:],
+                                         'C.SA': quadro(fechamento=[10] * 31, volume=normal + [500.0])})
+    assert motor.tickers == ['B.SA', 'C.SA']
+    assert [a.ticker for a in alertas] == ['B.SA']
+    assert motor.estado['n'][0] == 31
+    assert alertas[0].valor == pytest.approx(500.0 / media)
+
+
+def test_rajada_de_alertas_vira_uma_notificacao():
+    notificacoes = []
+    mostrada = threading.Event()
+    notificacao = NotificacaoDesktop()
+    notificacao.notificar = lambda titulo, texto: (notificacoes.append((titulo, texto)),
+                                                   mostrada.set())
+    horario = quadro(1).index[0]
+    for i in range(7):
+        notificacao(Alerta('preco', 'preco', f'T{i}.SA', horario, 10.0, f"alerta {i}"))
+    assert mostrada.wait(5)
+    titulo, texto = notificacoes[0]
+    assert titulo == "7 alertas"
+    assert texto.split('\n') == [f"alerta {i}" for i in range(5)] + ["... e mais 2"]
+    assert notificacao.agrupar(
+        [Alerta('preco', 'preco', 'A.SA', horario, 1.0, "subiu")]) == ("Alerta A.SA", "subiu")
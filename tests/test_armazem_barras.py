@@ -0,0 +1,48 @@
+from armazem_barras import ArmazemBarras, VistaQuadros
+from conftest import quadro
+
+
+def test_gravar_acrescenta_e_revisa_a_ultima():
+    armazem = ArmazemBarras(capacidade_barras=8, max_tickers=4)
+    dados = quadro(5, tz='America/Sao_Paulo')
+    assert armazem.gravar('A.SA', dados) == 5
+    revisado = quadro(7, tz='America/Sao_Paulo')
+    revisado.iloc[4, revisado.columns.get_loc('Close')] = 99.0
+    # A barra 4 (a última gravada) é revisada; as 3 primeiras são ignoradas
+    assert armazem.gravar('A.SA', revisado.iloc[1:]) == 3
+    lido = armazem.quadro('A.SA')
+    assert len(lido) == 7
+    assert lido['Close'].iloc[4] == 99.0
+    assert str(lido.index.tz) == 'America/Sao_Paulo'
+
+
+def test_anel_guarda_as_ultimas_barras():
+    armazem = ArmazemBarras(capacidade_barras=8, max_tickers=4)
+    armazem.gravar('A.SA', quadro(20))
+    lido = armazem.quadro('A.SA')
+    assert list(lido['Close']) == list(quadro(20)['Close'].iloc[-8:])
+    assert list(armazem.quadro('A.SA', n=3)['Close']) == list(quadro(20)['Close'].iloc[-3:])
+
+
+def test_vista_restrita_aos_monitorados():
+    armazem = ArmazemBarras(capacidade_barras=8, max_tickers=4)
+    for ticker in ('A.SA', 'B.SA', 'C.SA'):
+        armazem.gravar(ticker, quadro(3))
+    vista = VistaQuadros(armazem, janela=2, tickers=['A.SA', 'C.SA'])
+    assert sorted(vista) == ['A.SA', 'C.SA']
+    assert len(vista) == 2
+    assert vista.get('B.SA') is None
+    assert len(vista['A.SA']) == 2
+    vista.restringir(['B.SA'])
+    assert list(vista) == ['B.SA']
+    vista.restringir(None)
+    assert len(vista) == 3
+
+
+def test_limite_de_tickers_descarta_o_mais_antigo():
+    armazem = ArmazemBarras(capacidade_barras=4, max_tickers=2)
+    armazem.gravar('A.SA', quadro(2))
+    armazem.gravar('B.SA', quadro(2))
+    armazem.gravar('C.SA', quadro(2))
+    assert 'A.SA' not in armazem
+    assert sorted(armazem.tickers()) == ['B.SA', 'C.SA']
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+from busca_processos import CoordenadorProcessos, _empacotar, _vetores, desempacotar
+from conftest import quadro
+from fonte_dados import FonteDados
+
+TICKERS = [f'T{i:02d}.SA' for i in range(6)]
+TENTATIVAS = [('15m', '1d', None), ('1d', '5d', None)]
+
+
+def barras(ticker):
+    return quadro(30, int(ticker[1:3]), freq='15min', tz='America/Sao_Paulo')
+
+
+class FonteQueDerruba(FonteDados):
+    """Fonte local (vai por pickle aos processos) que mata o processo em um ticker"""
+
+    nome = "teste"
+    persistente = False
+    tempo_real = False
+
+    def __init__(self, fatal):
+        self.fatal = fatal
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        if ticker == self.fatal:
+            os._exit(1)
+        return barras(ticker)
+
+
+def test_empacotar_e_desempacotar_ida_e_volta():
+    partes = [(t, '15m', *_vetores(barras(t)), 0.5) for t in TICKERS[:3]]
+    partes.append(('VAZIO.SA', '1d', np.empty(0, np.int64), np.empty((0, 5)), None, 0.1))
+    pacote = _empacotar(partes, {'ERRO.SA': ('ErroSemDados', 'sem barras', 0.2)})
+    assert pacote['erros'] == {'ERRO.SA': ('ErroSemDados', 'sem barras', 0.2)}
+    lidos = list(desempacotar(pacote))
+    assert [linha[0] for linha in lidos] == TICKERS[:3] + ['VAZIO.SA']
+    for original, lido in zip(partes, lidos):
+        assert lido[1] == original[1] and lido[4] == original[4] and lido[5] == original[5]
+        assert np.array_equal(lido[2], original[2])
+        assert np.array_equal(lido[3], original[3])
+    ts, valores = lidos[0][2], lidos[0][3]
+    assert np.array_equal(ts, barras(TICKERS[0]).index.as_unit('s').asi8)
+    assert np.allclose(valores, barras(TICKERS[0]).to_numpy())
+
+
+def test_fragmentos_cobrem_os_pedidos_com_custo_equilibrado():
+    coordenador = CoordenadorProcessos(FonteQueDerruba(None), processos=2)
+    coordenador.custos = {t: float(i + 1) for i, t in enumerate(TICKERS)}
+    pedidos = [(t, TENTATIVAS) for t in TICKERS]
+    coordenador.FRAGMENTOS_POR_PROCESSO = 1
+    fragmentos = coordenador.fragmentar(pedidos)
+    assert sorted(p for fragmento in fragmentos for p in fragmento) == sorted(pedidos)
+    custos = [sum(coordenador.custos[t] for t, _ in fragmento) for fragmento in fragmentos]
+    assert custos == [11.0, 10.0]
+
+
+def test_processo_derrubado_so_afeta_o_ticker_culpado():
+    fatal = TICKERS[2]
+    coordenador = CoordenadorProcessos(FonteQueDerruba(fatal), processos=2,
+                                       requisicoes_por_segundo=0)
+    try:
+        erros, lidos = {}, {}
+        for pacote in coordenador.executar([(t, TENTATIVAS) for t in TICKERS]):
+            erros.update(pacote['erros'])
+            for ticker, intervalo, ts, valores, fuso, _ in desempacotar(pacote):
+                lidos[ticker] = (intervalo, ts, valores, fuso)
+    finally:
+        coordenador.fechar()
+
+    assert list(erros) == [fatal]
+    assert sorted(lidos) == [t for t in TICKERS if t != fatal]
+    for ticker, (intervalo, ts, valores, fuso) in lidos.items():
+        esperado = barras(ticker)
+        assert (intervalo, fuso) == ('15m', 'America/Sao_Paulo')
+        assert np.array_equal(ts, esperado.index.as_unit('s').asi8)
+        assert np.array_equal(valores, esperado.to_numpy())
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from cache_barras import CacheBarras
+from conftest import quadro
+
+
+def test_salvar_mescla_por_ticker_intervalo_e_horario():
+    cache = CacheBarras(':memory:')
+    dados = quadro(10, freq='15min', tz='America/Sao_Paulo')
+    assert cache.salvar('A.SA', '15m', dados.iloc[:6]) == 6
+    # A última barra gravada foi revisada e vem de novo junto com as seguintes
+    revisado = dados.iloc[5:].copy()
+    revisado.iloc[0, revisado.columns.get_loc('Close')] = 99.0
+    cache.salvar('A.SA', '15m', revisado)
+    # Os mesmos horários em outro intervalo e em outro ticker são outras séries
+    cache.salvar('A.SA', '1h', dados.iloc[:3])
+    cache.salvar('B.SA', '15m', dados.iloc[:4])
+
+    lido = cache.carregar('A.SA', '15m')
+    assert len(lido) == 10
+    assert str(lido.index.tz) == 'America/Sao_Paulo'
+    assert lido.index.equals(dados.index)
+    assert lido['Close'].iloc[5] == 99.0
+    assert np.allclose(lido['Close'].drop(lido.index[5]), dados['Close'].drop(dados.index[5]))
+    assert len(cache.carregar('A.SA', '1h')) == 3
+    assert len(cache.carregar('B.SA', '15m')) == 4
+    assert sorted(cache.series()) == [('A.SA', '15m'), ('A.SA', '1h'), ('B.SA', '15m')]
+    assert list(cache.carregar('A.SA', '15m', limite=3).index) == list(dados.index[-3:])
+    assert cache.ultimo_timestamp('A.SA', '15m') == dados.index[-1]
+    assert cache.carregar('C.SA', '15m') is None
+    cache.fechar()
+
+
+def test_retencao_por_idade_e_por_serie():
+    agora = pd.Timestamp.now(tz='UTC').floor('h')
+    cache = CacheBarras(':memory:', idade_maxima_dias=1, max_barras_por_serie=5)
+    cache.salvar('A.SA', '1h', quadro(48, inicio=agora - pd.Timedelta(hours=47), freq='h'))
+    cache.salvar('B.SA', '1h', quadro(10, inicio=agora - pd.Timedelta(days=3), freq='h'))
+    cache.salvar('C.SA', '1h', quadro(3, inicio=agora - pd.Timedelta(hours=2), freq='h'))
+    cache.aplicar_retencao()
+
+    # A: só as 5 mais recentes; B: tudo antigo, some junto com a série; C: intacto
+    a = cache.carregar('A.SA', '1h')
+    assert len(a) == 5
+    assert a.index[-1] == agora
+    assert cache.carregar('B.SA', '1h') is None
+    assert len(cache.carregar('C.SA', '1h')) == 3
+    assert sorted(cache.series()) == [('A.SA', '1h'), ('C.SA', '1h')]
+    cache.fechar()
+
+
+def test_salvar_vetores_grava_nan_como_nulo():
+    cache = CacheBarras(':memory:')
+    dados = quadro(4, freq='15min', tz='America/Sao_Paulo')
+    ts = dados.index.tz_convert('UTC').as_unit('s').asi8
+    valores = dados.to_numpy(copy=True)
+    valores[1, 4] = np.nan
+    valores[2, :] = np.nan
+    assert cache.salvar_vetores('A.SA', '15m', ts, valores, 'America/Sao_Paulo') == 4
+
+    nulos = cache.conexao.execute(
+        "SELECT COUNT(*) FROM barras WHERE volume IS NULL").fetchone()[0]
+    assert nulos == 2
+    lido = cache.carregar('A.SA', '15m')
+    assert lido.index.equals(dados.index)
+    assert np.allclose(lido.to_numpy(), valores, equal_nan=True)
+    cache.fechar()
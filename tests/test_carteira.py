@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from carteira import GRUPO_TODAS, Carteira, carregar_carteira
+from indicadores import IndicadoresIncrementais
+
+
+@pytest.fixture
+def carteira():
+    return Carteira(['XP', 'XP', 'Rico'], ['petr4', 'VALE3.SA', 'PETR4'], [100, 50, -10],
+                    [30.0, 60.0, 35.0], ['Petróleo', 'Mineração', 'Petróleo'])
+
+
+def test_codifica_tickers_e_contas(carteira):
+    assert carteira.tickers == ['PETR4.SA', 'VALE3.SA']
+    assert carteira.contas == ['XP', 'Rico']
+    lista = carteira.lista()
+    assert set(lista.grupos[GRUPO_TODAS]) == {'PETR4.SA', 'VALE3.SA'}
+    assert lista.grupos['Rico'] == ['PETR4.SA']
+
+
+def test_resultado_por_conta(carteira):
+    resumo = carteira.marcar([32.0, 55.0], [31.0, 56.0])
+    # XP: 100 x 32 + 50 x 55; Rico: vendido em 10 PETR4
+    assert list(resumo.valor) == [100 * 32 + 50 * 55, -10 * 32]
+    assert list(resumo.resultado) == [100 * 2 + 50 * -5, -10 * -3]
+    assert list(resumo.resultado_dia) == [100 * 1 + 50 * -1, -10 * 1]
+    # A base do retorno do dia é em módulo: a posição vendida não a anula
+    assert resumo.retorno_dia[0] == pytest.approx(50 / (100 * 31 + 50 * 56))
+    assert resumo.retorno_dia[1] == pytest.approx(-10 / 310)
+    assert resumo.total['resultado_dia'] == 40
+    assert resumo.exposicao_setores() == {'Petróleo': 100 * 32 - 10 * 32, 'Mineração': 50 * 55}
+    assert [int(i) for i in resumo.maiores_do_dia(2)] == [0, 1]
+
+
+def test_posicoes_sem_cotacao_ficam_fora(carteira):
+    resumo = carteira.marcar([np.nan, 55.0], [np.nan, 56.0])
+    assert resumo.sem_cotacao == 2
+    assert list(resumo.valor) == [50 * 55, 0]
+    assert resumo.total['custo'] == 50 * 60
+    assert np.isnan(resumo.retorno_dia[1])
+
+
+def test_marcar_pelos_indicadores(carteira):
+    import pandas as pd
+    indice = pd.to_datetime(['2024-04-01 17:00', '2024-04-02 17:00'], utc=True)
+    barras = lambda precos: pd.DataFrame({'Open': precos, 'High': precos, 'Low': precos,
+                                          'Close': precos, 'Volume': [1.0, 1.0]}, index=indice)
+    indicadores = IndicadoresIncrementais()
+    indicadores.atualizar({'VALE3.SA': barras([56.0, 55.0]), 'ITUB4.SA': barras([30.0, 31.0])})
+    resumo = carteira.marcar_indicadores(indicadores)
+    assert resumo.sem_cotacao == 2
+    assert resumo.resultado_dia[0] == 50 * -1
+
+
+def test_carregar_csv(tmp_path):
+    caminho = tmp_path / 'minha.csv'
+    caminho.write_text('conta,ticker,quantidade,preco_medio\n'
+                       'XP,PETR4,"1.000,0","30,50"\n'
+                       'XP,,10,1\n'
+                       'Rico,VALE3,abc,1\n', encoding='utf-8')
+    carteira = carregar_carteira(str(caminho))
+    assert carteira.nome == 'minha'
+    assert len(carteira) == 1
+    assert carteira.quantidade[0] == 1000
+    assert carteira.preco_medio[0] == 30.5
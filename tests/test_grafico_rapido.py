@@ -0,0 +1,50 @@
+import numpy as np
+
+from conftest import quadro
+from grafico_rapido import datas_para_num, decimar_min_max, preparar_series
+
+
+def serie(barras, semente=0):
+    dados = quadro(barras, semente)
+    return datas_para_num(dados.index), dados['Close'].to_numpy(copy=True)
+
+
+def test_decimacao_guarda_extremos_de_cada_coluna_e_as_pontas():
+    x, y = serie(10000)
+    y[1234] = np.nan
+    xd, yd = decimar_min_max(x, y, 100)
+    assert len(xd) <= 2 * 100 + 2
+    assert (xd[0], yd[0]) == (x[0], y[0])
+    assert (xd[-1], yd[-1]) == (x[-1], y[-1])
+    assert np.all(np.diff(xd) >= 0)
+
+    coluna = np.minimum(((x - x[0]) / (x[-1] - x[0]) * 100).astype(int), 99)
+    minimos, maximos = yd[1:-1:2], yd[2:-1:2]
+    for i, c in enumerate(np.unique(coluna)):
+        assert minimos[i] == np.nanmin(y[coluna == c])
+        assert maximos[i] == np.nanmax(y[coluna == c])
+    assert np.nanmin(yd) == np.nanmin(y)
+    assert np.nanmax(yd) == np.nanmax(y)
+
+
+def test_serie_curta_volta_sem_mudanca():
+    x, y = serie(150)
+    xd, yd = decimar_min_max(x, y, 100)
+    assert xd is x and yd is y
+    assert decimar_min_max(x, y, 0)[0] is x
+
+
+def test_preparar_series_decima_e_guarda_o_ultimo_preco():
+    longo, curto = quadro(5000, 1), quadro(50, 2)
+    preparadas = preparar_series([('A.SA', 'A', longo), ('B.SA', 'B', curto),
+                                  ('C.SA', 'C', quadro(3)), ('D.SA', 'D', None)], 100)
+    # Séries com poucos pontos (ou sem dados) ficam de fora
+    assert [serie.ticker for serie in preparadas] == ['A.SA', 'B.SA']
+    a, b = preparadas
+    assert len(a.x) <= 2 * 100 + 2
+    assert a.y[-1] == longo['Close'].iat[-1]
+    assert a.extensao[2:] == (longo['Close'].min(), longo['Close'].max())
+    assert np.array_equal(b.x, datas_para_num(curto.index))
+    assert np.array_equal(b.y, curto['Close'].to_numpy())
+    # Compartilhadas com a thread do Tk: só leitura
+    assert not a.y.flags.writeable and not b.x.flags.writeable
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import quadro
+from gravacao import (SEGMENTO_BARRAS, FonteGravacao, GravadorSessao, escrever_segmento,
+                      ler_barras, ler_segmentos, quadro_barras)
+from indicadores import IndicadoresIncrementais
+
+TICKERS = ('A.SA', 'B.SA')
+
+
+def gravar_sessao(pasta, dados, cortes):
+    """Passa os quadros pelos indicadores em lotes, como o núcleo, gravando cada um"""
+    gravador = GravadorSessao(str(pasta), prefixo='teste', intervalo_de=lambda ticker: '15m')
+    indicadores = IndicadoresIncrementais()
+    for corte in cortes:
+        indicadores.atualizar({t: d.iloc[:corte] for t, d in dados.items()},
+                              ao_adicionar=gravador.ao_adicionar)
+        gravador.concluir(indicadores)
+    return gravador.caminho()
+
+
+def test_gravacao_e_reproducao_ida_e_volta(tmp_path):
+    dados = {t: quadro(40, i, freq='15min', tz='America/Sao_Paulo')
+             for i, t in enumerate(TICKERS)}
+    # A última barra do primeiro lote ainda estava em formação
+    parcial = {t: d.copy() for t, d in dados.items()}
+    parcial['A.SA'].iloc[24, parcial['A.SA'].columns.get_loc('Close')] *= 0.98
+    gravador = GravadorSessao(str(tmp_path), prefixo='teste', intervalo_de=lambda ticker: '15m')
+    indicadores = IndicadoresIncrementais()
+    for lote in ({t: d.iloc[:25] for t, d in parcial.items()}, dados):
+        indicadores.atualizar(lote, ao_adicionar=gravador.ao_adicionar)
+        gravador.concluir(indicadores)
+
+    barras = quadro_barras(ler_barras(gravador.caminho()))
+    assert len(barras) == 80
+    assert len(quadro_barras(ler_barras(gravador.caminho()), revisoes=True)) == 81
+    fonte = FonteGravacao(gravador.caminho(), velocidade=1e9)
+    assert fonte.tickers() == list(TICKERS)
+    for ticker, esperado in dados.items():
+        exportado = barras[barras['ticker'] == ticker]
+        assert (exportado['intervalo'] == '15m').all()
+        assert np.allclose(exportado[list(esperado.columns)].to_numpy(), esperado.to_numpy())
+        reproduzido = fonte.historico(ticker, '15m')
+        assert str(reproduzido.index.tz) == 'America/Sao_Paulo'
+        assert reproduzido.index.equals(esperado.index)
+        assert np.allclose(reproduzido.to_numpy(), esperado.to_numpy())
+    # Intervalo que não foi gravado: vazio, o núcleo passa ao próximo
+    assert fonte.historico('A.SA', '1d').empty
+
+
+def test_segmento_cortado_no_fim_e_ignorado(tmp_path, capsys):
+    dados = {t: quadro(30, i, freq='15min') for i, t in enumerate(TICKERS)}
+    caminho = gravar_sessao(tmp_path, dados, (10, 20))
+    integro = os.path.getsize(caminho)
+    antes = quadro_barras(ler_barras(caminho))
+    gravar_sessao(tmp_path, dados, (30,))
+    # Queda do programa no meio da escrita do segmento seguinte
+    with open(caminho, 'r+b') as arquivo:
+        arquivo.truncate(integro + 40)
+
+    assert len(list(ler_segmentos(caminho))) == 4
+    assert "cortada após o byte" in capsys.readouterr().out
+    depois = quadro_barras(ler_barras(caminho))
+    assert depois.equals(antes)
+    assert len(depois) == 40
+
+
+def test_troca_de_intervalo_guarda_as_duas_series(tmp_path):
+    caminho = str(tmp_path / 'teste.grv')
+    horarios = pd.date_range('2024-04-01', periods=3, freq='15min', tz='UTC').as_unit('ns')
+    with open(caminho, 'ab') as arquivo:
+        for gravado, intervalo, ts in ((1, '15m', horarios.asi8), (2, '1d', horarios.asi8[:1])):
+            escrever_segmento(arquivo, SEGMENTO_BARRAS, gravado=np.int64(gravado),
+                              fuso=np.array('UTC'), tickers=np.array(['A.SA']),
+                              intervalos=np.array([intervalo]),
+                              indice=np.zeros(len(ts), dtype=np.int32), ts=ts,
+                              valores=np.full((len(ts), 5), float(gravado)))
+
+    # A barra diária tem o mesmo horário da primeira de 15 minutos
+    barras = quadro_barras(ler_barras(caminho))
+    assert list(barras['intervalo']) == ['15m', '15m', '15m', '1d']
+    fonte = FonteGravacao(caminho, velocidade=1e9)
+    assert fonte.tickers() == ['A.SA']
+    assert list(fonte.historico('A.SA', '15m')['Close']) == [1.0, 1.0, 1.0]
+    assert list(fonte.historico('A.SA', '1d')['Close']) == [2.0]
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from historico import ArquivoHistorico, Backfill, Pedaco, dias_por_pedaco, limites_pedacos
+from resiliencia import Disjuntor, ErroRede, PoliticaRetentativa
+
+
+def test_limites_pedacos_cobrem_o_periodo_alinhados():
+    inicio = pd.Timestamp('2015-03-10', tz='UTC')
+    fim = pd.Timestamp('2020-07-01', tz='UTC')
+    pedacos = limites_pedacos(inicio, fim, 730)
+    assert pedacos[0][0] <= inicio < pedacos[0][1]
+    assert pedacos[-1][0] < fim <= pedacos[-1][1]
+    for (_, fim_anterior), (comeco, _) in zip(pedacos, pedacos[1:]):
+        assert fim_anterior == comeco
+    largura = 730 * 86400
+    assert all(int(comeco.timestamp()) % largura == 0 for comeco, _ in pedacos)
+    # O mesmo pedaço independe do início pedido
+    outro = limites_pedacos(inicio + pd.Timedelta(days=20), fim, 730)
+    assert outro[0] == pedacos[0]
+
+
+def _barras(inicio, fim, freq='D', tz='America/Sao_Paulo'):
+    indice = pd.date_range(inicio, fim, freq=freq, tz='UTC', inclusive='left').tz_convert(tz)
+    precos = np.linspace(10, 20, len(indice))
+    return pd.DataFrame({'Open': precos, 'High': precos + 1, 'Low': precos - 1,
+                         'Close': precos + 0.5, 'Volume': np.arange(len(indice)) * 100.0},
+                        index=indice)
+
+
+def test_arquivo_ida_e_volta(tmp_path):
+    arquivo = ArquivoHistorico(str(tmp_path))
+    inicio, fim = limites_pedacos(pd.Timestamp('2024-01-01', tz='UTC'),
+                                  pd.Timestamp('2024-01-02', tz='UTC'), 30)[0]
+    pedaco = Pedaco('PETR4.SA', '15m', inicio, fim, arquivo.caminho('PETR4.SA', '15m', inicio))
+    dados = _barras(inicio - pd.Timedelta(days=1), fim + pd.Timedelta(days=1), freq='15min')
+    gravadas = arquivo.gravar(pedaco, dados)
+
+    dentro = dados[(dados.index >= inicio) & (dados.index < fim)]
+    assert gravadas == len(dentro)
+    lido = arquivo.quadro('PETR4.SA', '15m')
+    assert str(lido.index.tz) == 'America/Sao_Paulo'
+    assert lido.index.equals(dentro.index)
+    assert np.allclose(lido.to_numpy(), dentro.to_numpy(), rtol=1e-6)
+    # Leitura de um trecho
+    meio = inicio + pd.Timedelta(days=10)
+    trecho = arquivo.quadro('PETR4.SA', '15m', inicio=meio, fim=meio + pd.Timedelta(hours=2))
+    assert len(trecho) == 8
+    assert arquivo.primeiro_inicio('PETR4.SA', '15m') == inicio
+
+
+class FonteFalsa:
+    """Barras diárias a partir de `listagem`; os pedidos em `falhar` dão erro de rede"""
+
+    tempo_real = False
+
+    def __init__(self, listagem, falhar=()):
+        self.listagem = pd.Timestamp(listagem, tz='UTC')
+        self.falhar = set(falhar)
+        self.pedidos = []
+
+    def historico(self, ticker, intervalo, periodo=None, inicio=None, fim=None):
+        self.pedidos.append((inicio, fim))
+        if any(inicio <= data < fim for data in self.falhar):
+            raise ErroRede('tempo esgotado')
+        if fim <= self.listagem:
+            return _barras(fim, fim).iloc[:0]
+        return _barras(max(inicio, self.listagem), fim)
+
+
+def _backfill(fonte, tmp_path):
+    return Backfill(fonte, ArquivoHistorico(str(tmp_path)), max_concorrencia=2,
+                    politica=PoliticaRetentativa(max_tentativas=1),
+                    disjuntor=Disjuntor(limiar_falhas=100))
+
+
+def test_backfill_grava_vazios_antes_da_listagem_e_retoma_as_falhas(tmp_path):
+    falha = pd.Timestamp('2023-03-01', tz='UTC')
+    fonte = FonteFalsa('2019-06-01', falhar=[falha])
+    backfill = _backfill(fonte, tmp_path)
+    inicio, fim = pd.Timestamp('2010-01-01', tz='UTC'), pd.Timestamp('2024-01-01', tz='UTC')
+
+    resumo = backfill.executar(['X.SA'], '1d', inicio, fim)
+    assert resumo['falhas'] == 1
+    # Os pedaços vazios antes da listagem ficam em disco; o que falhou, não
+    pendentes = backfill.planejar(['X.SA'], '1d', inicio, fim)
+    assert len(pendentes) == 1
+    assert pendentes[0].inicio <= falha < pendentes[0].fim
+
+    fonte.falhar.clear()
+    resumo = backfill.executar(['X.SA'], '1d', inicio, fim)
+    assert resumo == {'pedacos': 1, 'baixados': 1, 'falhas': 0, 'barras': resumo['barras']}
+    assert backfill.planejar(['X.SA'], '1d', inicio, fim) == []
+    dados = backfill.arquivo.quadro('X.SA', '1d', fim=fim)
+    assert dados.index[0] == pd.Timestamp('2019-06-01', tz='UTC')
+    assert len(dados) == (fim - pd.Timestamp('2019-06-01', tz='UTC')).days
+
+
+def test_backfill_sem_nenhum_dado_nao_grava_nada(tmp_path):
+    backfill = _backfill(FonteFalsa('2030-01-01'), tmp_path)
+    inicio, fim = pd.Timestamp('2018-01-01', tz='UTC'), pd.Timestamp('2024-01-01', tz='UTC')
+    backfill.executar(['X.SA'], '1d', inicio, fim)
+    assert len(backfill.planejar(['X.SA'], '1d', inicio, fim)) == \
+        len(limites_pedacos(inicio, fim, dias_por_pedaco('1d')))
+
+
+def test_backfill_intradiario_pede_so_o_periodo_disponivel(tmp_path):
+    fonte = FonteFalsa('2000-01-01')
+    fonte.tempo_real = True
+    backfill = _backfill(fonte, tmp_path)
+    agora = pd.Timestamp.now(tz='UTC')
+    pedacos = backfill.planejar(['X.SA'], '15m', agora - pd.Timedelta(days=365))
+    assert pedacos
+    limite = agora - pd.Timedelta(days=60)
+    assert all(pedaco.pedido >= limite for pedaco in pedacos)
+    assert pedacos[0].inicio <= pedacos[0].pedido
+
+
+def test_backfill_intradiario_vazio_fica_pendente(tmp_path):
+    fonte = FonteFalsa('2100-01-01')
+    fonte.tempo_real = True
+    backfill = _backfill(fonte, tmp_path)
+    inicio = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=50)
+    antes = backfill.planejar(['X.SA'], '15m', inicio)
+    backfill.executar(['X.SA'], '15m', inicio)
+    assert len(backfill.planejar(['X.SA'], '15m', inicio)) == len(antes)
+
+
+def test_barras_fora_do_pedaco_nao_o_marcam_como_baixado(tmp_path):
+    arquivo = ArquivoHistorico(str(tmp_path))
+    inicio, fim = limites_pedacos(pd.Timestamp('2024-01-01', tz='UTC'),
+                                  pd.Timestamp('2024-01-02', tz='UTC'), 30)[0]
+    pedaco = Pedaco('X.SA', '15m', inicio, fim, arquivo.caminho('X.SA', '15m', inicio))
+    assert arquivo.gravar(pedaco, _barras(fim, fim + pd.Timedelta(days=1), freq='15min')) == 0
+    assert not arquivo.existe(pedaco)
+    assert arquivo.gravar(pedaco, None) == 0
+    assert arquivo.existe(pedaco)
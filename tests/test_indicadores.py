@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import quadro
+from indicadores import IndicadoresIncrementais, calcular_indicadores, montar_painel
+
+BARRAS = 120
+
+
+def comparar(incrementais, dados_acoes):
+    """Cada ticker contra o cálculo vetorizado sobre as próprias barras"""
+    valores = incrementais.valores()
+    for i, ticker in enumerate(incrementais.tickers):
+        esperado = calcular_indicadores(montar_painel({ticker: dados_acoes[ticker]}))
+        for nome, vetor in valores.items():
+            assert vetor[i] == pytest.approx(esperado[nome].iloc[-1, 0], nan_ok=True), \
+                (ticker, nome)
+
+
+def test_incremental_igual_ao_vetorizado():
+    dados = {'A.SA': quadro(BARRAS, 1, freq='h'), 'B.SA': quadro(BARRAS, 2, freq='h', faltando=[5, 6, 40]),
+             'C.SA': quadro(BARRAS, 3, freq='h')}
+    incrementais = IndicadoresIncrementais()
+    assert incrementais.atualizar({t: d.iloc[:70] for t, d in dados.items()}) > 0
+    assert incrementais.atualizar(dados) > 0
+    comparar(incrementais, dados)
+
+
+def test_barra_revisada_substitui_a_anterior():
+    dados = {'A.SA': quadro(60, 1, freq='h'), 'B.SA': quadro(60, 2, freq='h')}
+    incrementais = IndicadoresIncrementais()
+    incrementais.atualizar(dados)
+    revisados = {t: d.copy() for t, d in dados.items()}
+    revisados['A.SA'].iloc[-1, revisados['A.SA'].columns.get_loc('Close')] *= 1.05
+    incrementais.atualizar(revisados)
+    comparar(incrementais, revisados)
+
+
+def test_troca_de_lista_mantem_o_estado_dos_que_continuam():
+    dados = {t: quadro(BARRAS, i, freq='h') for i, t in enumerate(('A.SA', 'B.SA', 'C.SA', 'D.SA'))}
+    incrementais = IndicadoresIncrementais()
+    incrementais.atualizar({t: dados[t].iloc[:80] for t in ('A.SA', 'B.SA', 'C.SA')})
+    # Como na vista do armazém: os que continuam só trazem as barras recentes
+    incrementais.atualizar({'B.SA': dados['B.SA'].iloc[60:90], 'C.SA': dados['C.SA'].iloc[60:90],
+                            'D.SA': dados['D.SA'].iloc[:90]})
+    assert incrementais.tickers == ['B.SA', 'C.SA', 'D.SA']
+    assert list(incrementais.estado['n']) == [90, 90, 90]
+    comparar(incrementais, {t: dados[t].iloc[:90] for t in ('B.SA', 'C.SA', 'D.SA')})
+
+
+def test_por_ticker():
+    incrementais = IndicadoresIncrementais()
+    incrementais.atualizar({'A.SA': quadro(BARRAS, 1, freq='h')})
+    valores = incrementais.por_ticker()
+    assert set(valores) == {'A.SA'}
+    assert valores['A.SA']['rsi'] == pytest.approx(incrementais.valores()['rsi'][0])
@@ -0,0 +1,63 @@
+import threading
+
+from armazem_barras import ArmazemBarras
+from conftest import quadro
+from instantaneos import ProdutorInstantaneos
+from metricas import Metricas
+
+ACOES = {'A.SA': 'A', 'B.SA': 'B', 'C.SA': 'C'}
+
+
+class NucleoReproducao:
+    """O que o produtor lê do núcleo, com barras reproduzidas de quadros prontos"""
+
+    JANELA_EXIBICAO = 50
+
+    def __init__(self, dados):
+        self.dados = dados
+        self.metricas = Metricas()
+        self.barras = ArmazemBarras(capacidade_barras=256, max_tickers=16)
+        self.valores_indicadores = {}
+
+    def reproduzir(self, barras, tickers=None):
+        """Grava as primeiras `barras` barras de cada ticker, como uma busca"""
+        for ticker in tickers or self.dados:
+            self.barras.gravar(ticker, self.dados[ticker].iloc[:barras])
+
+
+def esperar_um(produtor, publicado):
+    assert publicado.wait(5)
+    publicado.clear()
+    return produtor.coletar()
+
+
+def test_pedidos_acumulados_viram_um_instantaneo():
+    nucleo = NucleoReproducao({t: quadro(120, i) for i, t in enumerate(ACOES)})
+    nucleo.reproduzir(80)
+    publicado = threading.Event()
+    produtor = ProdutorInstantaneos(nucleo, ao_publicar=publicado.set)
+    try:
+        # Com a condição presa, o produtor não pega nenhum dos pedidos até o fim
+        with produtor.condicao:
+            produtor.solicitar({'A.SA': 'A'}, [], grafico=False)
+            produtor.solicitar(ACOES, ['A.SA'], tabela=False, largura=100)
+            produtor.solicitar(ACOES, ['A.SA', 'B.SA'], tabela=False, largura=100)
+        instantaneos = esperar_um(produtor, publicado)
+        assert len(instantaneos) == 1
+        instantaneo = instantaneos[0]
+        # O pedido mais recente vale, com tabela e gráfico se algum pediu
+        assert instantaneo.versao == 1
+        assert sorted(instantaneo.linhas) == sorted(ACOES)
+        assert [serie.ticker for serie in instantaneo.series] == ['A.SA', 'B.SA']
+
+        # A reprodução avança só para B: só a linha de B muda
+        nucleo.reproduzir(81, ['B.SA'])
+        produtor.solicitar(ACOES, ['B.SA'])
+        instantaneo, = esperar_um(produtor, publicado)
+        assert instantaneo.versao == 2
+        assert list(instantaneo.linhas) == ['B.SA']
+        assert instantaneo.series[0].y[-1] == nucleo.dados['B.SA']['Close'].iat[80]
+    finally:
+        produtor.parar()
+        produtor.thread.join(5)
+    assert produtor.coletar() == []
@@ -0,0 +1,31 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from janela_triagem import JanelaTriagem
+from triagem import ResultadoTriagem
+
+
+def resultado(versao, tickers):
+    n = len(tickers)
+    correlacao = np.eye(n)
+    return ResultadoTriagem(versao, tickers, correlacao, correlacao, np.full((n, n), 40), {})
+
+
+def test_rotulos_acompanham_a_lista_com_o_mesmo_tamanho():
+    # Só a parte do mapa de calor, sem a janela Tk
+    janela = JanelaTriagem.__new__(JanelaTriagem)
+    janela.fig = Figure()
+    janela.ax = janela.fig.add_subplot(111)
+    janela.canvas = FigureCanvasAgg(janela.fig)
+    janela.imagem = None
+    janela.rotulos = None
+    for versao, tickers in enumerate((['A.SA', 'B.SA', 'C.SA'], ['D.SA', 'E.SA', 'F.SA'])):
+        janela.resultado = resultado(versao, tickers)
+        janela.desenhar_mapa()
+        nomes = {rotulo.get_text() for rotulo in janela.ax.get_xticklabels()}
+        assert nomes == {ticker.split('.')[0] for ticker in tickers}
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+import motor_busca
+from motor_busca import LimitadorTaxa, MotorBusca
+
+
+class RelogioFalso:
+    """Substitui o módulo `time` do motor: `sleep` só avança o relógio"""
+
+    def __init__(self):
+        self.agora = 0.0
+        self.dormido = 0.0
+
+    def monotonic(self):
+        return self.agora
+
+    perf_counter = monotonic
+
+    def sleep(self, segundos):
+        self.agora += segundos
+        self.dormido += segundos
+
+
+def test_limitador_libera_a_rajada_e_depois_segue_a_taxa(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(motor_busca, 'time', relogio)
+    limitador = LimitadorTaxa(10, rajada=3)
+    for _ in range(3):
+        limitador.aguardar()
+    assert relogio.dormido == 0
+    limitador.aguardar()
+    assert relogio.dormido == pytest.approx(0.1)
+    # Parado por muito tempo, o balde enche só até a rajada
+    relogio.agora += 60
+    relogio.dormido = 0.0
+    for _ in range(4):
+        limitador.aguardar()
+    assert relogio.dormido == pytest.approx(0.1)
+
+
+def test_limitador_sem_taxa_nao_espera(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(motor_busca, 'time', relogio)
+    limitador = LimitadorTaxa(0)
+    for _ in range(100):
+        limitador.aguardar()
+    assert relogio.dormido == 0
+
+
+def test_cancelar_durante_a_busca_nao_inicia_novas_tarefas():
+    cancelar = threading.Event()
+    baixados = []
+
+    def baixar(ticker):
+        baixados.append(ticker)
+        if ticker == 'B.SA':
+            cancelar.set()
+        return [ticker]
+
+    motor = MotorBusca(baixar, max_concorrencia=1, requisicoes_por_segundo=0)
+    concluidos = []
+    resultados = motor.buscar(['A.SA', 'B.SA', 'C.SA', 'D.SA'], ao_concluir=concluidos.append,
+                              cancelado=cancelar.is_set)
+    # A busca em andamento termina; as que estavam na fila não começam
+    assert baixados == ['A.SA', 'B.SA']
+    assert sorted(resultados) == ['A.SA', 'B.SA']
+    assert all(resultado.ok for resultado in resultados.values())
+    assert sorted(r.ticker for r in concluidos) == ['A.SA', 'B.SA']
+
+
+def test_lote_incompleto_ou_com_erro_cai_na_busca_individual():
+    individuais = []
+
+    def baixar(ticker):
+        individuais.append(ticker)
+        return [ticker, 'individual']
+
+    def baixar_lote(tickers):
+        if 'E.SA' in tickers:
+            raise ConnectionError("lote recusado")
+        # Como o download em lote: tickers com poucas barras ficam de fora
+        return {t: [t, 'lote'] for t in tickers if t != 'B.SA'}
+
+    motor = MotorBusca(baixar, processar=lambda dados, ticker: dados[1], baixar_lote=baixar_lote,
+                       requisicoes_por_segundo=0, tamanho_lote=2)
+    resultados = motor.buscar(['A.SA', 'B.SA', 'C.SA', 'D.SA', 'E.SA'], lote=True)
+    assert {t: r.dados for t, r in resultados.items()} == {
+        'A.SA': 'lote', 'B.SA': 'individual', 'C.SA': 'lote', 'D.SA': 'lote',
+        'E.SA': 'individual'}
+    assert sorted(individuais) == ['B.SA', 'E.SA']
+
+
+def test_erro_de_um_ticker_nao_derruba_os_outros():
+    def baixar(ticker):
+        if ticker == 'B.SA':
+            raise ValueError("ticker inválido")
+        return ticker
+
+    motor = MotorBusca(baixar, requisicoes_por_segundo=0)
+    resultados = motor.buscar(['A.SA', 'B.SA', 'C.SA'])
+    assert [t for t, r in sorted(resultados.items()) if r.ok] == ['A.SA', 'C.SA']
+    assert resultados['B.SA'].erro == "ticker inválido"
@@ -0,0 +1,35 @@
+from conftest import quadro
+from fonte_dados import FonteDados
+from nucleo import NucleoCotacoes
+
+
+class FonteLote(FonteDados):
+    """Devolve `barras[ticker]` barras por ticker e anota cada pedido em lote"""
+
+    nome = "teste"
+    persistente = False
+    tempo_real = False
+
+    def __init__(self, barras):
+        self.barras = barras
+        self.pedidos = []
+
+    def historico_lote(self, tickers, intervalo, periodo):
+        self.pedidos.append((list(tickers), intervalo))
+        return {t: quadro(self.barras[t], i, freq='15min') for i, t in enumerate(tickers)}
+
+
+def test_lote_por_intervalo_preferido_e_sem_quadros_curtos():
+    fonte = FonteLote({'A.SA': 30, 'B.SA': 2, 'C.SA': 30})
+    nucleo = NucleoCotacoes(fonte=fonte, acoes={'A.SA': 'A', 'B.SA': 'B', 'C.SA': 'C'})
+    try:
+        nucleo.intervalo_preferido['C.SA'] = '1h'
+        resultado = nucleo.baixar_dados_lote(['A.SA', 'B.SA', 'C.SA'])
+        # Uma requisição por intervalo, cada ticker no que funcionou por último
+        assert fonte.pedidos == [(['A.SA', 'B.SA'], '15m'), (['C.SA'], '1h')]
+        # B trouxe poucas barras: fica para a busca individual, com fallback
+        assert sorted(resultado) == ['A.SA', 'C.SA']
+        assert len(resultado['A.SA']) == 30
+        assert nucleo.intervalo_preferido == {'A.SA': '15m', 'C.SA': '1h'}
+    finally:
+        nucleo.fechar()
@@ -0,0 +1,138 @@
+import pytest
+
+from resiliencia import (Disjuntor, ErroCircuitoAberto, ErroFonte, ErroLimiteTaxa, ErroRede,
+                         ErroSemDados, PoliticaRetentativa, classificar_erro)
+
+
+class DNSError(OSError):
+    pass
+
+
+class HTTPError(Exception):
+    pass
+
+
+@pytest.mark.parametrize('erro, tipo', [
+    (TimeoutError('tempo esgotado'), ErroRede),
+    (ConnectionError('recusada'), ErroRede),
+    (DNSError('host desconhecido'), ErroRede),
+    (HTTPError('502 Bad Gateway'), ErroRede),
+    (RuntimeError('read timed out'), ErroRede),
+    (RuntimeError('429 Too Many Requests'), ErroLimiteTaxa),
+    (RuntimeError('PETR4.SA: possibly delisted; no price data found'), ErroSemDados),
+])
+def test_classificar_erros_da_fonte(erro, tipo):
+    assert type(classificar_erro(erro)) is tipo
+
+
+@pytest.mark.parametrize('erro', [KeyError('Close'), TypeError('x'), ValueError('y')])
+def test_erros_de_programacao_nao_sao_passageiros(erro):
+    classificado = classificar_erro(erro)
+    assert type(classificado) is ErroFonte
+    assert not classificado.transitorio
+    assert type(erro).__name__ in str(classificado)
+
+
+def test_erro_fonte_passa_direto():
+    erro = ErroSemDados('vazio')
+    assert classificar_erro(erro) is erro
+
+
+def test_disjuntor_abre_e_testa_a_volta():
+    disjuntor = Disjuntor(limiar_falhas=2, tempo_aberto=0.0)
+    assert not disjuntor.falha()
+    assert disjuntor.falha()
+    assert disjuntor.estado == Disjuntor.ABERTO
+    # Meio-aberto: só uma requisição de teste por vez
+    assert disjuntor.permitir()
+    assert disjuntor.estado == Disjuntor.MEIO_ABERTO
+    assert not disjuntor.permitir()
+    disjuntor.sucesso()
+    assert disjuntor.estado == Disjuntor.FECHADO
+    assert disjuntor.permitir()
+
+
+def test_disjuntor_reabre_se_o_teste_falhar():
+    disjuntor = Disjuntor(limiar_falhas=1, tempo_aberto=0.0)
+    disjuntor.falha()
+    assert disjuntor.permitir()
+    assert disjuntor.falha()
+    assert disjuntor.estado == Disjuntor.ABERTO
+
+
+def test_disjuntor_aberto_bloqueia():
+    disjuntor = Disjuntor(limiar_falhas=1, tempo_aberto=60.0)
+    disjuntor.falha()
+    assert not disjuntor.permitir()
+
+
+def _politica(tentativas=3):
+    return PoliticaRetentativa(max_tentativas=tentativas, base=0.0, base_limite_taxa=0.0)
+
+
+def test_retentativa_repete_erros_passageiros():
+    chamadas = []
+
+    def funcao():
+        chamadas.append(1)
+        if len(chamadas) < 3:
+            raise TimeoutError('tempo esgotado')
+        return 'ok'
+
+    politica = _politica()
+    assert politica.executar(funcao) == 'ok'
+    assert len(chamadas) == 3
+    assert politica.retentativas == 2
+
+
+def test_retentativa_desiste_na_ultima_tentativa():
+    chamadas = []
+
+    def funcao():
+        chamadas.append(1)
+        raise ConnectionError('recusada')
+
+    with pytest.raises(ErroRede):
+        _politica().executar(funcao)
+    assert len(chamadas) == 3
+
+
+def test_erro_de_programacao_tem_uma_chamada_e_nao_abre_o_disjuntor():
+    chamadas = []
+    disjuntor = Disjuntor(limiar_falhas=1)
+
+    def funcao():
+        chamadas.append(1)
+        raise KeyError('Close')
+
+    with pytest.raises(ErroFonte):
+        _politica().executar(funcao, disjuntor)
+    assert len(chamadas) == 1
+    assert disjuntor.estado == Disjuntor.FECHADO
+    assert disjuntor.falhas == 0
+
+
+def test_sem_dados_conta_como_host_saudavel():
+    disjuntor = Disjuntor(limiar_falhas=2)
+    disjuntor.falha()
+
+    def funcao():
+        raise ErroSemDados('vazio')
+
+    with pytest.raises(ErroSemDados):
+        _politica().executar(funcao, disjuntor)
+    assert disjuntor.falhas == 0
+
+
+def test_disjuntor_aberto_interrompe_a_politica():
+    disjuntor = Disjuntor(limiar_falhas=1, tempo_aberto=60.0)
+    with pytest.raises(ErroCircuitoAberto):
+        _politica().executar(lambda: (_ for _ in ()).throw(TimeoutError('x')), disjuntor)
+    with pytest.raises(ErroCircuitoAberto):
+        _politica().executar(lambda: 'ok', disjuntor)
+
+
+def test_limite_de_taxa_usa_a_propria_base():
+    politica = PoliticaRetentativa(base=0.0, maximo=100.0, base_limite_taxa=4.0)
+    assert politica.espera(0, ErroRede('x')) == 0.0
+    assert 0.0 <= politica.espera(3, ErroLimiteTaxa('x')) <= 32.0
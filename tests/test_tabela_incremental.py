@@ -0,0 +1,37 @@
+import numpy as np
+
+from conftest import quadro
+from tabela_incremental import ModeloTabela
+
+
+def test_extremos_da_janela_exibida():
+    dados = quadro(300)
+    modelo = ModeloTabela()
+    aleatorio = np.random.default_rng(1)
+    fim = 2
+    while fim < len(dados):
+        janela = dados.iloc[max(0, fim - 50):fim].copy()
+        if aleatorio.random() < 0.3:
+            # A última barra ainda em formação pode ser revisada
+            janela.iloc[-1, janela.columns.get_loc('Low')] *= aleatorio.uniform(0.9, 1.1)
+            janela.iloc[-1, janela.columns.get_loc('High')] *= aleatorio.uniform(0.9, 1.1)
+        minimo, maximo = modelo._extremos('X.SA', janela)
+        assert minimo == janela['Low'].min()
+        assert maximo == janela['High'].max()
+        fim += int(aleatorio.integers(0, 4))
+
+
+def test_diferencas_so_com_o_que_mudou():
+    dados = quadro(60)
+    modelo = ModeloTabela()
+    acoes = {'A.SA': 'A', 'B.SA': 'B'}
+    primeira = modelo.diferencas(acoes, {'A.SA': dados.iloc[:50], 'B.SA': dados.iloc[:50]})
+    assert [ticker for ticker, _ in primeira.inserir] == ['A.SA', 'B.SA']
+
+    segunda = modelo.diferencas(acoes, {'A.SA': dados.iloc[1:51], 'B.SA': dados.iloc[:50]})
+    assert not segunda.inserir
+    assert [ticker for ticker, _ in segunda.alterar] == ['A.SA']
+
+    terceira = modelo.diferencas({'B.SA': 'B'}, {'B.SA': dados.iloc[:50]})
+    assert terceira.remover == ['A.SA']
+    assert terceira.ordem == ['B.SA']
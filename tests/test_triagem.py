@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import quadro
+from indicadores import IndicadoresIncrementais
+from triagem import MotorTriagem
+
+BARRAS = 90
+
+
+def retornos_esperados(dados_acoes, janela):
+    """Retornos de cada ticker sobre as próprias barras, nos últimos `janela` horários"""
+    retornos = pd.DataFrame({t: d['Close'].pct_change(fill_method=None)
+                             for t, d in dados_acoes.items()})
+    return retornos.iloc[-janela:]
+
+
+def alimentar(motor, indicadores, dados_acoes):
+    indicadores.atualizar(dados_acoes, ao_adicionar=motor.ao_adicionar)
+    motor.concluir(indicadores)
+    return motor.resultado()
+
+
+@pytest.fixture
+def dados():
+    comum = np.random.default_rng(9).normal(0, 0.01, BARRAS)
+    dados = {t: quadro(BARRAS, i, comum * peso, freq='h') for i, (t, peso)
+             in enumerate((('A.SA', 1.0), ('B.SA', 0.5), ('C.SA', -1.0), ('D.SA', 0.0)))}
+    dados['E.SA'] = quadro(BARRAS, 7, comum, freq='h', faltando=[70, 71, 80])
+    return dados
+
+
+def test_correlacao_igual_ao_pandas(dados):
+    motor = MotorTriagem(janela=40, min_observacoes=10)
+    indicadores = IndicadoresIncrementais()
+    alimentar(motor, indicadores, {t: d.iloc[:60] for t, d in dados.items()})
+    resultado = alimentar(motor, indicadores, dados)
+
+    esperado = retornos_esperados(dados, 40)[resultado.tickers]
+    assert np.allclose(resultado.correlacao, esperado.corr(min_periods=10).to_numpy(),
+                       equal_nan=True)
+    contagem = esperado.notna().astype(int)
+    assert (resultado.observacoes == (contagem.T @ contagem).to_numpy()).all()
+    assert np.allclose(resultado.valores['volatilidade_janela'], esperado.std().to_numpy())
+    assert np.allclose(resultado.valores['momento'], (1 + esperado).prod().to_numpy() - 1)
+    # Os indicadores acompanham o resultado
+    assert np.allclose(resultado.valores['rsi'], indicadores.valores()['rsi'], equal_nan=True)
+
+
+def test_ranking_e_pares(dados):
+    motor = MotorTriagem(janela=40)
+    resultado = alimentar(motor, IndicadoresIncrementais(), dados)
+    ordem = resultado.ranking('momento', limite=3)
+    momento = resultado.valores['momento']
+    assert list(ordem) == list(np.argsort(-momento)[:3])
+    pares = resultado.mais_correlacionadas('A.SA', limite=2)
+    assert pares[0][0] in ('B.SA', 'C.SA', 'E.SA')
+    assert abs(pares[0][1]) >= abs(pares[1][1])
+
+
+def test_troca_de_lista_mantem_a_janela_dos_que_continuam(dados):
+    motor = MotorTriagem(janela=40, min_observacoes=10)
+    indicadores = IndicadoresIncrementais()
+    alimentar(motor, indicadores, {t: dados[t].iloc[:-2] for t in ('A.SA', 'B.SA', 'C.SA')})
+    restantes = {t: dados[t] for t in ('B.SA', 'C.SA', 'D.SA')}
+    # Como na vista do armazém: os que continuam só trazem as barras recentes
+    resultado = alimentar(motor, indicadores, {'B.SA': dados['B.SA'].iloc[-5:],
+                                               'C.SA': dados['C.SA'].iloc[-5:],
+                                               'D.SA': dados['D.SA']})
+
+    assert resultado.tickers == ['B.SA', 'C.SA', 'D.SA']
+    esperado = retornos_esperados(restantes, 40)
+    assert np.allclose(resultado.correlacao, esperado.corr(min_periods=10).to_numpy(),
+                       equal_nan=True)
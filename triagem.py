@@ -0,0 +1,349 @@
+"""Triagem de ações: correlação entre todas as ações, rankings e filtros
+
+O motor recebe as barras pelo mesmo gancho dos alertas (`ao_adicionar` de
+IndicadoresIncrementais) e mantém uma janela com os retornos das últimas
+`janela` barras alinhadas por horário: uma linha por horário e uma coluna
+por ticker, com a máscara de quem tem barra naquele horário.
+
+Sobre a janela ficam guardados, já somados, os co-momentos de cada par de
+ações (contagem, somas e somas de quadrados e de produtos, só nas linhas em
+que as duas têm barra). Quando chegam barras novas, só as linhas alteradas
+entram e saem das somas, com alguns produtos de matrizes de poucas linhas,
+em vez de recalcular tudo; de tempos em tempos as somas são refeitas do
+zero para não acumular erro de arredondamento. A correlação e a covariância
+saem dessas somas e são iguais às de `DataFrame.corr()` com pares completos.
+
+Consultas de filtro são condições separadas por "e" (ou vírgula):
+
+    momento > 2% e volatilidade_janela < 0.01, rsi < 70
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Métricas da própria triagem, calculadas sobre a janela de retornos
+CAMPOS_TRIAGEM = ('momento', 'volatilidade_janela', 'anomalia_volume', 'correlacao_media')
+# Valores de IndicadoresIncrementais.valores() (e o preço) aceitos nas consultas
+CAMPOS_INDICADORES = ('preco', 'retorno', 'sma', 'ema', 'rsi', 'atr', 'volatilidade', 'vwap')
+CAMPOS = CAMPOS_TRIAGEM + CAMPOS_INDICADORES
+
+SEM_HORARIO = np.iinfo(np.int64).min
+
+_OPERADORES = {
+    '>': np.greater, '<': np.less, '>=': np.greater_equal, '<=': np.less_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+_CONDICAO = re.compile(r'^([a-z_]+)\s*(>=|<=|==|!=|>|<)\s*([-+]?\d+(?:\.\d+)?)\s*(%?)$')
+_SEPARADOR = re.compile(r'\s+(?:e|and)\s+|[,;]')
+
+
+def compilar_consulta(texto):
+    """Converte uma consulta em uma lista de (campo, operador, valor)"""
+    condicoes = []
+    for parte in _SEPARADOR.split((texto or '').strip().lower()):
+        parte = parte.strip()
+        if not parte:
+            continue
+        casamento = _CONDICAO.match(parte)
+        if casamento is None:
+            raise ValueError(f"Condição inválida na consulta: '{parte}'")
+        campo, operador, valor, percentual = casamento.groups()
+        if campo not in CAMPOS:
+            raise ValueError(f"Campo desconhecido na consulta: '{campo}'")
+        valor = float(valor) / (100 if percentual else 1)
+        condicoes.append((campo, operador, valor))
+    return condicoes
+
+
+class ResultadoTriagem:
+    """Retrato da triagem em uma versão: matrizes e métricas por ticker
+
+    `correlacao` e `covariancia` são matrizes n x n na ordem de `tickers`
+    (NaN onde o par tem menos observações que o mínimo); `valores` guarda
+    um vetor por campo de `CAMPOS`.
+    """
+
+    def __init__(self, versao, tickers, correlacao, covariancia, observacoes, valores):
+        self.versao = versao
+        self.tickers = tickers
+        self.posicoes = {ticker: i for i, ticker in enumerate(tickers)}
+        self.correlacao = correlacao
+        self.covariancia = covariancia
+        self.observacoes = observacoes
+        self.valores = valores
+        self._ordem = None
+
+    def filtrar(self, consulta):
+        """Máscara dos tickers que atendem a todas as condições da consulta"""
+        mascara = np.ones(len(self.tickers), dtype=bool)
+        for campo, operador, valor in compilar_consulta(consulta):
+            with np.errstate(invalid='ignore'):
+                mascara &= _OPERADORES[operador](self.valores[campo], valor)
+        return mascara
+
+    def ranking(self, campo='momento', limite=20, crescente=False, consulta=None):
+        """Tickers ordenados por um campo (sem os NaN), opcionalmente filtrados"""
+        if campo not in self.valores:
+            raise ValueError(f"Campo desconhecido para ordenar: '{campo}'")
+        valores = self.valores[campo]
+        mascara = ~np.isnan(valores)
+        if consulta:
+            mascara &= self.filtrar(consulta)
+        indices = np.flatnonzero(mascara)
+        chave = valores[indices] if crescente else -valores[indices]
+        if limite and limite < len(indices):
+            escolhidos = np.argpartition(chave, limite - 1)[:limite]
+            indices, chave = indices[escolhidos], chave[escolhidos]
+        return indices[np.argsort(chave, kind='stable')]
+
+    def linhas(self, indices):
+        """Dicionários ticker + campos para os índices dados"""
+        return [{'ticker': self.tickers[i],
+                 **{campo: float(vetor[i]) for campo, vetor in self.valores.items()}}
+                for i in indices]
+
+    def mais_correlacionadas(self, ticker, limite=10):
+        """Pares do ticker ordenados pela correlação em módulo: [(ticker, correlação)]"""
+        i = self.posicoes[ticker]
+        linha = self.correlacao[i].copy()
+        linha[i] = np.nan
+        candidatos = np.flatnonzero(~np.isnan(linha))
+        ordem = candidatos[np.argsort(-np.abs(linha[candidatos]), kind='stable')][:limite]
+        return [(self.tickers[j], float(linha[j])) for j in ordem]
+
+    def ordem_agrupada(self):
+        """Ordem dos tickers que aproxima os correlacionados (para o mapa de calor)
+
+        Ordena pelo ângulo nos dois primeiros autovetores da matriz de
+        correlação: uma decomposição n x n, sem agrupamento hierárquico.
+        """
+        if self._ordem is None:
+            n = len(self.tickers)
+            if n < 3:
+                self._ordem = np.arange(n)
+            else:
+                matriz = np.nan_to_num(self.correlacao)
+                _, vetores = np.linalg.eigh(matriz)
+                angulo = np.arctan2(vetores[:, -2], vetores[:, -1])
+                self._ordem = np.argsort(angulo, kind='stable')
+        return self._ordem
+
+
+class MotorTriagem:
+    """Janela de retornos alinhados e co-momentos de todas as ações
+
+    Alimentado por `ao_adicionar` (barra a barra, durante a atualização dos
+    indicadores) e consolidado em `concluir`; `resultado()` devolve o
+    retrato da versão atual, calculado uma vez por versão.
+    """
+
+    # Barras (horários distintos) na janela de retornos
+    JANELA = 40
+    # Observações em comum abaixo das quais a correlação de um par fica NaN
+    MIN_OBSERVACOES = 10
+    # Atualizações incrementais entre dois recálculos completos das somas
+    RECALCULO_COMPLETO = 200
+
+    def __init__(self, janela=None, min_observacoes=None, metricas=None):
+        self.janela = janela or self.JANELA
+        self.min_observacoes = min_observacoes or self.MIN_OBSERVACOES
+        self.metricas = metricas
+        self.trava = threading.Lock()
+        self.versao = 0
+        self._resultado = None
+        self.reiniciar(())
+
+    def reiniciar(self, tickers):
+        """Esvazia a janela para um novo conjunto de tickers"""
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self._referencia = None
+        self.horarios = np.full(self.janela, SEM_HORARIO, dtype=np.int64)
+        self.linha_do_horario = {}
+        self.retornos = np.zeros((self.janela, n))
+        self.mascara = np.zeros((self.janela, n))
+        self.volumes = np.zeros((self.janela, n))
+        self.ultimo_volume = np.full(n, np.nan)
+        self.horario_volume = np.full(n, SEM_HORARIO, dtype=np.int64)
+        self.pendentes = {}
+        self.valores_indicadores = {}
+        self._zerar_somas(n)
+
+    def ajustar(self, tickers):
+        """Troca o conjunto de tickers mantendo a janela dos que continuam nele"""
+        posicoes = {ticker: i for i, ticker in enumerate(self.tickers)}
+        antigos = np.array([posicoes.get(t, -1) for t in tickers], dtype=np.int64)
+        mantidos = antigos >= 0
+        origem = antigos[mantidos]
+        horarios, linha_do_horario = self.horarios, self.linha_do_horario
+        janela = (self.retornos, self.mascara, self.volumes)
+        volume = (self.ultimo_volume, self.horario_volume)
+        pendentes = self.pendentes
+        self.reiniciar(tickers)
+        self.horarios, self.linha_do_horario = horarios, linha_do_horario
+        for novo, antigo in zip((self.retornos, self.mascara, self.volumes), janela):
+            novo[:, mantidos] = antigo[:, origem]
+        self.ultimo_volume[mantidos] = volume[0][origem]
+        self.horario_volume[mantidos] = volume[1][origem]
+        n = len(self.tickers)
+        for ts, (mascara, retornos, volumes) in pendentes.items():
+            linha = (np.zeros(n, dtype=bool), np.zeros(n), np.zeros(n))
+            for novo, antigo in zip(linha, (mascara, retornos, volumes)):
+                novo[mantidos] = antigo[origem]
+            self.pendentes[ts] = linha
+        self._recalcular()
+
+    def _zerar_somas(self, n):
+        # Co-momentos por par (i, j) somados nas linhas em que os dois têm barra
+        self.contagem = np.zeros((n, n))
+        self.soma = np.zeros((n, n))
+        self.soma2 = np.zeros((n, n))
+        self.produto = np.zeros((n, n))
+        # Somas por ticker: log(1 + retorno), volume e volume ao quadrado
+        self.soma_log = np.zeros(n)
+        self.soma_volume = np.zeros(n)
+        self.soma2_volume = np.zeros(n)
+        self.desde_recalculo = 0
+
+    def ao_adicionar(self, indicadores, horario, abertura, maxima, minima, fechamento, volume):
+        """Guarda a linha de retornos da barra (gancho de IndicadoresIncrementais)"""
+        if indicadores.tickers is not self._referencia:
+            with self.trava:
+                self.ajustar(indicadores.tickers)
+                self._referencia = indicadores.tickers
+        ts = pd.Timestamp(horario).value
+        retorno = indicadores.estado['retorno']
+        # Só os tickers que a barra atualizou (os demais já estão à frente)
+        valido = (indicadores.estado['ultimo_ts'] == ts) & ~np.isnan(retorno)
+        if not valido.any():
+            return
+        if ts not in self.pendentes:
+            n = len(self.tickers)
+            self.pendentes[ts] = (np.zeros(n, dtype=bool), np.zeros(n), np.zeros(n))
+        mascara, retornos, volumes = self.pendentes[ts]
+        mascara |= valido
+        retornos[valido] = retorno[valido]
+        volumes[valido] = np.nan_to_num(volume[valido])
+
+    def concluir(self, indicadores=None):
+        """Aplica as linhas novas à janela e às somas e publica uma nova versão"""
+        pendentes, self.pendentes = self.pendentes, {}
+        with self.trava:
+            if indicadores is not None and indicadores.tickers is self._referencia:
+                self.valores_indicadores = {
+                    'preco': indicadores.estado['fech'].copy(), **indicadores.valores()}
+            if pendentes:
+                self._aplicar(pendentes)
+            self.versao += 1
+            self._resultado = None
+
+    def _aplicar(self, pendentes):
+        antigas = {}
+        for ts in sorted(pendentes):
+            mascara, retornos, volumes = pendentes[ts]
+            linha = self.linha_do_horario.get(ts)
+            if linha is None:
+                linha = int(np.argmin(self.horarios))
+                if self.horarios[linha] != SEM_HORARIO and ts < self.horarios[linha]:
+                    continue  # mais antiga que toda a janela cheia
+            if linha not in antigas:
+                antigas[linha] = (self.retornos[linha].copy(), self.mascara[linha].copy(),
+                                  self.volumes[linha].copy())
+            if self.horarios[linha] != ts:
+                # Linha reaproveitada: sai a barra mais antiga da janela
+                self.linha_do_horario.pop(int(self.horarios[linha]), None)
+                self.linha_do_horario[ts] = linha
+                self.horarios[linha] = ts
+                self.retornos[linha] = 0.0
+                self.mascara[linha] = 0.0
+                self.volumes[linha] = 0.0
+            self.retornos[linha, mascara] = retornos[mascara]
+            self.mascara[linha, mascara] = 1.0
+            self.volumes[linha, mascara] = volumes[mascara]
+            recente = mascara & (ts >= self.horario_volume)
+            self.ultimo_volume[recente] = volumes[recente]
+            self.horario_volume[recente] = ts
+
+        if not antigas:
+            return
+        self.desde_recalculo += 1
+        if (self.desde_recalculo >= self.RECALCULO_COMPLETO
+                or len(antigas) > self.janela // 2):
+            self._recalcular()
+            return
+        # Um único bloco: as linhas novas entram (+1) e as antigas saem (-1)
+        linhas = np.fromiter(antigas, dtype=np.int64, count=len(antigas))
+        retornos = np.vstack([self.retornos[linhas], [antigas[l][0] for l in linhas]])
+        mascara = np.vstack([self.mascara[linhas], [antigas[l][1] for l in linhas]])
+        volumes = np.vstack([self.volumes[linhas], [antigas[l][2] for l in linhas]])
+        sinais = np.concatenate([np.ones(len(linhas)), -np.ones(len(linhas))])
+        self._somar(retornos, mascara, volumes, sinais)
+
+    def _somar(self, retornos, mascara, volumes, sinais):
+        """Soma às somas um bloco de linhas, cada uma com peso +1 ou -1 (`sinais`)"""
+        pesos = mascara * sinais[:, None]
+        self.contagem += mascara.T @ pesos
+        self.soma += retornos.T @ pesos
+        self.soma2 += (retornos * retornos).T @ pesos
+        self.produto += retornos.T @ (retornos * sinais[:, None])
+        self.soma_log += sinais @ (np.log1p(retornos) * mascara)
+        self.soma_volume += sinais @ (volumes * mascara)
+        self.soma2_volume += sinais @ (volumes * volumes * mascara)
+
+    def _recalcular(self):
+        """Refaz as somas a partir da janela inteira"""
+        self._zerar_somas(len(self.tickers))
+        self._somar(self.retornos, self.mascara, self.volumes, np.ones(self.janela))
+        if self.metricas is not None:
+            self.metricas.incrementar('triagem_recalculos_total')
+
+    def resultado(self):
+        """Retrato da versão atual (calculado na primeira chamada de cada versão)"""
+        with self.trava:
+            if self._resultado is None:
+                self._resultado = self._calcular()
+            return self._resultado
+
+    def _calcular(self):
+        n = len(self.tickers)
+        contagem = self.contagem
+        suficiente = contagem >= self.min_observacoes
+        with np.errstate(divide='ignore', invalid='ignore'):
+            media = self.soma / contagem
+            covariancia = (self.produto - self.soma * media.T) / (contagem - 1)
+            # Variância de i só nas linhas em comum com j (como em DataFrame.corr)
+            variancia = (self.soma2 - self.soma * media) / (contagem - 1)
+            desvios = np.sqrt(np.maximum(variancia, 0) * np.maximum(variancia.T, 0))
+            correlacao = np.clip(covariancia / desvios, -1.0, 1.0)
+            covariancia[~suficiente] = np.nan
+            correlacao[~suficiente | (desvios == 0)] = np.nan
+
+            validas = np.diag(contagem)
+            volatilidade = np.where(validas >= self.min_observacoes,
+                                    np.sqrt(np.maximum(np.diag(variancia), 0)), np.nan)
+            momento = np.where(validas > 0, np.expm1(self.soma_log), np.nan)
+            media_volume = self.soma_volume / validas
+            desvio_volume = np.sqrt(np.maximum(
+                (self.soma2_volume - self.soma_volume * media_volume) / (validas - 1), 0))
+            anomalia = np.where(desvio_volume > 0,
+                                (self.ultimo_volume - media_volume) / desvio_volume, np.nan)
+            fora_diagonal = correlacao.copy()
+            np.fill_diagonal(fora_diagonal, np.nan)
+            pares = (~np.isnan(fora_diagonal)).sum(axis=1)
+            correlacao_media = np.where(pares > 0,
+                                        np.nansum(fora_diagonal, axis=1) / np.maximum(pares, 1),
+                                        np.nan)
+
+        valores = {
+            'momento': momento,
+            'volatilidade_janela': volatilidade,
+            'anomalia_volume': anomalia,
+            'correlacao_media': correlacao_media,
+        }
+        for campo in CAMPOS_INDICADORES:
+            vetor = self.valores_indicadores.get(campo)
+            valores[campo] = vetor if vetor is not None and len(vetor) == n else np.full(n, np.nan)
+        return ResultadoTriagem(self.versao, list(self.tickers), correlacao, covariancia,
+                                contagem.astype(np.int64), valores)